@@ -0,0 +1,96 @@
+"""
+Short-lived cache for dashboard responses.
+
+Entries are keyed by (endpoint, role, department, day) and expire after
+DASHBOARD_CACHE_TTL_SECONDS. Writes that change what a dashboard shows
+(check-ins, leave decisions, task status changes, user activation) call
+invalidate_dashboards(department), which drops that department's entries and the
+organisation-wide ones (department None), so polling dashboards stay fresh without
+recomputing the aggregates on every refresh.
+
+The cache is per process; with several workers an invalidation only reaches the
+worker that handled the write and the others catch up within the TTL.
+"""
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+
+CacheKey = Tuple[str, str, Optional[str], date]
+
+
+class DashboardCache:
+    def __init__(self, ttl_seconds: float, name: str = "dashboard"):
+        self.ttl_seconds = ttl_seconds
+        self.name = name  # cache label in the metrics
+        self._entries: Dict[CacheKey, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a response computed before it is not stored after it
+        self._generation = 0
+
+    def get_or_compute(
+        self, endpoint: str, role: str, department: Optional[str], day: date, compute: Callable[[], Any], force: bool = False
+    ) -> Any:
+        """Cached value for the key, or compute() and store it; force=True always recomputes."""
+        if self.ttl_seconds <= 0:
+            return compute()
+
+        key = (endpoint, role, department, day)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            generation = self._generation
+        if not force:
+            if cached and cached[0] > now:
+                record_cache_lookup(self.name, hit=True)
+                return cached[1]
+            record_cache_lookup(self.name, hit=False)
+
+        value = compute()
+        with self._lock:
+            if generation == self._generation:
+                self._purge_expired(now)
+                self._entries[key] = (now + self.ttl_seconds, value)
+        return value
+
+    def invalidate(self, department: Optional[str] = None) -> None:
+        """Drop entries for `department` plus organisation-wide ones; None drops everything."""
+        with self._lock:
+            self._generation += 1
+            if department is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[2] is None or k[2] == department]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        self.invalidate(None)
+
+    def _purge_expired(self, now: float) -> None:
+        for key in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+
+
+dashboard_cache = DashboardCache(settings.DASHBOARD_CACHE_TTL_SECONDS)
+
+_invalidation_listeners: List[Callable[[Optional[str]], None]] = []
+
+
+def add_invalidation_listener(listener: Callable[[Optional[str]], None]) -> None:
+    """Also notify `listener(department)` on every invalidation (e.g. the snapshot scheduler)."""
+    if listener not in _invalidation_listeners:
+        _invalidation_listeners.append(listener)
+
+
+def remove_invalidation_listener(listener: Callable[[Optional[str]], None]) -> None:
+    if listener in _invalidation_listeners:
+        _invalidation_listeners.remove(listener)
+
+
+def invalidate_dashboards(department: Optional[str] = None) -> None:
+    dashboard_cache.invalidate(department)
+    for listener in list(_invalidation_listeners):
+        listener(department)
@@ -0,0 +1,270 @@
+"""
+Live attendance feed: check-in, check-out and online-status deltas pushed to
+subscribers of the /attendance/live WebSocket instead of polling.
+
+Every event gets a sequence number and the last LIVE_FEED_BUFFER_SIZE events are
+kept, so a reconnecting client can resume after the last sequence it saw. If that
+sequence is no longer buffered, or the feed restarted (feed_id changed), the
+client gets a fresh snapshot instead.
+
+Events are fanned out within the process by default. Set LIVE_FEED_BACKEND=redis
+(and LIVE_FEED_REDIS_URL, defaulting to RATE_LIMIT_REDIS_URL) so subscribers on
+every worker see events published by the others.
+"""
+import asyncio
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, List, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+# Queued instead of an event when a subscriber falls too far behind
+OVERFLOW = object()
+
+
+class MemoryFeedBackend:
+    """Sequence numbers and replay buffer for a single process."""
+
+    def __init__(self, buffer_size: int):
+        self.feed_id = secrets.token_hex(8)
+        self._seq = 0
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self.deliver: Callable[[dict], None] = lambda event: None
+
+    def publish(self, event: dict) -> None:
+        with self._lock:
+            self._seq += 1
+            event = {**event, "seq": self._seq}
+            self._buffer.append(event)
+        self.deliver(event)
+
+    def current_seq(self) -> int:
+        return self._seq
+
+    def events_since(self, seq: int) -> Optional[List[dict]]:
+        """Events after `seq`, or None if some of them are no longer buffered."""
+        with self._lock:
+            if seq > self._seq or seq < 0:
+                return None
+            if seq == self._seq:
+                return []
+            if not self._buffer or self._buffer[0]["seq"] > seq + 1:
+                return None
+            return [event for event in self._buffer if event["seq"] > seq]
+
+    def start(self) -> None:
+        pass
+
+
+class RedisFeedBackend:
+    """Shared sequence, replay list and pub/sub channel for multi-worker deployments."""
+
+    _PUBLISH = """
+    local seq = redis.call('INCR', KEYS[1])
+    local message = seq .. ':' .. ARGV[1]
+    redis.call('RPUSH', KEYS[2], message)
+    redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+    redis.call('PUBLISH', KEYS[3], message)
+    return seq
+    """
+
+    _SEQ_KEY = "livefeed:seq"
+    _BUFFER_KEY = "livefeed:events"
+    _CHANNEL = "livefeed:channel"
+    _ID_KEY = "livefeed:id"
+    _RECONNECT_MIN_SECONDS = 1.0
+    _RECONNECT_MAX_SECONDS = 30.0
+
+    def __init__(self, url: str, buffer_size: int):
+        self._client = redis.Redis.from_url(url)
+        self._publish = self._client.register_script(self._PUBLISH)
+        self._buffer_size = buffer_size
+        self._feed_id: Optional[str] = None
+        self._listener: Optional[threading.Thread] = None
+        self._listener_lock = threading.Lock()
+        self.deliver: Callable[[dict], None] = lambda event: None
+
+    @property
+    def feed_id(self) -> str:
+        # Shared by all workers; only changes if the redis keys are lost (then clients resnapshot)
+        if self._feed_id is None:
+            self._client.set(self._ID_KEY, secrets.token_hex(8), nx=True)
+            self._feed_id = self._client.get(self._ID_KEY).decode()
+        return self._feed_id
+
+    @staticmethod
+    def _decode(message: bytes) -> dict:
+        seq, _, body = message.decode("utf-8").partition(":")
+        return {**json.loads(body), "seq": int(seq)}
+
+    def publish(self, event: dict) -> None:
+        # Delivered back to this worker through the channel like to every other worker
+        self._publish(
+            keys=[self._SEQ_KEY, self._BUFFER_KEY, self._CHANNEL],
+            args=[json.dumps(event, default=str), self._buffer_size],
+        )
+
+    def current_seq(self) -> int:
+        return int(self._client.get(self._SEQ_KEY) or 0)
+
+    def events_since(self, seq: int) -> Optional[List[dict]]:
+        current = self.current_seq()
+        if seq > current or seq < 0:
+            return None
+        if seq == current:
+            return []
+        events = [self._decode(message) for message in self._client.lrange(self._BUFFER_KEY, 0, -1)]
+        if not events or events[0]["seq"] > seq + 1:
+            return None
+        return [event for event in events if event["seq"] > seq]
+
+    def start(self) -> None:
+        """Start the channel listener (once, on the first subscriber)."""
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name="live-feed-redis", daemon=True)
+            self._listener.start()
+
+    def _listen(self) -> None:
+        """Relay the channel to deliver(), resubscribing with backoff when redis goes away."""
+        backoff = self._RECONNECT_MIN_SECONDS
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self._CHANNEL)
+                backoff = self._RECONNECT_MIN_SECONDS
+                for message in pubsub.listen():
+                    try:
+                        self.deliver(self._decode(message["data"]))
+                    except Exception as e:
+                        logger.error(f"Live feed: dropping undecodable message: {str(e)}")
+            except Exception as e:
+                # Events published meanwhile are missed here; clients recover them with since=<seq>
+                logger.error(f"Live feed: redis subscription lost ({str(e)}); reconnecting in {backoff:g}s")
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self._RECONNECT_MAX_SECONDS)
+            logger.info("Live feed: resubscribing to redis")
+
+
+class Subscription:
+    """One connected client; events are handed over from any thread via its event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.overflowed = False
+
+    def offer(self, event: dict) -> None:
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= self.queue.maxsize - 1:
+            self.overflowed = True
+            self.queue.put_nowait(OVERFLOW)
+            return
+        self.queue.put_nowait(event)
+
+    async def next(self, timeout: float):
+        """Next event, OVERFLOW, or None after `timeout` seconds without events."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LiveFeed:
+    def __init__(self, backend):
+        self.backend = backend
+        self.backend.deliver = self._fan_out
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def feed_id(self) -> str:
+        return self.backend.feed_id
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, department: Optional[str], role: Optional[str], data: dict) -> None:
+        """Never raises: a feed outage must not fail the check-in that triggered it."""
+        event = {
+            "type": event_type,
+            "department": department,
+            "role": role,
+            "occurred_at": datetime.utcnow().isoformat(),
+            "data": data,
+        }
+        try:
+            self.backend.publish(event)
+        except Exception as e:
+            logger.warning(f"Live feed publish failed ({event_type}): {str(e)}")
+
+    async def publish_async(self, event_type: str, department: Optional[str], role: Optional[str], data: dict) -> None:
+        """publish() for async routes: the redis round trip must not block the event loop."""
+        await run_in_threadpool(self.publish, event_type, department, role, data)
+
+    def current_seq(self) -> int:
+        return self.backend.current_seq()
+
+    def events_since(self, seq: int) -> Optional[List[dict]]:
+        return self.backend.events_since(seq)
+
+    def subscribe(self) -> Subscription:
+        """Call from the event loop that will consume the subscription."""
+        self.backend.start()
+        subscription = Subscription(asyncio.get_running_loop(), settings.LIVE_FEED_MAX_QUEUE)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _fan_out(self, event: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # Loop already closed (client gone during shutdown)
+                self.unsubscribe(subscription)
+
+
+def _build_backend():
+    if settings.LIVE_FEED_BACKEND.lower() == "redis":
+        url = settings.LIVE_FEED_REDIS_URL or settings.RATE_LIMIT_REDIS_URL
+        if not HAS_REDIS:
+            logger.warning("LIVE_FEED_BACKEND=redis but the redis package is not installed; using an in-process feed")
+        elif not url:
+            logger.warning("LIVE_FEED_BACKEND=redis but no redis URL is configured; using an in-process feed")
+        else:
+            return RedisFeedBackend(url, settings.LIVE_FEED_BUFFER_SIZE)
+    return MemoryFeedBackend(settings.LIVE_FEED_BUFFER_SIZE)
+
+
+live_feed = LiveFeed(_build_backend())
@@ -0,0 +1,324 @@
+"""
+In-process metrics exposed at GET /metrics in the Prometheus text format.
+
+- http_request_duration_seconds / http_requests_total per route template and status
+- db_pool_* gauges and checkout counters/wait histogram per engine
+- threadpool_* gauges for the AnyIO worker threads that run sync endpoints
+- external_call_duration_seconds for the geocoder and SMTP
+- cache_requests_total{cache, result="hit"|"miss"} for in-process caches
+
+Only internal callers may scrape: clients in METRICS_ALLOWED_NETWORKS (loopback by
+default), or any caller presenting METRICS_TOKEN as a bearer token.
+"""
+import ipaddress
+import secrets
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import settings
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in items
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = float(value)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # labels -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def time(self, *labels: str) -> "_HistogramTimer":
+        return _HistogramTimer(self, labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        lines = self._header()
+        for labels, state in items:
+            for bound, count in zip(self.buckets, state):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(count)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {_format_value(state[-1])}")
+        return lines
+
+
+class _HistogramTimer:
+    """`with histogram.time(labels...):`; the last label can be swapped to "error" on exceptions."""
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = self.labels
+        if exc_type is not None and "outcome" in self.histogram.labelnames:
+            labels = labels[:-1] + ("error",)
+        self.histogram.observe(time.perf_counter() - self._started, *labels)
+        return False
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Callback run before each scrape to refresh gauges."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template.", ("method", "route")))
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "Requests by route template and status code.", ("method", "route", "status")))
+external_call_duration = registry.register(Histogram(
+    "external_call_duration_seconds", "Latency of calls to external services.", ("service", "outcome")))
+cache_requests_total = registry.register(Counter(
+    "cache_requests_total", "In-process cache lookups.", ("cache", "result")))
+db_pool_checkouts_total = registry.register(Counter(
+    "db_pool_checkouts_total", "Connections checked out of the pool.", ("engine",)))
+db_pool_connects_total = registry.register(Counter(
+    "db_pool_connects_total", "New DBAPI connections opened by the pool.", ("engine",)))
+db_pool_checkout_wait = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", ("engine",),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)))
+db_pool_size = registry.register(Gauge("db_pool_size", "Configured pool size.", ("engine",)))
+db_pool_checked_out = registry.register(Gauge("db_pool_checked_out", "Connections currently in use.", ("engine",)))
+db_pool_overflow = registry.register(Gauge("db_pool_overflow", "Connections open beyond pool_size.", ("engine",)))
+threadpool_busy = registry.register(Gauge("threadpool_busy_threads", "Worker threads running sync endpoints."))
+threadpool_limit = registry.register(Gauge("threadpool_max_threads", "Worker thread limit."))
+threadpool_waiting = registry.register(Gauge("threadpool_queue_depth", "Tasks waiting for a worker thread."))
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    cache_requests_total.inc(cache, "hit" if hit else "miss")
+
+
+# ---------------------------------
+# SQLAlchemy pool instrumentation
+# ---------------------------------
+
+class _TimedCheckoutMixin:
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait.observe(time.perf_counter() - started, self.logging_name or "default")
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_options(url: str, name: str, is_async: bool = False) -> dict:
+    """create_engine kwargs that time pool checkouts; in-memory SQLite keeps its default pool."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {"pool_logging_name": name}
+    return {
+        "poolclass": TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+        "pool_logging_name": name,
+    }
+
+
+_instrumented_pools: Dict[str, object] = {}
+
+
+def instrument_pool(engine, name: str) -> None:
+    """Count checkouts/connects and expose pool gauges for `engine` under `name`."""
+    event.listen(engine, "checkout", lambda *args: db_pool_checkouts_total.inc(name))
+    event.listen(engine, "connect", lambda *args: db_pool_connects_total.inc(name))
+    _instrumented_pools[name] = engine
+
+
+def _collect_pool_stats() -> None:
+    for name, engine in _instrumented_pools.items():
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            db_pool_size.set(pool.size(), name)
+            db_pool_checked_out.set(pool.checkedout(), name)
+            db_pool_overflow.set(max(0, pool.overflow()), name)
+
+
+registry.add_collector(_collect_pool_stats)
+
+
+def collect_threadpool_stats() -> None:
+    """Must run inside the event loop (the AnyIO limiter is per loop)."""
+    from anyio import to_thread
+
+    stats = to_thread.current_default_thread_limiter().statistics()
+    threadpool_busy.set(stats.borrowed_tokens)
+    threadpool_limit.set(stats.total_tokens)
+    threadpool_waiting.set(stats.tasks_waiting)
+
+
+# ---------------------------------
+# Request middleware & access control
+# ---------------------------------
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "")
+            http_request_duration.observe(time.perf_counter() - started, method, route)
+            http_requests_total.inc(method, route, str(status_code))
+
+
+def _allowed_networks() -> List[ipaddress._BaseNetwork]:
+    networks = []
+    for raw in settings.METRICS_ALLOWED_NETWORKS.split(","):
+        raw = raw.strip()
+        if raw:
+            networks.append(ipaddress.ip_network(raw, strict=False))
+    return networks
+
+
+_ALLOWED_NETWORKS = _allowed_networks()
+
+
+def is_internal_caller(client_host: Optional[str], authorization: Optional[str]) -> bool:
+    """Direct peer address only; X-Forwarded-For is client-controlled and ignored here."""
+    if settings.METRICS_TOKEN and authorization and secrets.compare_digest(authorization, f"Bearer {settings.METRICS_TOKEN}"):
+        return True
+    if not client_host:
+        return False
+    try:
+        address = ipaddress.ip_address(client_host)
+    except ValueError:
+        return False
+    return any(address in network for network in _ALLOWED_NETWORKS)
@@ -0,0 +1,285 @@
+"""
+Token-bucket rate limiting for auth and attendance write endpoints.
+
+Each policy matches a method + path pattern and limits requests per key:
+- "ip":      client address
+- "subject": JWT `sub` of the bearer token (falls back to ip)
+- "user":    `user_id` path parameter, else token subject, else ip
+
+Client addresses come from the connection; X-Forwarded-For is only read when the
+connection comes from RATE_LIMIT_TRUSTED_PROXIES (e.g. the nginx in front of the app).
+
+Buckets live in process memory by default. Set RATE_LIMIT_BACKEND=redis (and
+RATE_LIMIT_REDIS_URL) so several workers share one set of buckets.
+"""
+import ipaddress
+import json
+import logging
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.security import token_subject
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+
+class RateLimitPolicy:
+    """`capacity` requests burst, refilled at `capacity` per `period_seconds`."""
+
+    def __init__(self, name: str, methods: List[str], path_pattern: str, capacity: int, period_seconds: float, key: str = "ip"):
+        self.name = name
+        self.methods = {m.upper() for m in methods}
+        self.path_regex = re.compile(path_pattern)
+        self.capacity = capacity
+        self.period_seconds = period_seconds
+        self.refill_per_second = capacity / period_seconds
+        self.key = key
+
+    def match(self, method: str, path: str) -> Optional[re.Match]:
+        if method.upper() not in self.methods:
+            return None
+        return self.path_regex.fullmatch(path)
+
+
+DEFAULT_POLICIES = [
+    RateLimitPolicy("auth_send_otp", ["POST"], r"/auth/send-otp/?", capacity=5, period_seconds=15 * 60, key="ip"),
+    RateLimitPolicy("auth_verify_otp", ["POST"], r"/auth/verify-otp/?", capacity=10, period_seconds=5 * 60, key="ip"),
+    RateLimitPolicy("auth_refresh", ["POST"], r"/auth/refresh/?", capacity=30, period_seconds=60, key="ip"),
+    RateLimitPolicy("attendance_write", ["POST"], r"/attendance/check-(in|out)(/json)?/?", capacity=5, period_seconds=60, key="user"),
+    RateLimitPolicy("online_status_toggle", ["POST"], r"/online-status/toggle/(?P<user_id>\d+)/?", capacity=10, period_seconds=60, key="user"),
+]
+
+
+class MemoryBucketBackend:
+    """Per-process token buckets guarded by a lock."""
+
+    def __init__(self, max_keys: int = 50000):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def consume(self, key: str, policy: RateLimitPolicy) -> Tuple[bool, float, int]:
+        """Take one token. Returns (allowed, retry_after_seconds, remaining_tokens)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (float(policy.capacity), now))
+            tokens = min(float(policy.capacity), tokens + (now - last) * policy.refill_per_second)
+            if tokens >= 1.0:
+                tokens -= 1.0
+                allowed, retry_after = True, 0.0
+            else:
+                allowed, retry_after = False, (1.0 - tokens) / policy.refill_per_second
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self._max_keys:
+                self._evict(now)
+        return allowed, retry_after, int(tokens)
+
+    def _evict(self, now: float) -> None:
+        # Drop the oldest half; an idle bucket is full again anyway
+        ordered = sorted(self._buckets.items(), key=lambda item: item[1][1])
+        for key, _ in ordered[: len(ordered) // 2]:
+            del self._buckets[key]
+
+
+class RedisBucketBackend:
+    """Shared token buckets for multi-worker deployments (atomic Lua script)."""
+
+    _SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local ttl = tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + (now - ts) * rate)
+    local allowed = 0
+    local retry_after = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    else
+        retry_after = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], ttl)
+    return {allowed, tostring(retry_after), tostring(tokens)}
+    """
+
+    def __init__(self, url: str):
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self._SCRIPT)
+
+    def consume(self, key: str, policy: RateLimitPolicy) -> Tuple[bool, float, int]:
+        ttl = int(policy.period_seconds) + 1
+        allowed, retry_after, tokens = self._script(
+            keys=[f"ratelimit:{key}"],
+            args=[policy.capacity, policy.refill_per_second, time.time(), ttl],
+        )
+        return bool(int(allowed)), float(retry_after), int(float(tokens))
+
+
+class RateLimiter:
+    def __init__(self, policies: List[RateLimitPolicy], backend=None):
+        self.policies = policies
+        self.backend = backend or MemoryBucketBackend()
+        self._stats: Dict[str, Dict[str, int]] = {p.name: {"allowed": 0, "rejected": 0} for p in policies}
+        self._backend_errors = 0
+
+    def find_policy(self, method: str, path: str) -> Tuple[Optional[RateLimitPolicy], Optional[re.Match]]:
+        for policy in self.policies:
+            match = policy.match(method, path)
+            if match:
+                return policy, match
+        return None, None
+
+    def check(self, policy: RateLimitPolicy, key: str) -> Tuple[bool, float, int]:
+        try:
+            allowed, retry_after, remaining = self.backend.consume(f"{policy.name}:{key}", policy)
+        except Exception as exc:
+            # Fail open: a broken shared backend must not take down check-in
+            self._backend_errors += 1
+            logger.error(f"Rate limit backend error for {policy.name}: {exc}")
+            return True, 0.0, policy.capacity
+        self._stats[policy.name]["allowed" if allowed else "rejected"] += 1
+        return allowed, retry_after, remaining
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "backend_errors": self._backend_errors,
+            "policies": {
+                policy.name: {
+                    "capacity": policy.capacity,
+                    "period_seconds": policy.period_seconds,
+                    "key": policy.key,
+                    **self._stats[policy.name],
+                }
+                for policy in self.policies
+            },
+        }
+
+
+def _build_backend():
+    if settings.RATE_LIMIT_BACKEND.lower() == "redis":
+        if not HAS_REDIS:
+            logger.warning("RATE_LIMIT_BACKEND=redis but the redis package is not installed; using in-memory buckets")
+        elif not settings.RATE_LIMIT_REDIS_URL:
+            logger.warning("RATE_LIMIT_BACKEND=redis but RATE_LIMIT_REDIS_URL is empty; using in-memory buckets")
+        else:
+            return RedisBucketBackend(settings.RATE_LIMIT_REDIS_URL)
+    return MemoryBucketBackend()
+
+
+rate_limiter = RateLimiter(DEFAULT_POLICIES, _build_backend())
+
+
+def _trusted_proxies() -> List[ipaddress._BaseNetwork]:
+    networks = []
+    for raw in settings.RATE_LIMIT_TRUSTED_PROXIES.split(","):
+        raw = raw.strip()
+        if raw:
+            networks.append(ipaddress.ip_network(raw, strict=False))
+    return networks
+
+
+_TRUSTED_PROXIES = _trusted_proxies()
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _TRUSTED_PROXIES)
+
+
+def _client_ip(scope) -> str:
+    """
+    The direct peer, unless it is a trusted proxy: then the right-most X-Forwarded-For
+    hop that is not one of ours. Anything left of that was written by the client.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not _is_trusted_proxy(peer):
+        return peer
+    hops = []
+    for name, value in scope.get("headers") or []:
+        if name == b"x-forwarded-for":
+            hops.extend(hop.strip() for hop in value.decode("latin-1").split(","))
+    for hop in reversed([hop for hop in hops if hop]):
+        if not _is_trusted_proxy(hop):
+            return hop
+    return peer
+
+
+def _token_subject(scope) -> Optional[str]:
+    for name, value in scope.get("headers") or []:
+        if name == b"authorization":
+            return token_subject(value.decode("latin-1"))
+    return None
+
+
+def _resolve_key(policy: RateLimitPolicy, match: re.Match, scope) -> str:
+    if policy.key == "user":
+        user_id = match.groupdict().get("user_id")
+        if user_id:
+            return f"user:{user_id}"
+    if policy.key in ("user", "subject"):
+        subject = _token_subject(scope)
+        if subject:
+            return f"sub:{subject}"
+    return f"ip:{_client_ip(scope)}"
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware; unmatched routes pass straight through."""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        policy, match = self.limiter.find_policy(scope["method"], scope["path"])
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = _resolve_key(policy, match, scope)
+        allowed, retry_after, remaining = self.limiter.check(policy, key)
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        retry_seconds = max(1, int(retry_after + 0.999))
+        logger.warning(f"Rate limit exceeded: policy={policy.name} key={key} retry_after={retry_seconds}s")
+        body = json.dumps({
+            "detail": "Too many requests. Please try again later.",
+            "retry_after": retry_seconds,
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_seconds).encode()),
+                (b"x-ratelimit-limit", str(policy.capacity).encode()),
+                (b"x-ratelimit-remaining", str(remaining).encode()),
+                (b"x-ratelimit-policy", policy.name.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,44 @@
+"""
+Fast JSON responses.
+
+FastJSONResponse is the app's default response class. With orjson installed it
+serialises natively (datetime/date/time/UUID/Enum); anything orjson doesn't know
+(Decimal, sets, pydantic models) goes through FastAPI's jsonable_encoder.
+
+Endpoints returning large lists can return FastJSONResponse(payload) directly to
+skip FastAPI's jsonable_encoder pass over every row.
+"""
+import json
+from typing import Any, Iterable, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def _orjson_default(value: Any) -> Any:
+    return jsonable_encoder(value)
+
+
+def dumps(content: Any) -> bytes:
+    if HAS_ORJSON:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def drop_keys(rows: List[dict], keys: Iterable[str]) -> List[dict]:
+    """Remove `keys` from every row in place (used by ?compact=true to strip legacy duplicate keys)."""
+    for row in rows:
+        for key in keys:
+            row.pop(key, None)
+    return rows
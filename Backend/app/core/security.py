@@ -1,6 +1,9 @@
 from datetime import datetime, timedelta
-from jose import jwt
+from jose import jwt, JWTError
 from app.core.config import settings
+import hashlib
+import secrets
+from typing import Optional
 
 def create_token(data: dict, expires_delta: timedelta):
     to_encode = data.copy()
@@ -8,3 +11,27 @@ def create_token(data: dict, expires_delta: timedelta):
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
     return encoded_jwt
+
+def create_access_token(email: str, role: str, session_id: str = None):
+    """Short-lived access token; `sid` ties it to the refresh-token session that issued it."""
+    data = {"sub": email, "role": role}
+    if session_id:
+        data["sid"] = session_id
+    return create_token(data, timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES))
+
+def generate_refresh_token() -> str:
+    return secrets.token_urlsafe(48)
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def token_subject(authorization: Optional[str]) -> Optional[str]:
+    """`sub` of an Authorization header value ("Bearer <jwt>" or raw jwt); None if absent or invalid."""
+    if not authorization:
+        return None
+    token = authorization.split(" ", 1)[1] if authorization.startswith("Bearer ") else authorization
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
@@ -0,0 +1,197 @@
+"""
+Per-request SQL instrumentation built on SQLAlchemy engine events.
+
+For every HTTP request this records:
+- the number of statements executed and the total time spent in the database
+  (exposed as X-DB-Query-Count / X-DB-Time-Ms headers when SQL_STATS_HEADERS=true)
+- statements slower than SQL_SLOW_QUERY_MS, written to the "app.sql.slow" logger
+  with parameter values redacted
+- statement shapes repeated SQL_N_PLUS_ONE_THRESHOLD+ times, logged as likely N+1s
+
+Aggregates per route are kept in `sql_metrics` (see GET /sql-metrics/stats).
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from sqlalchemy import event
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("app.sql.slow")
+
+MAX_LOGGED_STATEMENT_CHARS = 2000
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class RequestQueryStats:
+    """Statements executed while serving one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slow_count = 0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, elapsed_ms: float, slow: bool) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if slow:
+            self.slow_count += 1
+        self.shapes[statement_shape(statement)] += 1
+
+    def n_plus_one_suspects(self, threshold: int) -> Dict[str, int]:
+        return {shape: n for shape, n in self.shapes.items() if n >= threshold}
+
+
+_current_stats: contextvars.ContextVar[Optional[RequestQueryStats]] = contextvars.ContextVar("sql_request_stats", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """Normalise a statement so calls that differ only in values/IN-list length compare equal."""
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _PLACEHOLDER_LIST.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def redact_parameters(parameters, executemany: bool = False) -> str:
+    """Describe bound parameters by type only; values may be emails, OTPs or tokens."""
+    if parameters is None:
+        return "none"
+    if executemany:
+        return f"<{len(parameters)} parameter sets>"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "[" + ", ".join(type(value).__name__ for value in parameters) + "]"
+    return f"<{type(parameters).__name__}>"
+
+
+class SQLMetrics:
+    """Process-wide aggregates per route template."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, float]] = {}
+        self._slow_queries = 0
+
+    def record_slow_query(self) -> None:
+        with self._lock:
+            self._slow_queries += 1
+
+    def record_request(self, route: str, stats: RequestQueryStats, n_plus_one: bool) -> None:
+        with self._lock:
+            entry = self._routes.setdefault(route, {
+                "requests": 0,
+                "queries": 0,
+                "db_time_ms": 0.0,
+                "max_queries": 0,
+                "slow_queries": 0,
+                "n_plus_one_requests": 0,
+            })
+            entry["requests"] += 1
+            entry["queries"] += stats.count
+            entry["db_time_ms"] += stats.total_ms
+            entry["max_queries"] = max(entry["max_queries"], stats.count)
+            entry["slow_queries"] += stats.slow_count
+            if n_plus_one:
+                entry["n_plus_one_requests"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {route: dict(entry) for route, entry in self._routes.items()}
+
+    def stats(self) -> dict:
+        routes = self.snapshot()
+        return {
+            "slow_query_threshold_ms": settings.SQL_SLOW_QUERY_MS,
+            "n_plus_one_threshold": settings.SQL_N_PLUS_ONE_THRESHOLD,
+            "slow_queries": self._slow_queries,
+            "routes": {
+                route: {
+                    **entry,
+                    "db_time_ms": round(entry["db_time_ms"], 2),
+                    "avg_queries": round(entry["queries"] / entry["requests"], 2) if entry["requests"] else 0,
+                }
+                for route, entry in sorted(routes.items(), key=lambda item: item[1]["queries"], reverse=True)
+            },
+        }
+
+
+sql_metrics = SQLMetrics()
+
+
+def instrument_engine(engine) -> None:
+    """Attach timing listeners to a (sync) engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_start_time = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_start_time", None)
+        if started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        slow = elapsed_ms >= settings.SQL_SLOW_QUERY_MS
+
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed_ms, slow)
+
+        if slow:
+            sql_metrics.record_slow_query()
+            slow_query_logger.warning(
+                f"Slow query ({elapsed_ms:.1f} ms): {_WHITESPACE.sub(' ', statement)[:MAX_LOGGED_STATEMENT_CHARS]} "
+                f"params={redact_parameters(parameters, executemany)}"
+            )
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "")
+    return f"{scope.get('method', '')} {path}"
+
+
+class SQLInstrumentationMiddleware:
+    """Pure ASGI middleware that scopes query stats to one request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = _current_stats.set(stats)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start" and settings.SQL_STATS_HEADERS:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.total_ms:.2f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current_stats.reset(token)
+            route = _route_template(scope)
+            suspects = stats.n_plus_one_suspects(settings.SQL_N_PLUS_ONE_THRESHOLD)
+            for shape, occurrences in suspects.items():
+                logger.warning(f"Possible N+1 on {route}: statement ran {occurrences}x: {shape[:MAX_LOGGED_STATEMENT_CHARS]}")
+            sql_metrics.record_request(route, stats, bool(suspects))
@@ -0,0 +1,173 @@
+import json
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.db.models.activity_event import ActivityEvent
+from app.db.models.attendance import Attendance
+from app.db.models.leave import Leave
+from app.db.models.task import Task, TaskHistory
+from app.db.models.user import User
+from app.enums import TaskAction
+from app.utils.office_timing import is_late_check_in
+
+
+def activity_scope(department: Optional[str]) -> str:
+    return (department or "").strip()
+
+
+def activity_row(
+    event_type: str,
+    action: str,
+    user: Optional[User],
+    subject_id: Optional[int] = None,
+    status: Optional[str] = None,
+    description: Optional[str] = None,
+    actor_id: Optional[int] = None,
+    occurred_at: Optional[datetime] = None,
+) -> dict:
+    return {
+        "scope": activity_scope(user.department if user else None),
+        "event_type": event_type,
+        "action": action,
+        "subject_id": subject_id,
+        "user_id": user.user_id if user else None,
+        "user_name": user.name if user else None,
+        "actor_id": actor_id,
+        "status": status,
+        "description": (description or "")[:500] or None,
+        "occurred_at": occurred_at or datetime.utcnow(),
+    }
+
+
+def record_activity(
+    db: Session,
+    event_type: str,
+    action: str,
+    user: Optional[User],
+    subject_id: Optional[int] = None,
+    status: Optional[str] = None,
+    description: Optional[str] = None,
+    actor_id: Optional[int] = None,
+    occurred_at: Optional[datetime] = None,
+) -> ActivityEvent:
+    """Add an event to the caller's session; it is committed with the change it describes."""
+    event = ActivityEvent(
+        **activity_row(event_type, action, user, subject_id, status, description, actor_id, occurred_at)
+    )
+    db.add(event)
+    return event
+
+
+def record_activities(db: Session, rows: List[dict]) -> None:
+    """Insert many activity_row() events with one statement in the caller's transaction."""
+    if rows:
+        db.execute(ActivityEvent.__table__.insert(), rows)
+
+
+def rebuild_activity_events(db: Session, days: int = 30) -> int:
+    """
+    Derive the feed of the last `days` from existing rows (check-ins, leave requests and
+    decisions, task history, joiners) for databases that predate activity_events; returns
+    how many events were written. Run once, when init_db creates the table.
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = []
+
+    for attendance, user, late in (
+        db.query(Attendance, User, is_late_check_in(Attendance.check_in, User.department))
+        .join(User, User.user_id == Attendance.user_id)
+        .filter(Attendance.check_in >= since)
+    ):
+        rows.append(activity_row(
+            "attendance", "check_in", user, attendance.attendance_id,
+            "late" if late else "on-time", "Checked in", actor_id=user.user_id, occurred_at=attendance.check_in,
+        ))
+
+    for leave, user in (
+        db.query(Leave, User)
+        .join(User, User.user_id == Leave.user_id)
+        .filter(or_(Leave.created_at >= since, Leave.approved_at >= since))
+    ):
+        if leave.created_at and leave.created_at >= since:
+            rows.append(activity_row(
+                "leave", "requested", user, leave.leave_id, "pending",
+                leave.reason or f"{leave.leave_type or 'Leave'} request", actor_id=user.user_id, occurred_at=leave.created_at,
+            ))
+        decision = (leave.status or "").lower()
+        if decision in ("approved", "rejected") and leave.approved_at and leave.approved_at >= since:
+            rows.append(activity_row(
+                "leave", decision, user, leave.leave_id, decision,
+                f"{leave.leave_type or 'Leave'} leave {decision}", actor_id=leave.approved_by, occurred_at=leave.approved_at,
+            ))
+
+    for entry, task, user in (
+        db.query(TaskHistory, Task, User)
+        .join(Task, Task.task_id == TaskHistory.task_id)
+        .outerjoin(User, User.user_id == Task.assigned_to)
+        .filter(
+            TaskHistory.action.in_([TaskAction.CREATED.value, TaskAction.STATUS_CHANGED.value]),
+            TaskHistory.created_at >= since,
+        )
+    ):
+        details = json.loads(entry.details or "{}")
+        status = details.get("status") if entry.action == TaskAction.CREATED.value else details.get("to")
+        rows.append(activity_row(
+            "task", entry.action, user, task.task_id, (status or "").lower() or None,
+            task.title, actor_id=entry.user_id, occurred_at=entry.created_at,
+        ))
+
+    for user in db.query(User).filter(User.joining_date >= since):
+        rows.append(activity_row(
+            "join", "created", user, user.user_id, "new-joiner",
+            f"Joined {user.department or 'company'}", occurred_at=user.joining_date,
+        ))
+
+    record_activities(db, rows)
+    db.commit()
+    return len(rows)
+
+
+def list_activity(
+    db: Session,
+    scope: Optional[str] = None,
+    event_types: Optional[Sequence[str]] = None,
+    before: Optional[Tuple[datetime, int]] = None,
+    limit: int = 15,
+) -> List[ActivityEvent]:
+    """
+    Newest first. scope=None is organisation-wide; `before` is the (occurred_at, id)
+    of the last event of the previous page.
+    """
+    query = db.query(ActivityEvent)
+    if scope is not None:
+        query = query.filter(ActivityEvent.scope == activity_scope(scope))
+    if event_types:
+        query = query.filter(ActivityEvent.event_type.in_(list(event_types)))
+    if before is not None:
+        occurred_at, event_id = before
+        query = query.filter(
+            or_(
+                ActivityEvent.occurred_at < occurred_at,
+                and_(ActivityEvent.occurred_at == occurred_at, ActivityEvent.id < event_id),
+            )
+        )
+    return query.order_by(ActivityEvent.occurred_at.desc(), ActivityEvent.id.desc()).limit(limit).all()
+
+
+def activity_item(event: ActivityEvent) -> dict:
+    """Dashboard / feed representation."""
+    return {
+        "id": f"{event.event_type}-{event.id}",
+        "type": event.event_type,
+        "action": event.action,
+        "subjectId": event.subject_id,
+        "userId": event.user_id,
+        "user": event.user_name,
+        "department": event.scope or None,
+        "time": event.occurred_at.isoformat(),
+        "status": event.status,
+        "description": event.description,
+    }
@@ -7,12 +7,9 @@ from zoneinfo import ZoneInfo
 from app.db.models.attendance import Attendance
 from app.db.models.user import User  # Import User model
 from app.db.models.office_timing import OfficeTiming
+from app.db.models.online_status import OnlineStatus
 import csv
 import io
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
 
 INDIA_TZ = ZoneInfo("Asia/Kolkata")
 UTC_TZ = ZoneInfo("UTC")
@@ -250,27 +247,69 @@ def get_today_attendance_status(db: Session, department: str = None):
     result = []
     timing_cache = _build_office_timing_cache(db)
     for att, name, dept, emp_id, email in records:
-        evaluation = _evaluate_attendance_status(att.check_in, att.check_out, _resolve_office_timing(db, dept, timing_cache))
-        payload = {
-            "attendance_id": att.attendance_id,
-            "user_id": att.user_id,
-            "employee_id": emp_id,
-            "name": name,
-            "department": dept,
-            "check_in": att.check_in.isoformat() if att.check_in else None,
-            "check_out": att.check_out.isoformat() if att.check_out else None,
-            "total_hours": att.total_hours,
-            "email": email,
-            "status": evaluation["status"],
-            "checkInStatus": evaluation["check_in_status"],
-            "checkOutStatus": evaluation["check_out_status"],
-            "scheduledStart": evaluation["scheduled_start"],
-            "scheduledEnd": evaluation["scheduled_end"],
-        }
-        result.append(payload)
+        timing = _resolve_office_timing(db, dept, timing_cache)
+        result.append(_attendance_status_row(att, name, dept, emp_id, email, timing))
     
     return result
 
+
+def _attendance_status_row(att: Attendance, name, dept, emp_id, email, timing: Optional[OfficeTiming]) -> dict:
+    evaluation = _evaluate_attendance_status(att.check_in, att.check_out, timing)
+    return {
+        "attendance_id": att.attendance_id,
+        "user_id": att.user_id,
+        "employee_id": emp_id,
+        "name": name,
+        "department": dept,
+        "check_in": att.check_in.isoformat() if att.check_in else None,
+        "check_out": att.check_out.isoformat() if att.check_out else None,
+        "total_hours": att.total_hours,
+        "email": email,
+        "status": evaluation["status"],
+        "checkInStatus": evaluation["check_in_status"],
+        "checkOutStatus": evaluation["check_out_status"],
+        "scheduledStart": evaluation["scheduled_start"],
+        "scheduledEnd": evaluation["scheduled_end"],
+    }
+
+
+def get_live_attendance_rows(db: Session, department: str = None, attendance_id: int = None, attendance_ids: list = None):
+    """
+    Rows for the live attendance feed: the /today-status row shape plus role and is_online.
+    Today's check-ins (optionally one department), or the rows for `attendance_id` / `attendance_ids`.
+    """
+    query = (
+        db.query(
+            Attendance,
+            User.name,
+            User.department,
+            User.employee_id,
+            User.email,
+            User.role,
+            OnlineStatus.is_online,
+        )
+        .join(User, Attendance.user_id == User.user_id)
+        .outerjoin(OnlineStatus, OnlineStatus.attendance_id == Attendance.attendance_id)
+    )
+    if attendance_id is not None:
+        query = query.filter(Attendance.attendance_id == attendance_id)
+    elif attendance_ids is not None:
+        query = query.filter(Attendance.attendance_id.in_(attendance_ids))
+    else:
+        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        query = query.filter(Attendance.check_in >= today_start)
+    if department:
+        query = query.filter(func.trim(User.department) == department.strip())
+
+    result = []
+    timing_cache = _build_office_timing_cache(db)
+    for att, name, dept, emp_id, email, role, is_online in query.order_by(Attendance.check_in.desc()).all():
+        row = _attendance_status_row(att, name, dept, emp_id, email, _resolve_office_timing(db, dept, timing_cache))
+        row["role"] = role.value if role else None
+        row["is_online"] = bool(is_online) and att.check_out is None
+        result.append(row)
+    return result
+
 def get_today_attendance_records(db: Session):
     """Get today's attendance records with user details for manager view"""
     today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -435,6 +474,11 @@ def export_attendance_pdf(
     employee_id: str = None,
     department: Optional[str] = None,
 ):
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     styles = getSampleStyleSheet()
@@ -0,0 +1,293 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.models.leave import Leave
+from app.db.models.leave_balance import LeaveBalance, LeaveLedgerEntry
+from app.db.models.user import User
+
+DEFAULT_LEAVE_ALLOWANCES = {
+    "annual": 15,
+    "sick": 10,
+    "casual": 5,
+}
+
+# Unused days that carry_forward() moves into the next year, per leave type
+DEFAULT_CARRY_FORWARD_LIMITS = {
+    "annual": 5,
+}
+
+ENTRY_TYPES = ("accrual", "debit", "adjustment")
+
+
+def normalize_leave_type(leave_type: Optional[str]) -> str:
+    return (leave_type or "annual").strip().lower()
+
+
+def _as_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def leave_days_by_year(leave: Leave) -> Dict[int, int]:
+    """Calendar days of the leave (both ends included), split at year boundaries."""
+    start, end = _as_date(leave.start_date), _as_date(leave.end_date)
+    days: Dict[int, int] = {}
+    while start <= end:
+        year_end = min(end, date(start.year, 12, 31))
+        days[start.year] = (year_end - start).days + 1
+        start = year_end + timedelta(days=1)
+    return days
+
+
+def _balance_query(db: Session, user_id: int, year: int, leave_type: str):
+    return db.query(LeaveBalance).filter(
+        LeaveBalance.user_id == user_id, LeaveBalance.year == year, LeaveBalance.leave_type == leave_type
+    )
+
+
+def _entry_row(user_id, year, leave_type, entry_type, days, leave_id=None, actor_id=None, note=None) -> dict:
+    return {
+        "user_id": user_id, "year": year, "leave_type": leave_type, "entry_type": entry_type, "days": days,
+        "leave_id": leave_id, "actor_id": actor_id, "note": (note or "")[:255] or None,
+    }
+
+
+def _entry(*args, **kwargs) -> LeaveLedgerEntry:
+    return LeaveLedgerEntry(**_entry_row(*args, **kwargs))
+
+
+def _create_balance(db: Session, user_id: int, year: int, leave_type: str) -> LeaveBalance:
+    """New balance row with the year's accrual; the existing (locked) row if another transaction won."""
+    allowance = DEFAULT_LEAVE_ALLOWANCES.get(leave_type, 0)
+    try:
+        with db.begin_nested():
+            balance = LeaveBalance(user_id=user_id, year=year, leave_type=leave_type, allocated=allowance, used=0)
+            db.add(balance)
+            if allowance:
+                db.add(_entry(user_id, year, leave_type, "accrual", allowance, note="Yearly allowance"))
+        return balance
+    except IntegrityError:
+        return _balance_query(db, user_id, year, leave_type).with_for_update().one()
+
+
+def _get_balance(db: Session, user_id: int, year: int, leave_type: str) -> LeaveBalance:
+    """The (locked) balance row, created with the year's accrual on first use."""
+    balance = _balance_query(db, user_id, year, leave_type).with_for_update().first()
+    return balance or _create_balance(db, user_id, year, leave_type)
+
+
+def post_ledger_entry(
+    db: Session,
+    user_id: int,
+    year: int,
+    leave_type: str,
+    entry_type: str,
+    days: int,
+    leave_id: Optional[int] = None,
+    actor_id: Optional[int] = None,
+    note: Optional[str] = None,
+) -> LeaveLedgerEntry:
+    """Append an entry and apply it to the balance row in the caller's transaction."""
+    if entry_type not in ENTRY_TYPES:
+        raise ValueError(f"Unknown ledger entry type: {entry_type}")
+    leave_type = normalize_leave_type(leave_type)
+    balance = _get_balance(db, user_id, year, leave_type)
+    if entry_type == "debit":
+        balance.used = (balance.used or 0) + days
+    else:
+        balance.allocated = (balance.allocated or 0) + days
+    entry = _entry(user_id, year, leave_type, entry_type, days, leave_id, actor_id, note)
+    db.add(entry)
+    return entry
+
+
+def sync_leave_debits(db: Session, leave: Leave, actor_id: Optional[int] = None) -> None:
+    """
+    Bring the leave's debits in line with its current status and dates: approved leaves
+    debit their days per year, anything else nets to zero. Idempotent; caller commits.
+    """
+    sync_leaves_debits(db, [leave], actor_id)
+
+
+def sync_leaves_debits(db: Session, leaves: List[Leave], actor_id: Optional[int] = None) -> None:
+    """sync_leave_debits for many leaves: one read of posted debits and one of the affected balances."""
+    if not leaves:
+        return
+    wanted: Dict[Tuple[int, int, str], int] = {}
+    for leave in leaves:
+        if (leave.status or "").lower() == "approved":
+            leave_type = normalize_leave_type(leave.leave_type)
+            for year, days in leave_days_by_year(leave).items():
+                wanted[(leave.leave_id, year, leave_type)] = days
+    posted = {
+        (leave_id, year, leave_type): int(days or 0)
+        for leave_id, year, leave_type, days in db.query(
+            LeaveLedgerEntry.leave_id, LeaveLedgerEntry.year, LeaveLedgerEntry.leave_type, func.sum(LeaveLedgerEntry.days)
+        )
+        .filter(LeaveLedgerEntry.leave_id.in_([leave.leave_id for leave in leaves]), LeaveLedgerEntry.entry_type == "debit")
+        .group_by(LeaveLedgerEntry.leave_id, LeaveLedgerEntry.year, LeaveLedgerEntry.leave_type)
+    }
+
+    by_id = {leave.leave_id: leave for leave in leaves}
+    entries: List[dict] = []
+    for key in sorted(set(wanted) | set(posted)):
+        delta = wanted.get(key, 0) - posted.get(key, 0)
+        if not delta:
+            continue
+        leave_id, year, leave_type = key
+        leave = by_id[leave_id]
+        note = "Leave approved" if delta > 0 else f"Leave {(leave.status or 'updated').lower()}: days returned"
+        entries.append(_entry_row(leave.user_id, year, leave_type, "debit", delta, leave_id, actor_id, note))
+    _post_entries(db, entries)
+
+
+def _post_entries(db: Session, entries: List[dict]) -> None:
+    """
+    post_ledger_entry for many _entry_row dicts: one locked read of the affected balances,
+    one insert of the missing ones (with the year's accrual) and one insert of the entries.
+    """
+    if not entries:
+        return
+    # (user_id, year, leave_type) -> [allocated delta, used delta]
+    deltas: Dict[Tuple[int, int, str], List[int]] = {}
+    for entry in entries:
+        delta = deltas.setdefault((entry["user_id"], entry["year"], entry["leave_type"]), [0, 0])
+        delta[1 if entry["entry_type"] == "debit" else 0] += entry["days"]
+
+    balances = {
+        (row.user_id, row.year, row.leave_type): row
+        for row in db.query(LeaveBalance)
+        .filter(
+            LeaveBalance.user_id.in_({key[0] for key in deltas}),
+            LeaveBalance.year.in_({key[1] for key in deltas}),
+            LeaveBalance.leave_type.in_({key[2] for key in deltas}),
+        )
+        .with_for_update()
+    }
+    accruals: List[dict] = []
+    missing = [key for key in deltas if key not in balances]
+    if missing:
+        # New balances are inserted with the entries already applied; their accruals go
+        # ahead of the entries. Row by row (locking the winner's row) if another
+        # transaction created one of them first.
+        try:
+            with db.begin_nested():
+                db.execute(LeaveBalance.__table__.insert(), [
+                    {
+                        "user_id": user_id, "year": year, "leave_type": leave_type,
+                        "allocated": DEFAULT_LEAVE_ALLOWANCES.get(leave_type, 0) + deltas[(user_id, year, leave_type)][0],
+                        "used": deltas[(user_id, year, leave_type)][1],
+                    }
+                    for user_id, year, leave_type in missing
+                ])
+            for key in missing:
+                del deltas[key]
+            accruals = [
+                _entry_row(user_id, year, leave_type, "accrual", DEFAULT_LEAVE_ALLOWANCES[leave_type], note="Yearly allowance")
+                for user_id, year, leave_type in missing
+                if DEFAULT_LEAVE_ALLOWANCES.get(leave_type)
+            ]
+        except IntegrityError:
+            balances.update({key: _create_balance(db, *key) for key in missing})
+    for key, (allocated, used) in deltas.items():
+        if allocated:
+            balances[key].allocated = (balances[key].allocated or 0) + allocated
+        if used:
+            balances[key].used = (balances[key].used or 0) + used
+    db.execute(LeaveLedgerEntry.__table__.insert(), accruals + entries)
+
+
+def get_leave_balance(db: Session, user_id: int, year: Optional[int] = None) -> List[dict]:
+    """The year's balances (default: current year) from the balance rows; default allowances where none exist yet."""
+    year = year or datetime.utcnow().year
+    rows = {
+        row.leave_type: row
+        for row in db.query(LeaveBalance).filter(LeaveBalance.user_id == user_id, LeaveBalance.year == year)
+    }
+    balances = []
+    for leave_type in list(DEFAULT_LEAVE_ALLOWANCES) + sorted(set(rows) - set(DEFAULT_LEAVE_ALLOWANCES)):
+        row = rows.get(leave_type)
+        allocated = row.allocated if row else DEFAULT_LEAVE_ALLOWANCES[leave_type]
+        used = row.used if row else 0
+        balances.append({
+            "leave_type": leave_type,
+            "allocated": allocated,
+            "used": used,
+            "remaining": max(allocated - used, 0),
+        })
+    return balances
+
+
+def list_ledger(db: Session, user_id: int, year: Optional[int] = None) -> List[LeaveLedgerEntry]:
+    query = db.query(LeaveLedgerEntry).filter(LeaveLedgerEntry.user_id == user_id)
+    if year is not None:
+        query = query.filter(LeaveLedgerEntry.year == year)
+    return query.order_by(LeaveLedgerEntry.created_at, LeaveLedgerEntry.id).all()
+
+
+def carry_forward(
+    db: Session, year: int, limits: Optional[Dict[str, int]] = None, actor_id: Optional[int] = None
+) -> int:
+    """
+    Move unused days of `year` into `year + 1` (up to `limits` per type) as adjustments,
+    for every active user employed in `year`. Users without a balance row for a type
+    haven't used any of it and carry forward from the default allowance.
+    Skips balances already carried forward; returns the number of entries posted. Caller commits.
+    """
+    limits = DEFAULT_CARRY_FORWARD_LIMITS if limits is None else limits
+    if not limits:
+        return 0
+    note = f"Carried forward from {year}"
+    done = {
+        (user_id, leave_type)
+        for user_id, leave_type in db.query(LeaveLedgerEntry.user_id, LeaveLedgerEntry.leave_type).filter(
+            LeaveLedgerEntry.year == year + 1,
+            LeaveLedgerEntry.entry_type == "adjustment",
+            LeaveLedgerEntry.note == note,
+        )
+    }
+    rows = {
+        (user_id, leave_type): (allocated, used)
+        for user_id, leave_type, allocated, used in db.query(
+            LeaveBalance.user_id, LeaveBalance.leave_type, LeaveBalance.allocated, LeaveBalance.used
+        ).filter(LeaveBalance.year == year, LeaveBalance.leave_type.in_(list(limits)))
+    }
+    user_ids = [
+        user_id
+        for (user_id,) in db.query(User.user_id)
+        .filter(
+            User.is_active.is_(True),
+            or_(User.joining_date.is_(None), User.joining_date < datetime(year + 1, 1, 1)),
+        )
+        .order_by(User.user_id)
+    ]
+    entries = []
+    for user_id in user_ids:
+        for leave_type, limit in limits.items():
+            if (user_id, leave_type) in done:
+                continue
+            allocated, used = rows.get((user_id, leave_type), (DEFAULT_LEAVE_ALLOWANCES.get(leave_type, 0), 0))
+            days = min(max(allocated - used, 0), limit)
+            if days > 0:
+                entries.append(_entry_row(user_id, year + 1, leave_type, "adjustment", days, actor_id=actor_id, note=note))
+    _post_entries(db, entries)
+    return len(entries)
+
+
+def rebuild_leave_balances(db: Session) -> int:
+    """Post debits for approved leaves that predate the ledger; returns how many leaves were synced."""
+    synced = 0
+    debited = db.query(LeaveLedgerEntry.leave_id).filter(LeaveLedgerEntry.leave_id.isnot(None)).distinct()
+    for leave in (
+        db.query(Leave)
+        .filter(func.lower(Leave.status) == "approved", Leave.leave_id.notin_(debited))
+        .order_by(Leave.leave_id)
+        .all()
+    ):
+        sync_leave_debits(db, leave)
+        synced += 1
+    db.commit()
+    return synced
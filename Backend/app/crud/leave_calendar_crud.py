@@ -0,0 +1,145 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db.models.leave import Leave
+from app.db.models.user import User
+
+# Leaves that take someone off the calendar; rejected and cancelled ones don't
+CALENDAR_STATUSES = ("pending", "approved")
+
+
+def _day(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _overlapping(query, start: date, end: date):
+    """Leaves of `query` that cover any day of start..end (both included)."""
+    return query.filter(
+        Leave.start_date < datetime.combine(end + timedelta(days=1), datetime.min.time()),
+        Leave.end_date >= datetime.combine(start, datetime.min.time()),
+        func.lower(Leave.status).in_(CALENDAR_STATUSES),
+    )
+
+
+def _merge(intervals: List[Tuple[date, date]]) -> List[Tuple[date, date]]:
+    """Union of day intervals, so a person with overlapping leaves counts once per day."""
+    merged: List[Tuple[date, date]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def team_coverage(
+    leaves: Iterable[Tuple[int, str, date, date]], headcount: int, start: date, end: date
+) -> List[dict]:
+    """
+    Per day of start..end: people on approved leave, people with a pending request and
+    how many of `headcount` remain available. `leaves` are (user_id, status, start, end);
+    one sweep over the sorted interval boundaries, no per-day work beyond the output.
+    """
+    per_person: Dict[Tuple[int, bool], List[Tuple[date, date]]] = defaultdict(list)
+    for user_id, status, leave_start, leave_end in leaves:
+        per_person[(user_id, (status or "").lower() == "approved")].append((_day(leave_start), _day(leave_end)))
+
+    # day -> [change in approved, change in pending]
+    deltas: Dict[date, List[int]] = defaultdict(lambda: [0, 0])
+    for (_, approved), intervals in per_person.items():
+        slot = 0 if approved else 1
+        for leave_start, leave_end in _merge(intervals):
+            leave_start, leave_end = max(leave_start, start), min(leave_end, end)
+            if leave_start > leave_end:
+                continue
+            deltas[leave_start][slot] += 1
+            deltas[leave_end + timedelta(days=1)][slot] -= 1
+
+    coverage = []
+    on_leave = pending = 0
+    day = start
+    while day <= end:
+        change = deltas.get(day)
+        if change:
+            on_leave += change[0]
+            pending += change[1]
+        coverage.append({
+            "date": day,
+            "on_leave": on_leave,
+            "pending": pending,
+            "available": max(headcount - on_leave, 0),
+        })
+        day += timedelta(days=1)
+    return coverage
+
+
+def _department_filter(department: str):
+    return func.coalesce(func.trim(User.department), "") == department.strip()
+
+
+def department_leave_calendar(db: Session, department: str, start: date, end: date) -> dict:
+    """
+    Who in `department` is off (or has asked to be) between start and end, with daily
+    coverage: one interval query over the department's leaves and one headcount.
+    """
+    rows = (
+        _overlapping(
+            db.query(
+                Leave.leave_id,
+                Leave.user_id,
+                User.name,
+                User.employee_id,
+                Leave.leave_type,
+                Leave.status,
+                Leave.start_date,
+                Leave.end_date,
+            ).join(User, User.user_id == Leave.user_id),
+            start,
+            end,
+        )
+        .filter(_department_filter(department), User.is_active.is_(True))
+        .order_by(Leave.start_date, User.name, Leave.leave_id)
+        .all()
+    )
+    headcount = (
+        db.query(func.count(User.user_id))
+        .filter(_department_filter(department), User.is_active.is_(True))
+        .scalar()
+    )
+    return {
+        "department": department.strip(),
+        "start_date": start,
+        "end_date": end,
+        "headcount": headcount,
+        "leaves": [
+            {
+                "leave_id": row.leave_id,
+                "user_id": row.user_id,
+                "name": row.name,
+                "employee_id": row.employee_id,
+                "leave_type": (row.leave_type or "annual").lower(),
+                "status": row.status,
+                "start_date": _day(row.start_date),
+                "end_date": _day(row.end_date),
+                "days": (_day(row.end_date) - _day(row.start_date)).days + 1,
+            }
+            for row in rows
+        ],
+        "coverage": team_coverage(
+            ((row.user_id, row.status, row.start_date, row.end_date) for row in rows), headcount, start, end
+        ),
+    }
+
+
+def overlapping_user_leaves(
+    db: Session, user_id: int, start: date, end: date, exclude_leave_id: Optional[int] = None
+) -> List[Leave]:
+    """The user's pending / approved leaves sharing a day with start..end."""
+    query = _overlapping(db.query(Leave).filter(Leave.user_id == user_id), start, end)
+    if exclude_leave_id is not None:
+        query = query.filter(Leave.leave_id != exclude_leave_id)
+    return query.order_by(Leave.start_date).all()
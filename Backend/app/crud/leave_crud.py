@@ -1,18 +1,14 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, or_
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional
+from app.crud.activity_crud import activity_row, record_activities, record_activity
+from app.crud.leave_balance_crud import sync_leave_debits, sync_leaves_debits
 from app.db.models.leave import Leave
 from app.db.models.notification import LeaveNotification
 from app.db.models.user import User
 from app.enums import RoleEnum
 
-DEFAULT_LEAVE_ALLOWANCES = {
-    "annual": 15,
-    "sick": 10,
-    "casual": 5,
-}
-
 def apply_leave(
     db: Session,
     user_id: int,
@@ -29,12 +25,18 @@ def apply_leave(
         leave_type=leave_type,
     )
     db.add(leave)
+    db.flush()
+    record_activity(
+        db, "leave", "requested", db.get(User, user_id), leave.leave_id, "pending",
+        reason or f"{leave_type or 'Leave'} request", actor_id=user_id,
+    )
     db.commit()
     db.refresh(leave)
     return leave
 
 def approve_leave(db: Session, leave_id: int, approver_id: int = None, comments: str = None):
-    leave = db.query(Leave).filter(Leave.leave_id == leave_id).first()
+    # Locked so concurrent decisions on the same leave post its ledger entries once
+    leave = db.query(Leave).filter(Leave.leave_id == leave_id).with_for_update().first()
     if leave:
         leave.status = "Approved"
         if approver_id:
@@ -42,12 +44,17 @@ def approve_leave(db: Session, leave_id: int, approver_id: int = None, comments:
         leave.approved_at = datetime.now()
         if comments:
             leave.comments = comments
+        sync_leave_debits(db, leave, actor_id=approver_id)
+        record_activity(
+            db, "leave", "approved", leave.user, leave.leave_id, "approved",
+            f"{leave.leave_type or 'Leave'} leave approved", actor_id=approver_id,
+        )
         db.commit()
         db.refresh(leave)
     return leave
 
 def reject_leave(db: Session, leave_id: int, approver_id: int = None, rejection_reason: str = None):
-    leave = db.query(Leave).filter(Leave.leave_id == leave_id).first()
+    leave = db.query(Leave).filter(Leave.leave_id == leave_id).with_for_update().first()
     if leave:
         leave.status = "Rejected"
         if approver_id:
@@ -55,10 +62,101 @@ def reject_leave(db: Session, leave_id: int, approver_id: int = None, rejection_
         leave.approved_at = datetime.now()
         if rejection_reason:
             leave.rejection_reason = rejection_reason
+        # Returns the days if the leave had been approved
+        sync_leave_debits(db, leave, actor_id=approver_id)
+        record_activity(
+            db, "leave", "rejected", leave.user, leave.leave_id, "rejected",
+            f"{leave.leave_type or 'Leave'} leave rejected", actor_id=approver_id,
+        )
         db.commit()
         db.refresh(leave)
     return leave
 
+def can_decide_leave(approver: User, requester: Optional[User]) -> bool:
+    """
+    The approvals inbox rule: Admin decides everyone else's requests; HR and Managers
+    decide Employee / Team Lead requests from their own department.
+    """
+    if requester is None or requester.user_id == approver.user_id:
+        return False
+    approver_role = getattr(approver.role, "value", str(approver.role))
+    requester_role = getattr(requester.role, "value", str(requester.role))
+    if approver_role == RoleEnum.ADMIN.value:
+        return requester_role != RoleEnum.ADMIN.value
+    if approver_role in (RoleEnum.HR.value, RoleEnum.MANAGER.value):
+        department = (approver.department or "").strip()
+        return (
+            bool(department)
+            and (requester.department or "").strip() == department
+            and requester_role in (RoleEnum.EMPLOYEE.value, RoleEnum.TEAM_LEAD.value)
+        )
+    return False
+
+
+def decide_leaves(
+    db: Session,
+    leave_ids: List[int],
+    approver: User,
+    approve: bool,
+    comments: Optional[str] = None,
+) -> Dict[int, str]:
+    """
+    Approve or reject pending leaves in one transaction. Returns {leave_id: result} with
+    result approved / rejected / not_found / forbidden / not_pending.
+    Leaves and requesters are read (and the leaves locked) in one query, decided with a
+    single UPDATE, and the ledger, activity events and notifications are written in bulk.
+    """
+    leaves = (
+        db.query(Leave)
+        .options(joinedload(Leave.user))
+        .filter(Leave.leave_id.in_(leave_ids))
+        .with_for_update(of=Leave)
+        .all()
+    )
+    by_id = {leave.leave_id: leave for leave in leaves}
+    decision = "approved" if approve else "rejected"
+    results: Dict[int, str] = {}
+    decided: List[Leave] = []
+    for leave_id in leave_ids:
+        leave = by_id.get(leave_id)
+        if leave is None:
+            results[leave_id] = "not_found"
+        elif not can_decide_leave(approver, leave.user):
+            results[leave_id] = "forbidden"
+        elif leave.status != "Pending":
+            results[leave_id] = "not_pending"
+        else:
+            results[leave_id] = decision
+            decided.append(leave)
+    if not decided:
+        return results
+
+    values = {
+        Leave.status: "Approved" if approve else "Rejected",
+        Leave.approved_by: approver.user_id,
+        Leave.approved_at: datetime.now(),
+    }
+    if comments:
+        values[Leave.comments if approve else Leave.rejection_reason] = comments
+    # "evaluate" also applies the values to the loaded leaves for the ledger below
+    db.query(Leave).filter(
+        Leave.leave_id.in_([leave.leave_id for leave in decided]), Leave.status == "Pending"
+    ).update(values, synchronize_session="evaluate")
+
+    sync_leaves_debits(db, decided, actor_id=approver.user_id)
+    record_activities(db, [
+        activity_row(
+            "leave", decision, leave.user, leave.leave_id, decision,
+            f"{leave.leave_type or 'Leave'} leave {decision}", actor_id=approver.user_id,
+        )
+        for leave in decided
+    ])
+    notifications = [_leave_decision_notification_row(leave, approver, approve) for leave in decided]
+    db.execute(LeaveNotification.__table__.insert(), notifications)
+    db.commit()
+    return results
+
+
 def list_leave(db: Session, user_id: int):
     return db.query(Leave).filter(Leave.user_id == user_id).all()
 
@@ -91,6 +189,7 @@ def update_leave(
         leave.reason = reason
     if leave_type:
         leave.leave_type = leave_type
+    sync_leave_debits(db, leave, actor_id=user_id)
 
     db.commit()
     db.refresh(leave)
@@ -114,50 +213,6 @@ def delete_leave(db: Session, leave_id: int, user_id: int):
     return True
 
 
-def get_leave_balance(db: Session, user_id: int):
-    # Initialize balances with defaults
-    balances = {
-        leave_type: {
-            "leave_type": leave_type,
-            "allocated": allocation,
-            "used": 0,
-            "remaining": allocation,
-        }
-        for leave_type, allocation in DEFAULT_LEAVE_ALLOWANCES.items()
-    }
-
-    approved_leaves = (
-        db.query(Leave)
-        .filter(Leave.user_id == user_id, func.lower(Leave.status) == "approved")
-        .all()
-    )
-
-    for leave in approved_leaves:
-        leave_type = (leave.leave_type or "annual").lower()
-        start_date = leave.start_date.date() if isinstance(leave.start_date, datetime) else leave.start_date
-        end_date = leave.end_date.date() if isinstance(leave.end_date, datetime) else leave.end_date
-        days = (end_date - start_date).days + 1
-        if days < 0:
-            days = 0
-
-        if leave_type not in balances:
-            balances[leave_type] = {
-                "leave_type": leave_type,
-                "allocated": 0,
-                "used": 0,
-                "remaining": 0,
-            }
-
-        balances[leave_type]["used"] += days
-
-    for leave_type, data in balances.items():
-        remaining = data["allocated"] - data["used"]
-        data["remaining"] = remaining if remaining >= 0 else 0
-
-    # Return as list sorted by leave type for consistency
-    return list(balances.values())
-
-
 def list_leave_by_period(db: Session, user_id: int, period: str = "current_month") -> List[Leave]:
     """
     Get leave history for a user filtered by time period.
@@ -236,33 +291,55 @@ def list_pending_by_department(db: Session, department: str):
     )
 
 
-def list_pending_by_requester_roles(db: Session, roles: list[str]):
-    return (
-        db.query(Leave)
-        .join(User, User.user_id == Leave.user_id)
-        .filter(Leave.status == "Pending", User.role.in_(roles))
-        .all()
-    )
-
-
-def list_pending_by_department_and_roles(db: Session, department: str, roles: list[str]):
-    return (
-        db.query(Leave)
-        .join(User, User.user_id == Leave.user_id)
-        .filter(Leave.status == "Pending", User.department == department, User.role.in_(roles))
-        .all()
-    )
+def leave_with_user_row(leave: Leave, user) -> dict:
+    """LeaveWithUserOut fields from a leave and its requester's columns (None if the user is gone)."""
+    return {
+        "leave_id": leave.leave_id,
+        "user_id": leave.user_id,
+        "start_date": leave.start_date.date(),
+        "end_date": leave.end_date.date(),
+        "reason": leave.reason,
+        "status": leave.status,
+        "leave_type": (leave.leave_type or "annual").lower(),
+        "employee_id": (user.employee_id if user else None) or "",
+        "name": (user.name if user else None) or "",
+        "department": user.department if user else None,
+        "role": str(user.role) if user and user.role else None,
+        "profile_photo": user.profile_photo if user else None,
+        "email": user.email if user else None,
+        "days": (leave.end_date.date() - leave.start_date.date()).days + 1,
+        "created_at": leave.created_at,
+        "approved_by": leave.approved_by,
+        "approved_at": leave.approved_at,
+        "rejection_reason": leave.rejection_reason,
+        "comments": leave.comments,
+    }
 
 
-def list_decided_by_approver(db: Session, approver_id: int):
-    # Fallback implementation without approver tracking fields.
-    # Returns all leaves that have been decided (not Pending).
-    return (
-        db.query(Leave)
-        .filter(Leave.status != "Pending")
-        .order_by(Leave.end_date.desc())
-        .all()
+def list_leaves_with_users(
+    db: Session,
+    *criteria,
+    order_by: tuple = (Leave.leave_id,),
+    skip: int = 0,
+    limit: Optional[int] = None,
+) -> List[dict]:
+    """
+    Leaves matching `criteria` (which may filter on User columns) as leave_with_user_row
+    dicts: the requester's columns are joined into the same query, so a page costs one
+    SELECT however many rows it has.
+    """
+    query = (
+        db.query(Leave, User.employee_id, User.name, User.department, User.role, User.profile_photo, User.email)
+        .outerjoin(User, User.user_id == Leave.user_id)
+        .filter(*criteria)
+        .order_by(*order_by)
     )
+    if skip:
+        query = query.offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    # email is required, so a NULL one means the outer join found no user
+    return [leave_with_user_row(row.Leave, row if row.email is not None else None) for row in query]
 
 
 def _get_leave_notification_recipients(db: Session, requester: User) -> List[User]:
@@ -365,6 +442,27 @@ def create_leave_request_notifications(db: Session, leave: Leave, requester: Use
     return notifications
 
 
+def _leave_decision_notification_row(leave: Leave, approver: User, approved: bool) -> dict:
+    decision = "approved" if approved else "rejected"
+    title = f"Leave Request {decision.capitalize()}"
+
+    start_str = leave.start_date.strftime("%d %b %Y") if leave.start_date else ""
+    end_str = leave.end_date.strftime("%d %b %Y") if leave.end_date else ""
+
+    message = (
+        f"Your leave request from {start_str} to {end_str} "
+        f"has been {decision} by {approver.name or 'your approver'}."
+    )
+    return {
+        "user_id": leave.user_id,
+        "leave_id": leave.leave_id,
+        "notification_type": title,
+        "title": title,
+        "message": message,
+        "is_read": False,
+    }
+
+
 def create_leave_decision_notification(
     db: Session,
     *,
@@ -380,25 +478,7 @@ def create_leave_decision_notification(
     if requester.user_id == approver.user_id:
         return None
 
-    decision = "approved" if approved else "rejected"
-    title = f"Leave Request {decision.capitalize()}"
-
-    start_str = leave.start_date.strftime("%d %b %Y") if leave.start_date else ""
-    end_str = leave.end_date.strftime("%d %b %Y") if leave.end_date else ""
-
-    message = (
-        f"Your leave request from {start_str} to {end_str} "
-        f"has been {decision} by {approver.name or 'your approver'}."
-    )
-
-    notification = LeaveNotification(
-        user_id=requester.user_id,
-        leave_id=leave.leave_id,
-        notification_type=title,
-        title=title,
-        message=message,
-        is_read=False,
-    )
+    notification = LeaveNotification(**_leave_decision_notification_row(leave, approver, approved))
 
     db.add(notification)
     db.commit()
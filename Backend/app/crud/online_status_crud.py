@@ -0,0 +1,190 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from app.db.models.attendance import Attendance
+from app.db.models.online_status import OnlineStatus, OnlineStatusLog, OnlineStatusLogArchive
+from app.db.models.user import User
+
+
+def duration_minutes(start: Optional[datetime], end: Optional[datetime]) -> float:
+    if not start or not end:
+        return 0.0
+    return round((end - start).total_seconds() / 60, 2)
+
+
+def add_closed_minutes(online_status: OnlineStatus, status: str, minutes: float) -> None:
+    if status == "online":
+        online_status.total_online_minutes = round((online_status.total_online_minutes or 0.0) + minutes, 2)
+    else:
+        online_status.total_offline_minutes = round((online_status.total_offline_minutes or 0.0) + minutes, 2)
+
+
+def lock_online_status(db: Session, user_id: int, attendance_id: int) -> Optional[OnlineStatus]:
+    """
+    The session's status row, locked and re-read. Every path that closes logs and adds to
+    the running totals (toggle, check-out, presence flush, sweeper) holds this lock first.
+    """
+    return (
+        db.query(OnlineStatus)
+        .filter(OnlineStatus.user_id == user_id, OnlineStatus.attendance_id == attendance_id)
+        .with_for_update()
+        .populate_existing()
+        .first()
+    )
+
+
+def get_open_log(db: Session, online_status_id: int) -> Optional[OnlineStatusLog]:
+    return (
+        db.query(OnlineStatusLog)
+        .filter(OnlineStatusLog.online_status_id == online_status_id, OnlineStatusLog.ended_at.is_(None))
+        .first()
+    )
+
+
+def load_status_logs(db: Session, online_status_id: int, newest_first: bool = False) -> list:
+    """
+    A session's logs by started_at: the archived ones (online_status_log_archive) plus any
+    still in online_status_logs, e.g. written after the session was archived.
+    """
+    logs = [
+        log
+        for model in (OnlineStatusLogArchive, OnlineStatusLog)
+        for log in db.query(model).filter(model.online_status_id == online_status_id)
+    ]
+    return sorted(logs, key=lambda log: (log.started_at, log.id), reverse=newest_first)
+
+
+def close_status_log(online_status: OnlineStatus, log: OnlineStatusLog, ended_at: Optional[datetime] = None) -> None:
+    """End `log` and fold its duration into the session's running totals."""
+    log.ended_at = ended_at or datetime.utcnow()
+    log.duration_minutes = duration_minutes(log.started_at, log.ended_at)
+    add_closed_minutes(online_status, log.status, log.duration_minutes)
+
+
+def open_status_log(
+    db: Session,
+    online_status: OnlineStatus,
+    status: str,
+    offline_reason: Optional[str] = None,
+    started_at: Optional[datetime] = None,
+) -> OnlineStatusLog:
+    log = OnlineStatusLog(
+        user_id=online_status.user_id,
+        attendance_id=online_status.attendance_id,
+        online_status_id=online_status.id,
+        status=status,
+        offline_reason=offline_reason if status == "offline" else None,
+        started_at=started_at or datetime.utcnow(),
+    )
+    db.add(log)
+    if status == "offline":
+        online_status.offline_count = (online_status.offline_count or 0) + 1
+    return log
+
+
+def status_time_summary(db: Session, online_status: OnlineStatus, now: Optional[datetime] = None) -> dict:
+    """Running totals plus the open log's elapsed time: two rows read however many toggles."""
+    total_online = online_status.total_online_minutes or 0.0
+    total_offline = online_status.total_offline_minutes or 0.0
+    open_log = get_open_log(db, online_status.id)
+    if open_log:
+        elapsed = duration_minutes(open_log.started_at, now or datetime.utcnow())
+        if open_log.status == "online":
+            total_online += elapsed
+        else:
+            total_offline += elapsed
+    return {
+        "total_online_minutes": round(total_online, 2),
+        "total_offline_minutes": round(total_offline, 2),
+        "effective_work_hours": round(total_online / 60, 2),
+        "offline_count": online_status.offline_count or 0,
+    }
+
+
+def team_presence(db: Session, department: str, day_start: datetime, now: Optional[datetime] = None) -> List[dict]:
+    """
+    Today's attendance state and presence of every active member of `department`, in one query:
+    users outer-joined to attendance since `day_start`, their online status and its open log.
+    """
+    now = now or datetime.utcnow()
+    rows = (
+        db.query(
+            User.user_id,
+            User.name,
+            User.role,
+            User.designation,
+            Attendance.attendance_id,
+            Attendance.check_in,
+            Attendance.check_out,
+            OnlineStatus.id.label("status_id"),
+            OnlineStatus.is_online,
+            OnlineStatus.total_online_minutes,
+            OnlineStatusLog.status.label("log_status"),
+            OnlineStatusLog.offline_reason,
+            OnlineStatusLog.started_at.label("log_started_at"),
+        )
+        .outerjoin(Attendance, and_(Attendance.user_id == User.user_id, Attendance.check_in >= day_start))
+        .outerjoin(OnlineStatus, and_(
+            OnlineStatus.user_id == User.user_id,
+            OnlineStatus.attendance_id == Attendance.attendance_id,
+        ))
+        .outerjoin(OnlineStatusLog, and_(
+            OnlineStatusLog.online_status_id == OnlineStatus.id,
+            OnlineStatusLog.ended_at.is_(None),
+        ))
+        .filter(func.coalesce(func.trim(User.department), "") == department.strip(), User.is_active.is_(True))
+        .order_by(User.name, User.user_id, Attendance.check_in)
+        .all()
+    )
+
+    members: Dict[int, dict] = {}
+    counted = set()
+    for row in rows:
+        member = members.get(row.user_id)
+        if member is None:
+            member = members[row.user_id] = {
+                "user_id": row.user_id,
+                "name": row.name,
+                "role": row.role.value if row.role else None,
+                "designation": row.designation,
+                "attendance_state": "absent",
+                "attendance_id": None,
+                "check_in": None,
+                "check_out": None,
+                "is_online": False,
+                "offline_reason": None,
+                "session_started_at": None,
+                "online_minutes_today": 0.0,
+            }
+        if row.attendance_id is None or row.attendance_id in counted:
+            continue
+        counted.add(row.attendance_id)
+
+        active = row.check_out is None
+        if row.status_id is None:
+            # Not opened yet; /current would create it Online from now on
+            is_online, started_at, reason, minutes = active, row.check_in if active else None, None, 0.0
+            if active:
+                minutes = duration_minutes(row.check_in, now)
+        else:
+            is_online, started_at, reason = active and row.is_online, row.log_started_at, row.offline_reason
+            minutes = row.total_online_minutes or 0.0
+            if row.log_status == "online":
+                minutes += duration_minutes(row.log_started_at, now)
+        member["online_minutes_today"] = round(member["online_minutes_today"] + minutes, 2)
+
+        # Rows are ordered by check-in, so the latest attendance (an active one above all) wins
+        if active or member["attendance_state"] != "checked_in":
+            member.update(
+                attendance_state="checked_in" if active else "checked_out",
+                attendance_id=row.attendance_id,
+                check_in=row.check_in,
+                check_out=row.check_out,
+                is_online=is_online,
+                offline_reason=reason if active and not is_online else None,
+                session_started_at=started_at if active else None,
+            )
+    return list(members.values())
@@ -0,0 +1,181 @@
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import uuid
+import logging
+from app.db.models.refresh_token import RefreshToken
+from app.db.models.user import User
+from app.core.config import settings
+from app.core.security import generate_refresh_token, hash_refresh_token
+
+logger = logging.getLogger(__name__)
+
+
+def _new_expiry(now: datetime, session_started_at: datetime) -> datetime:
+    """Sliding expiry, never beyond the absolute session lifetime."""
+    sliding = now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    absolute = session_started_at + timedelta(days=settings.REFRESH_SESSION_MAX_DAYS)
+    return min(sliding, absolute)
+
+
+def _as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+
+def create_refresh_token(
+    db: Session,
+    user_id: int,
+    device_name: Optional[str] = None,
+    user_agent: Optional[str] = None,
+    ip_address: Optional[str] = None,
+) -> Tuple[str, RefreshToken]:
+    """Start a new device session. Returns the raw token (shown once) and its row."""
+    now = datetime.utcnow()
+    raw_token = generate_refresh_token()
+    record = RefreshToken(
+        user_id=user_id,
+        session_id=uuid.uuid4().hex,
+        token_hash=hash_refresh_token(raw_token),
+        device_name=(device_name or "")[:255] or None,
+        user_agent=(user_agent or "")[:512] or None,
+        ip_address=ip_address,
+        session_started_at=now,
+        created_at=now,
+        expires_at=_new_expiry(now, now),
+    )
+    db.add(record)
+    db.commit()
+    db.refresh(record)
+    return raw_token, record
+
+
+def revoke_session(db: Session, user_id: int, session_id: str) -> int:
+    """Revoke every live token of one device session. Returns number of rows revoked."""
+    revoked = (
+        db.query(RefreshToken)
+        .filter(
+            RefreshToken.user_id == user_id,
+            RefreshToken.session_id == session_id,
+            RefreshToken.revoked_at.is_(None),
+        )
+        .update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+    )
+    db.commit()
+    return revoked
+
+
+def revoke_all_sessions(db: Session, user_id: int, except_session_id: Optional[str] = None) -> int:
+    query = db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.revoked_at.is_(None),
+    )
+    if except_session_id:
+        query = query.filter(RefreshToken.session_id != except_session_id)
+    revoked = query.update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+    return revoked
+
+
+def _revoke_reused_session(db: Session, current: RefreshToken) -> None:
+    # A rotated token came back: assume it was stolen and kill the whole session
+    logger.warning(f"Refresh token reuse detected for user {current.user_id}, session {current.session_id}")
+    revoke_session(db, current.user_id, current.session_id)
+
+
+def rotate_refresh_token(db: Session, raw_token: str) -> Optional[Tuple[str, RefreshToken, User]]:
+    """
+    Exchange a refresh token for a new one in the same session.
+    Single indexed lookup (token hash joined to its user), one INSERT and one conditional
+    UPDATE that claims the old token; a caller that loses that race to a concurrent
+    refresh of the same token is treated as token reuse.
+    Returns None when the token is unknown, expired, revoked or the user is inactive.
+    """
+    now = datetime.utcnow()
+    row = (
+        db.query(RefreshToken, User)
+        .join(User, User.user_id == RefreshToken.user_id)
+        .filter(RefreshToken.token_hash == hash_refresh_token(raw_token))
+        .first()
+    )
+    if not row:
+        return None
+    current, user = row
+
+    if current.revoked_at is not None:
+        if current.replaced_by_id is not None:
+            _revoke_reused_session(db, current)
+        return None
+
+    if _as_naive_utc(current.expires_at) <= now or not user.is_active:
+        return None
+
+    new_raw = generate_refresh_token()
+    session_started_at = _as_naive_utc(current.session_started_at) or now
+    replacement = RefreshToken(
+        user_id=current.user_id,
+        session_id=current.session_id,
+        token_hash=hash_refresh_token(new_raw),
+        device_name=current.device_name,
+        user_agent=current.user_agent,
+        ip_address=current.ip_address,
+        session_started_at=session_started_at,
+        created_at=now,
+        expires_at=_new_expiry(now, session_started_at),
+    )
+    db.add(replacement)
+    db.flush()
+
+    claimed = (
+        db.query(RefreshToken)
+        .filter(RefreshToken.id == current.id, RefreshToken.revoked_at.is_(None))
+        .update(
+            {RefreshToken.revoked_at: now, RefreshToken.replaced_by_id: replacement.id},
+            synchronize_session=False,
+        )
+    )
+    if not claimed:
+        # Another request rotated this token since we read it
+        db.rollback()
+        _revoke_reused_session(db, current)
+        return None
+    db.commit()
+    return new_raw, replacement, user
+
+
+def find_active_token(db: Session, raw_token: str) -> Optional[RefreshToken]:
+    return (
+        db.query(RefreshToken)
+        .filter(
+            RefreshToken.token_hash == hash_refresh_token(raw_token),
+            RefreshToken.revoked_at.is_(None),
+        )
+        .first()
+    )
+
+
+def list_active_sessions(db: Session, user_id: int) -> List[RefreshToken]:
+    """The live token of each session carries the session's device details and last refresh time."""
+    return (
+        db.query(RefreshToken)
+        .filter(
+            RefreshToken.user_id == user_id,
+            RefreshToken.revoked_at.is_(None),
+            RefreshToken.expires_at > datetime.utcnow(),
+        )
+        .order_by(RefreshToken.created_at.desc())
+        .all()
+    )
+
+
+def purge_expired_tokens(db: Session, older_than_days: int = 7) -> int:
+    """Delete rows that expired or were revoked more than `older_than_days` ago."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    deleted = (
+        db.query(RefreshToken)
+        .filter((RefreshToken.expires_at < cutoff) | (RefreshToken.revoked_at < cutoff))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
@@ -5,6 +5,7 @@ from typing import Optional
 from sqlalchemy import inspect, or_, text
 from sqlalchemy.orm import Session
 
+from app.crud.activity_crud import record_activity
 from app.db.models.task import Task, TaskHistory, TaskComment
 from app.db.models.notification import TaskNotification
 from app.db.models.user import User
@@ -104,6 +105,10 @@ def create_task(db: Session, title: str, description: str, assigned_by: int, ass
             "status": TaskStatus.PENDING.value,
         },
     )
+    record_activity(
+        db, "task", "created", db.get(User, assigned_to) if assigned_to else None, task.task_id,
+        TaskStatus.PENDING.value.lower(), task.title, actor_id=assigned_by,
+    )
 
     if assigned_to and assigned_to != assigned_by:
         create_task_notification(
@@ -179,6 +184,10 @@ def update_task_status(db: Session, task_id: int, status: TaskStatus, updated_by
                 "to": status.value,
             },
         )
+        record_activity(
+            db, "task", "status_changed", task.assigned_to_user, task_id,
+            status.value.lower(), task.title, actor_id=updated_by,
+        )
         db.commit()
     return task
 
@@ -1,16 +1,10 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import or_, func
+from app.crud.activity_crud import record_activity
 from app.db.models.user import User
 from app.enums import RoleEnum
 from passlib.context import CryptContext
 from app.schemas.user_schema import UserCreate
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4, letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.pdfgen import canvas
 from datetime import datetime
 import io
 import csv
@@ -93,6 +87,8 @@ def create_user(db: Session, user: UserCreate):
         profile_photo=user.profile_photo
     )
     db.add(db_user)
+    db.flush()
+    record_activity(db, "join", "created", db_user, db_user.user_id, "new-joiner", f"Joined {db_user.department or 'company'}")
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -142,6 +138,15 @@ def delete_user(db: Session, user_id: int):
 
 def export_users_pdf(db: Session):
     """Generate a modern, professional PDF with company branding and hierarchical organization"""
+    # reportlab is imported here, not at module level, to keep worker start-up fast
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+    from reportlab.pdfgen import canvas
+
     buffer = io.BytesIO()
     
     # Custom page template with watermark
@@ -0,0 +1,105 @@
+"""
+Async engine and session for the highest-traffic endpoints (check-in/out,
+online-status toggle, /me).
+
+The async URL is derived from DATABASE_URL (mysql+pymysql -> mysql+aiomysql,
+sqlite -> sqlite+aiosqlite) unless ASYNC_DATABASE_URL is set. When no async
+driver is installed, get_async_db falls back to ThreadpoolSession, which runs
+the same calls on a sync session in the threadpool, so the event loop is never
+blocked either way.
+
+Existing sync helpers can be reused via `await db.run_sync(helper, *args)`.
+"""
+import logging
+from typing import Optional
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import HTTPConnection
+
+from app.core.config import settings
+from app.core.sql_instrumentation import instrument_engine
+from app.core.metrics import instrument_pool, pool_options
+from app.db.database import PrimarySession, SessionLocal, engine, read_engine, request_subject
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "mysql": "aiomysql"}
+
+
+def _async_database_url() -> Optional[str]:
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    url = make_url(settings.DATABASE_URL)
+    backend = url.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        return None
+    return url.set(drivername=f"{backend}+{driver}").render_as_string(hide_password=False)
+
+
+async_engine = None
+AsyncSessionLocal = None
+_async_url = _async_database_url()
+if _async_url:
+    try:
+        async_engine = create_async_engine(
+            _async_url, echo=settings.SQL_ECHO, pool_pre_ping=True, **pool_options(_async_url, "async", is_async=True)
+        )
+    except ImportError as exc:
+        logger.warning(f"Async DB driver not installed ({exc}); hot endpoints will use the threadpool")
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine)
+    instrument_pool(async_engine.sync_engine, "async")
+    # expire_on_commit=False: an expired attribute would need an implicit (sync) reload after commit
+    AsyncSessionLocal = async_sessionmaker(async_engine, sync_session_class=PrimarySession, autoflush=False, expire_on_commit=False)
+HAS_ASYNC_DB = AsyncSessionLocal is not None
+
+
+class ThreadpoolSession:
+    """AsyncSession-compatible wrapper that runs a sync session's work in the threadpool."""
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+
+async def get_async_db(connection: HTTPConnection = None):
+    db = AsyncSessionLocal() if HAS_ASYNC_DB else ThreadpoolSession(SessionLocal(expire_on_commit=False))
+    if read_engine is not engine:
+        db.sync_session.info["subject"] = request_subject(connection)
+    try:
+        yield db
+    finally:
+        await db.close()
+
@@ -1,13 +1,153 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from starlette.requests import HTTPConnection
 from app.core.config import settings
+from app.core.security import token_subject
+from app.core.sql_instrumentation import instrument_engine
+from app.core.metrics import instrument_pool, pool_options
+
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+logger = logging.getLogger(__name__)
+
+engine = create_engine(settings.DATABASE_URL, echo=settings.SQL_ECHO, pool_pre_ping=True, **pool_options(settings.DATABASE_URL, "primary"))
+instrument_engine(engine)
+instrument_pool(engine, "primary")
+
 
-engine = create_engine(settings.DATABASE_URL, echo=True, pool_pre_ping=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+class PrimarySession(Session):
+    """Session bound to the primary; its commits feed read-your-writes routing."""
+
+
+SessionLocal = sessionmaker(bind=engine, class_=PrimarySession, autoflush=False, autocommit=False)
 Base = declarative_base()
 
-def get_db():
+# Optional read replica for dashboards, history and exports; falls back to the primary
+if settings.READ_DATABASE_URL:
+    read_engine = create_engine(settings.READ_DATABASE_URL, echo=settings.SQL_ECHO, pool_pre_ping=True, **pool_options(settings.READ_DATABASE_URL, "replica"))
+    instrument_engine(read_engine)
+    instrument_pool(read_engine, "replica")
+else:
+    read_engine = engine
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+
+
+class RecentWriteTracker:
+    """
+    Remembers who committed a write recently so their next reads skip the (lagging) replica.
+    Per process: with several workers, use READ_YOUR_WRITES_BACKEND=redis (RedisRecentWriteTracker).
+    """
+
+    def __init__(self, window_seconds: float, max_entries: int = 50000):
+        self.window_seconds = window_seconds
+        self._writes: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+
+    def mark(self, subject: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._writes[subject] = now
+            if len(self._writes) > self._max_entries:
+                cutoff = now - self.window_seconds
+                self._writes = {key: ts for key, ts in self._writes.items() if ts >= cutoff}
+
+    def wrote_recently(self, subject: Optional[str]) -> bool:
+        if not subject:
+            return False
+        with self._lock:
+            ts = self._writes.get(subject)
+        return ts is not None and time.monotonic() - ts < self.window_seconds
+
+
+class RedisRecentWriteTracker:
+    """RecentWriteTracker shared by all workers: one expiring redis key per writer."""
+
+    def __init__(self, url: str, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._client = redis.Redis.from_url(url)
+
+    def mark(self, subject: str) -> None:
+        try:
+            self._client.set(f"recentwrite:{subject}", 1, px=max(int(self.window_seconds * 1000), 1))
+        except redis.RedisError as e:
+            logger.error(f"Failed to record a recent write for read-your-writes: {str(e)}")
+
+    def wrote_recently(self, subject: Optional[str]) -> bool:
+        if not subject:
+            return False
+        try:
+            return bool(self._client.exists(f"recentwrite:{subject}"))
+        except redis.RedisError as e:
+            logger.error(f"Failed to check recent writes, reading from the primary: {str(e)}")
+            return True
+
+
+def _build_recent_writes():
+    if settings.READ_YOUR_WRITES_BACKEND.lower() == "redis":
+        url = settings.READ_YOUR_WRITES_REDIS_URL or settings.RATE_LIMIT_REDIS_URL
+        if not HAS_REDIS:
+            logger.warning("READ_YOUR_WRITES_BACKEND=redis but the redis package is not installed; tracking writes per process")
+        elif not url:
+            logger.warning("READ_YOUR_WRITES_BACKEND=redis but no redis URL is set; tracking writes per process")
+        else:
+            return RedisRecentWriteTracker(url, settings.READ_YOUR_WRITES_SECONDS)
+    return RecentWriteTracker(settings.READ_YOUR_WRITES_SECONDS)
+
+
+recent_writes = _build_recent_writes()
+
+
+@event.listens_for(PrimarySession, "after_flush")
+def _flag_session_write(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _record_session_write(session):
+    if session.info.pop("has_writes", False) and session.info.get("subject"):
+        recent_writes.mark(session.info["subject"])
+
+
+@event.listens_for(PrimarySession, "after_rollback")
+def _clear_session_write(session):
+    session.info.pop("has_writes", None)
+
+
+def request_subject(connection: Optional[HTTPConnection]) -> Optional[str]:
+    if connection is None:
+        return None
+    return token_subject(connection.headers.get("authorization"))
+
+
+def get_db(connection: HTTPConnection = None):
     db = SessionLocal()
+    if read_engine is not engine:
+        db.info["subject"] = request_subject(connection)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db(connection: HTTPConnection = None):
+    """
+    Session for read-only routes. Uses the replica when READ_DATABASE_URL is set,
+    except for callers who committed a write in the last READ_YOUR_WRITES_SECONDS.
+    """
+    if read_engine is engine or recent_writes.wrote_recently(request_subject(connection)):
+        db = SessionLocal()
+    else:
+        db = ReadSessionLocal()
     try:
         yield db
     finally:
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Explicit database schema setup.
+
+Run once per deploy (not on every worker boot):
+
+    python -m app.db.init_db
+
+Creates missing tables and applies the lightweight column safeguards that
+used to run whenever app.main was imported.
+"""
+from sqlalchemy import inspect, text
+from app.crud.activity_crud import rebuild_activity_events
+from app.crud.leave_balance_crud import rebuild_leave_balances
+from app.db import models
+from app.db.database import SessionLocal, engine
+
+# (table, column, DDL fragment) added when missing on an existing table
+COLUMN_SAFEGUARDS = [
+    ("leaves", "leave_type", "VARCHAR(50) NOT NULL DEFAULT 'annual'"),
+    ("online_statuses", "last_seen_at", "DATETIME NULL"),
+    ("online_statuses", "total_online_minutes", "FLOAT NOT NULL DEFAULT 0"),
+    ("online_statuses", "total_offline_minutes", "FLOAT NOT NULL DEFAULT 0"),
+    ("online_statuses", "offline_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("attendances", "auto_closed_at", "DATETIME NULL"),
+    ("online_status_logs", "auto_closed_at", "DATETIME NULL"),
+]
+
+# (table, index name) of model indexes created when missing on an existing table
+INDEX_SAFEGUARDS = [
+    ("leaves", "ix_leaves_user_start_end"),
+]
+
+# Run once right after the (table, column) safeguard adds the column, to fill it for existing rows
+COLUMN_BACKFILLS = {
+    ("online_statuses", "offline_count"): """
+        UPDATE online_statuses SET
+            total_online_minutes = COALESCE((
+                SELECT SUM(duration_minutes) FROM online_status_logs
+                WHERE online_status_id = online_statuses.id AND status = 'online' AND ended_at IS NOT NULL
+            ), 0),
+            total_offline_minutes = COALESCE((
+                SELECT SUM(duration_minutes) FROM online_status_logs
+                WHERE online_status_id = online_statuses.id AND status <> 'online' AND ended_at IS NOT NULL
+            ), 0),
+            offline_count = (
+                SELECT COUNT(*) FROM online_status_logs
+                WHERE online_status_id = online_statuses.id AND status <> 'online'
+            )
+    """,
+}
+
+# Run once when create_tables() creates the table, to derive it from existing rows
+TABLE_BACKFILLS = {
+    "leave_balances": rebuild_leave_balances,
+    "activity_events": rebuild_activity_events,  # the last 30 days
+}
+
+
+def create_tables() -> None:
+    existing_tables = set(inspect(engine).get_table_names())
+    models.Base.metadata.create_all(bind=engine)
+    print("✅ Database tables created/verified successfully")
+    for table, backfill in TABLE_BACKFILLS.items():
+        if table not in existing_tables:
+            db = SessionLocal()
+            try:
+                backfill(db)
+                print(f"✅ Backfilled {table}")
+            finally:
+                db.close()
+
+
+def apply_column_safeguards() -> None:
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table, column, ddl in COLUMN_SAFEGUARDS:
+            if table not in existing_tables:
+                continue
+            columns = {col["name"] for col in inspector.get_columns(table)}
+            if column not in columns:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                print(f"✅ Added column {table}.{column}")
+                backfill = COLUMN_BACKFILLS.get((table, column))
+                if backfill:
+                    conn.execute(text(backfill))
+                    print(f"✅ Backfilled existing {table} rows")
+
+
+def apply_index_safeguards() -> None:
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table, name in INDEX_SAFEGUARDS:
+            if table not in existing_tables:
+                continue
+            if name not in {index["name"] for index in inspector.get_indexes(table)}:
+                index = next(index for index in models.Base.metadata.tables[table].indexes if index.name == name)
+                index.create(conn)
+                print(f"✅ Added index {table}.{name}")
+
+
+def init_db() -> None:
+    create_tables()
+    apply_column_safeguards()
+    apply_index_safeguards()
+
+
+if __name__ == "__main__":
+    print("Initializing database schema...")
+    init_db()
+    print("\n✅ Database ready!")
@@ -8,7 +8,12 @@ from .hiring import Vacancy, Candidate
 from .shift import Shift, ShiftAssignment, ShiftNotification
 from .department import Department
 from .settings import UserSettings
-from .online_status import OnlineStatus, OnlineStatusLog
+from .online_status import OnlineStatus, OnlineStatusLog, OnlineStatusLogArchive, OnlineStatusDaySummary
+from .refresh_token import RefreshToken
+from .dashboard_snapshot import DashboardSnapshot
+from .attendance_rollup import AttendanceDailyRollup, AttendanceRollupDay
+from .activity_event import ActivityEvent
+from .leave_balance import LeaveBalance, LeaveLedgerEntry
 
 # Base import
 from app.db.database import Base
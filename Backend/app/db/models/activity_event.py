@@ -0,0 +1,32 @@
+"""
+Activity Event Model: append-only feed of check-ins, leave, task and joiner events.
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from app.db.database import Base
+from datetime import datetime
+
+
+class ActivityEvent(Base):
+    """
+    One row per event, denormalized so feeds read without joins.
+    - scope: the subject user's department ("" when they have none)
+    - event_type: attendance, leave, task, join
+    - subject_id: attendance_id / leave_id / task_id / user_id of the event's record
+    """
+    __tablename__ = "activity_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String(255), nullable=False, default="")
+    event_type = Column(String(32), nullable=False)
+    action = Column(String(50), nullable=False)
+    subject_id = Column(Integer, nullable=True)
+    user_id = Column(Integer, nullable=True)  # no FK: events outlive deleted users
+    user_name = Column(String(255), nullable=True)
+    actor_id = Column(Integer, nullable=True)
+    status = Column(String(50), nullable=True)
+    description = Column(String(500), nullable=True)
+    occurred_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    __table_args__ = (
+        Index("ix_activity_events_scope_occurred_at", "scope", "occurred_at"),
+    )
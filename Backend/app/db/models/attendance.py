@@ -15,5 +15,7 @@ class Attendance(Base):
     selfie = Column(String(1024), nullable=True)
     work_summary = Column(Text, nullable=True)
     work_report = Column(String(1024), nullable=True)
+    # Set when the stale-session sweeper checked this attendance out (app.services.session_sweeper)
+    auto_closed_at = Column(DateTime, nullable=True)
 
     user = relationship("User", back_populates="attendances")
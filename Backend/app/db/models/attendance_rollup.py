@@ -0,0 +1,35 @@
+"""
+Attendance Rollup Models: per-day, per-department attendance aggregates for trend charts.
+"""
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, UniqueConstraint
+from app.db.database import Base
+from datetime import datetime
+
+
+class AttendanceDailyRollup(Base):
+    """
+    Attendance totals for one (UTC) day and department.
+    - department: "" for users without a department
+    - total_hours: summed over checked-out records only (checked_out_count of them)
+    """
+    __tablename__ = "attendance_daily_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    department = Column(String(255), nullable=False, default="")
+    present_count = Column(Integer, nullable=False, default=0)
+    late_count = Column(Integer, nullable=False, default=0)
+    checked_out_count = Column(Integer, nullable=False, default=0)
+    total_hours = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        UniqueConstraint("day", "department", name="uq_attendance_daily_rollups_day_department"),
+    )
+
+
+class AttendanceRollupDay(Base):
+    """Days whose rollup rows are complete (a day without attendance has no rollup rows but is still covered)."""
+    __tablename__ = "attendance_rollup_days"
+
+    day = Column(Date, primary_key=True)
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
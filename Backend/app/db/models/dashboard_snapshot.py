@@ -0,0 +1,25 @@
+"""
+Dashboard Snapshot Model: precomputed dashboard responses served as-is.
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint
+from app.db.database import Base
+from datetime import datetime
+
+
+class DashboardSnapshot(Base):
+    """
+    Latest serialized response per dashboard variant.
+    - variant: admin, hr, manager, team-lead
+    - department: "" for organisation-wide variants (admin, hr)
+    """
+    __tablename__ = "dashboard_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    variant = Column(String(32), nullable=False)
+    department = Column(String(255), nullable=False, default="")
+    payload = Column(Text(length=16777215), nullable=False)  # JSON; MEDIUMTEXT on MySQL
+    generated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("variant", "department", name="uq_dashboard_snapshots_variant_department"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, String, ForeignKey, Text, func
+from sqlalchemy import Column, Integer, DateTime, String, ForeignKey, Index, Text, func
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 
@@ -24,3 +24,8 @@ class Leave(Base):
     user = relationship("User", foreign_keys=[user_id], back_populates="leaves")
     approver = relationship("User", foreign_keys=[approved_by])
     notifications = relationship("LeaveNotification", back_populates="leave", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Interval lookups: a user's leaves overlapping a date range (calendar, overlap check)
+        Index("ix_leaves_user_start_end", "user_id", "start_date", "end_date"),
+    )
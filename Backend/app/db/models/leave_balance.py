@@ -0,0 +1,52 @@
+"""
+Leave Balance Models: an append-only ledger of leave entitlement movements and the
+per-user, per-year, per-type balances it adds up to.
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, UniqueConstraint
+from app.db.database import Base
+from datetime import datetime
+
+
+class LeaveLedgerEntry(Base):
+    """
+    One movement of a leave balance (app.crud.leave_balance_crud posts them).
+    - accrual: yearly allowance, posted when the year's balance row is created
+    - debit: approved leave days (negative when an approval is undone); leave_id set
+    - adjustment: manual corrections and carry-forward from the previous year
+    """
+    __tablename__ = "leave_ledger"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    year = Column(Integer, nullable=False)
+    leave_type = Column(String(50), nullable=False)
+    entry_type = Column(String(20), nullable=False)
+    days = Column(Integer, nullable=False)
+    leave_id = Column(Integer, ForeignKey("leaves.leave_id", ondelete="SET NULL"), nullable=True, index=True)
+    actor_id = Column(Integer, nullable=True)
+    note = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_leave_ledger_user_year_type", "user_id", "year", "leave_type"),
+    )
+
+
+class LeaveBalance(Base):
+    """
+    Running totals of the ledger for one user, year and leave type.
+    - allocated: accruals + adjustments; used: debits
+    """
+    __tablename__ = "leave_balances"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    year = Column(Integer, nullable=False)
+    leave_type = Column(String(50), nullable=False)
+    allocated = Column(Integer, nullable=False, default=0)
+    used = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "year", "leave_type", name="uq_leave_balances_user_year_type"),
+    )
@@ -2,7 +2,7 @@
 Online/Offline Status Model for tracking employee work status during attendance.
 This is an add-on to the existing attendance system - does not modify check-in/check-out logic.
 """
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, String, Float, Boolean, Text
+from sqlalchemy import Column, Integer, DateTime, Date, ForeignKey, String, Float, Boolean, Text
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 from datetime import datetime
@@ -14,6 +14,7 @@ class OnlineStatus(Base):
     - Created automatically when employee checks in (status = Online)
     - Updated when employee toggles status
     - Disabled/hidden after checkout
+    - Keeps running online/offline totals so summaries never re-sum the logs
     """
     __tablename__ = "online_statuses"
 
@@ -27,6 +28,13 @@ class OnlineStatus(Base):
     # Timestamps
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Last app heartbeat (write-behind, see app.services.presence); NULL = toggle-only user
+    last_seen_at = Column(DateTime, nullable=True, index=True)
+
+    # Running totals over closed logs (the open log's time is added on read)
+    total_online_minutes = Column(Float, default=0.0, nullable=False)
+    total_offline_minutes = Column(Float, default=0.0, nullable=False)
+    offline_count = Column(Integer, default=0, nullable=False)  # offline periods started, including an open one
     
     # Relationships
     user = relationship("User", backref="online_statuses")
@@ -39,6 +47,8 @@ class OnlineStatusLog(Base):
     Used to calculate actual working hours (only Online time counts).
     """
     __tablename__ = "online_status_logs"
+    # Ids are kept in online_status_log_archive, so SQLite must not reuse those of deleted rows
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
@@ -53,8 +63,51 @@ class OnlineStatusLog(Base):
     started_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
     ended_at = Column(DateTime(timezone=True), nullable=True)  # Set when status changes
     duration_minutes = Column(Float, default=0.0)  # Calculated when ended_at is set
+    auto_closed_at = Column(DateTime, nullable=True)  # Closed by the stale-session sweeper
     
     # Relationships
     user = relationship("User", backref="online_status_logs")
     attendance = relationship("Attendance", backref="online_status_logs")
     online_status = relationship("OnlineStatus", backref="logs")
+
+
+class OnlineStatusLogArchive(Base):
+    """
+    Raw status logs moved out of online_status_logs by the archival job
+    (app.services.status_log_archive); same columns, ids kept.
+    """
+    __tablename__ = "online_status_log_archive"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)  # no FKs: the archive is append-only history
+    attendance_id = Column(Integer, nullable=False, index=True)
+    online_status_id = Column(Integer, nullable=False, index=True)
+    status = Column(String(20), nullable=False)
+    offline_reason = Column(Text, nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    ended_at = Column(DateTime(timezone=True), nullable=True)
+    duration_minutes = Column(Float, default=0.0)
+    auto_closed_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class OnlineStatusDaySummary(Base):
+    """
+    Compacted logs of one archived attendance (work day).
+    - offline_reasons: JSON list of {"reason", "count", "minutes"}, most minutes first
+    """
+    __tablename__ = "online_status_day_summaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    attendance_id = Column(Integer, nullable=False, unique=True)
+    online_status_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    day = Column(Date, nullable=False, index=True)
+    online_minutes = Column(Float, nullable=False, default=0.0)
+    offline_minutes = Column(Float, nullable=False, default=0.0)
+    offline_count = Column(Integer, nullable=False, default=0)
+    offline_reasons = Column(Text, nullable=True)
+    log_count = Column(Integer, nullable=False, default=0)
+    first_started_at = Column(DateTime, nullable=True)
+    last_ended_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
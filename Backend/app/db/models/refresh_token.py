@@ -0,0 +1,41 @@
+"""
+Refresh Token Model for long-lived, revocable login sessions.
+Only a SHA-256 hash of each token is stored; the raw value is returned to the client once.
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from app.db.database import Base
+from datetime import datetime
+
+
+class RefreshToken(Base):
+    """
+    One row per issued refresh token.
+    - Tokens are rotated on every use: the old row is revoked and points at its replacement
+    - All rotations of one login share a session_id (the "device session")
+    - Presenting an already-rotated token revokes the whole session (reuse detection)
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False, index=True)
+    session_id = Column(String(64), nullable=False, index=True)
+    token_hash = Column(String(64), nullable=False, unique=True, index=True)
+
+    # Device details captured at login
+    device_name = Column(String(255), nullable=True)
+    user_agent = Column(String(512), nullable=True)
+    ip_address = Column(String(64), nullable=True)
+
+    # Lifetime tracking
+    session_started_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+    replaced_by_id = Column(Integer, ForeignKey("refresh_tokens.id", ondelete="SET NULL"), nullable=True)
+
+    user = relationship("User", backref="refresh_tokens")
+
+    __table_args__ = (
+        Index("ix_refresh_tokens_user_active", "user_id", "revoked_at"),
+    )
@@ -2,7 +2,10 @@ from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import APIKeyHeader, HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 from app.db.database import get_db
+from app.db.async_database import get_async_db
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models.user import User
 from app.core.config import settings
 from app.enums import RoleEnum
@@ -79,6 +82,61 @@ def get_current_user(
     print(f"✅ User authenticated: {user.name} ({user.role})")
     return user
 
+def _extract_token(credentials: Optional[HTTPAuthorizationCredentials], api_key: Optional[str]) -> Optional[str]:
+    if credentials and credentials.credentials:
+        return credentials.credentials
+    if api_key:
+        return api_key.split(" ", 1)[1] if api_key.startswith("Bearer ") else api_key
+    return None
+
+async def get_current_user_async(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    api_key: Optional[str] = Depends(api_key_header),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """get_current_user for endpoints on the async session (no threadpool hop for the user lookup)."""
+    token = _extract_token(credentials, api_key)
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated - Authorization header missing",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+    except JWTError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Invalid or expired token: {str(e)}",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    email = payload.get("sub")
+    if email is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token payload - missing subject",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    user = await db.scalar(select(User).where(User.email == email))
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return user
+
+def get_current_session_id(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    api_key: Optional[str] = Depends(api_key_header),
+) -> Optional[str]:
+    """Return the refresh-token session (`sid` claim) of the presented access token, if any."""
+    token = _extract_token(credentials, api_key)
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sid")
+
 def require_roles(*roles: RoleEnum):
     def wrapper(current_user: User = Depends(get_current_user)):
         if current_user.role not in roles:
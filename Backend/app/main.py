@@ -1,15 +1,26 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware import Middleware
 from starlette.middleware.base import BaseHTTPMiddleware
-from sqlalchemy import text
-from app.db import models
-from app.db.database import engine
+from app.core.config import settings
+from app.core.live_feed import MemoryFeedBackend, live_feed
+from app.core.rate_limit import MemoryBucketBackend, RateLimitMiddleware, rate_limiter
+from app.core.sql_instrumentation import SQLInstrumentationMiddleware, sql_metrics
+from app.core.compression import CompressionMiddleware
+from app.core.metrics import MetricsMiddleware, collect_threadpool_stats, is_internal_caller, registry
+from app.core.responses import FastJSONResponse
+from app.db.database import RecentWriteTracker, engine, read_engine, recent_writes
+from app.services.dashboard_snapshots import snapshot_scheduler
+from app.services.presence import presence_registry
+from app.services.session_sweeper import session_sweeper
+from app.dependencies import require_roles
+from app.enums import RoleEnum
 from app.routes import (
     user_routes,
     attendance_routes,
+    attendance_live_routes,
     leave_routes,
     task_routes,
     auth_routes,
@@ -21,39 +32,10 @@ from app.routes import (
     online_status_routes,
 )
 import os
+from contextlib import asynccontextmanager
 
 
-# Create all database tables
-try:
-    models.Base.metadata.create_all(bind=engine)
-    print("✅ Database tables created/verified successfully")
-except Exception as e:
-    print(f"⚠️ Warning: Could not create database tables: {e}")
-
-# Lightweight schema safeguard for new columns (MySQL)
-try:
-    with engine.begin() as conn:
-        # Check if 'leave_type' exists on 'leaves' table; if not, add it
-        result = conn.execute(
-            text(
-                """
-                SELECT COUNT(*) AS cnt
-                FROM information_schema.COLUMNS
-                WHERE TABLE_SCHEMA = DATABASE()
-                  AND TABLE_NAME = 'leaves'
-                  AND COLUMN_NAME = 'leave_type'
-                """
-            )
-        )
-        row = result.first()
-        has_leave_type = bool(row[0] if row else 0)
-        if not has_leave_type:
-            conn.execute(
-                text("ALTER TABLE leaves ADD COLUMN leave_type VARCHAR(50) NOT NULL DEFAULT 'annual'")
-            )
-except Exception as _e:
-    # Fail-soft: app will still boot; detailed error returned via middleware if used
-    pass
+# Schema management is an explicit step: run `python -m app.db.init_db` before starting workers
 
 # Debug middleware to log request headers (helps debug iOS auth issues)
 class RequestDebugMiddleware(BaseHTTPMiddleware):
@@ -109,13 +91,56 @@ class CORSMiddlewareWithErrorHandling(BaseHTTPMiddleware):
                 }
             )
 
+def per_process_backends() -> list:
+    """Settings whose state would stay in one worker's memory (also after a failed redis setup)."""
+    backends = []
+    if settings.RATE_LIMIT_ENABLED and isinstance(rate_limiter.backend, MemoryBucketBackend):
+        backends.append("RATE_LIMIT_BACKEND")
+    if isinstance(live_feed.backend, MemoryFeedBackend):
+        backends.append("LIVE_FEED_BACKEND")
+    if read_engine is not engine and isinstance(recent_writes, RecentWriteTracker):
+        backends.append("READ_YOUR_WRITES_BACKEND")
+    return backends
+
+
+def check_worker_backends() -> None:
+    """Refuse to run several workers on per-process limits, feed or read-your-writes markers."""
+    backends = per_process_backends()
+    if settings.WEB_CONCURRENCY > 1 and backends:
+        raise RuntimeError(
+            f"WEB_CONCURRENCY={settings.WEB_CONCURRENCY} needs shared state: set {', '.join(backends)} "
+            f"to redis (with the redis package installed and a redis URL) or run a single worker"
+        )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_worker_backends()
+    # Precompute dashboards in the background (no-op when DASHBOARD_SNAPSHOT_INTERVAL_SECONDS is 0)
+    snapshot_scheduler.start(dashboard_routes.DASHBOARD_BUILDERS)
+    # Write-behind for presence heartbeats (no-op when PRESENCE_FLUSH_SECONDS is 0)
+    presence_registry.start()
+    # Auto check-out of forgotten sessions (no-op when SESSION_SWEEP_SECONDS is 0)
+    session_sweeper.start()
+    yield
+    session_sweeper.stop()
+    presence_registry.stop()
+    snapshot_scheduler.stop()
+
+
 # Initialize FastAPI with middleware
 app = FastAPI(
     title="Employee Management System",
     version="1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
     middleware=[
+        Middleware(MetricsMiddleware),  # Outermost so latency covers the whole middleware stack
+        Middleware(SQLInstrumentationMiddleware),  # Sees every query of the request
         Middleware(RequestDebugMiddleware),  # Debug middleware first
-        Middleware(CORSMiddlewareWithErrorHandling)
+        Middleware(CORSMiddlewareWithErrorHandling),
+        Middleware(RateLimitMiddleware),  # Inside CORS so 429s carry CORS headers
+        Middleware(CompressionMiddleware),  # Innermost: the BaseHTTPMiddleware layers above re-stream bodies in chunks
     ]
 )
 
@@ -159,6 +184,7 @@ app.add_middleware(
 # Routers
 app.include_router(user_routes.router)
 app.include_router(attendance_routes.router)
+app.include_router(attendance_live_routes.router)
 app.include_router(leave_routes.router)
 app.include_router(task_routes.router)
 app.include_router(auth_routes.router)
@@ -173,6 +199,25 @@ app.include_router(online_status_routes.router)
 async def home():
     return {"message": "Employee Management System API is running"}
 
+@app.get("/rate-limits/stats", tags=["Monitoring"])
+def rate_limit_stats(_=Depends(require_roles(RoleEnum.ADMIN))):
+    """Allowed/rejected counts per rate-limit policy (Admin only)."""
+    return rate_limiter.stats()
+
+@app.get("/sql-metrics/stats", tags=["Monitoring"])
+def sql_metrics_stats(_=Depends(require_roles(RoleEnum.ADMIN))):
+    """Query counts, DB time, slow queries and N+1 suspects per route (Admin only)."""
+    return sql_metrics.stats()
+
+@app.get("/metrics", tags=["Monitoring"], include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    """Prometheus scrape endpoint (internal networks or METRICS_TOKEN only)."""
+    client_host = request.client.host if request.client else None
+    if not is_internal_caller(client_host, request.headers.get("authorization")):
+        raise HTTPException(status_code=403, detail="Metrics are only available to internal callers")
+    collect_threadpool_stats()
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/test-cors", tags=["Test"])
 async def test_cors():
     """
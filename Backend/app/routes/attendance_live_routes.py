@@ -0,0 +1,133 @@
+"""
+Live attendance feed (replaces polling /attendance/today-status and /attendance/today).
+
+    ws://<host>/attendance/live?token=<access token>[&since=<seq>&feed=<feed id>]
+
+Visibility matches /attendance/today-status: Admin sees every department (except
+other admins), HR and Managers only their own department, other roles are refused.
+
+Server messages (JSON):
+- {"type": "snapshot", "feed", "seq", "records": [...]}   today's rows, on connect
+- {"type": "resume", "feed", "seq"}                         when `since` could be honoured;
+                                                            the missed events follow
+- {"type": "check_in" | "check_out", "seq", "department", "occurred_at", "data": row}
+- {"type": "status", "seq", "department", "occurred_at", "data": {user_id, attendance_id, is_online, offline_reason}}
+- {"type": "ping", "seq"}                                   keepalive
+
+Rows are keyed by attendance_id and always complete, so applying an event twice
+(e.g. one already reflected in the snapshot) is harmless. Clients remember the
+last `seq` and `feed` and pass them back on reconnect.
+"""
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.live_feed import OVERFLOW, live_feed
+from app.core.responses import dumps
+from app.core.security import token_subject
+from app.crud.attendance_crud import _normalize_department_value, get_live_attendance_rows
+from app.db.database import ReadSessionLocal, SessionLocal
+from app.db.models.user import User
+from app.enums import RoleEnum
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/attendance", tags=["Attendance"])
+
+# Close codes (4000-4999 are application defined)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_LAGGING = 4408  # client fell behind; reconnect with since=<last seq>
+
+ALL_DEPARTMENTS = object()
+
+
+def _load_subscriber(email: str) -> Optional[User]:
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == email, User.is_active == True).first()
+        if user:
+            db.expunge(user)
+        return user
+    finally:
+        db.close()
+
+
+def _subscriber_scope(user: User):
+    """ALL_DEPARTMENTS for admins, the department for HR/Managers, None if not allowed."""
+    if user.role == RoleEnum.ADMIN:
+        return ALL_DEPARTMENTS
+    if user.role in (RoleEnum.HR, RoleEnum.MANAGER) and _normalize_department_value(user.department):
+        return user.department
+    return None
+
+
+def _visible(scope, department: Optional[str], role: Optional[str]) -> bool:
+    if scope is ALL_DEPARTMENTS:
+        return role != RoleEnum.ADMIN.value
+    return _normalize_department_value(department) == _normalize_department_value(scope)
+
+
+def _snapshot_rows(scope) -> list:
+    db = ReadSessionLocal()
+    try:
+        rows = get_live_attendance_rows(db, department=None if scope is ALL_DEPARTMENTS else scope)
+        return [row for row in rows if _visible(scope, row["department"], row["role"])]
+    finally:
+        db.close()
+
+
+@router.websocket("/live")
+async def attendance_live_feed(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None, description="Access token (browsers cannot set headers on WebSockets)"),
+    since: Optional[int] = Query(None, description="Last sequence received, to resume after a reconnect"),
+    feed: Optional[str] = Query(None, description="Feed id the sequence belongs to"),
+):
+    email = token_subject(token or websocket.headers.get("authorization"))
+    user = await run_in_threadpool(_load_subscriber, email) if email else None
+    if user is None:
+        await websocket.close(code=CLOSE_UNAUTHORIZED)
+        return
+    scope = _subscriber_scope(user)
+    if scope is None:
+        await websocket.close(code=CLOSE_FORBIDDEN)
+        return
+
+    await websocket.accept()
+    # Subscribe before reading the sequence so nothing published meanwhile is lost
+    subscription = live_feed.subscribe()
+    try:
+        backlog = live_feed.events_since(since) if since is not None and feed == live_feed.feed_id else None
+        if backlog is None:
+            last_seq = live_feed.current_seq()
+            records = await run_in_threadpool(_snapshot_rows, scope)
+            await websocket.send_bytes(dumps({"type": "snapshot", "feed": live_feed.feed_id, "seq": last_seq, "records": records}))
+        else:
+            last_seq = since
+            await websocket.send_bytes(dumps({"type": "resume", "feed": live_feed.feed_id, "seq": since}))
+            for event in backlog:
+                last_seq = event["seq"]
+                if _visible(scope, event["department"], event["role"]):
+                    await websocket.send_bytes(dumps(event))
+
+        while True:
+            event = await subscription.next(settings.LIVE_FEED_PING_SECONDS)
+            if event is None:
+                await websocket.send_bytes(dumps({"type": "ping", "seq": last_seq}))
+                continue
+            if event is OVERFLOW:
+                await websocket.close(code=CLOSE_LAGGING)
+                return
+            if event["seq"] <= last_seq:
+                continue
+            last_seq = event["seq"]
+            if _visible(scope, event["department"], event["role"]):
+                await websocket.send_bytes(dumps(event))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_feed.unsubscribe(subscription)
@@ -1,14 +1,23 @@
 import os
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, case, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, case, or_, select
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timedelta, time, date
 from zoneinfo import ZoneInfo
-from app.db.database import get_db
+from app.core.dashboard_cache import invalidate_dashboards
+from app.core.live_feed import live_feed
+from app.services.presence import presence_registry
+from app.crud.activity_crud import record_activity
+from app.crud.attendance_crud import get_live_attendance_rows
+from app.crud.online_status_crud import close_status_log, get_open_log, lock_online_status, open_status_log
+from app.db.database import get_db, get_read_db
+from app.db.async_database import get_async_db
 from app.db.models.attendance import Attendance
 from app.db.models.user import User
 from app.db.models.office_timing import OfficeTiming
-from app.db.models.online_status import OnlineStatus, OnlineStatusLog
+from app.db.models.online_status import OnlineStatus
 from app.schemas.attendance_schema import AttendanceOut, LocationData
 from fastapi.responses import StreamingResponse, JSONResponse
 from app.dependencies import get_current_user
@@ -24,6 +33,7 @@ import logging
 import json
 from ..utils.geolocation import location_service
 from app.schemas.office_timing_schema import OfficeTimingOut, OfficeTimingCreate
+from app.core.responses import FastJSONResponse, drop_keys
 
 
 router = APIRouter(prefix="/attendance", tags=["Attendance"])
@@ -275,6 +285,25 @@ def _sanitize_text(value: Optional[str], *, max_length: int = 250) -> Optional[s
     return text
 
 
+async def _publish_attendance_event(db: AsyncSession, event_type: str, user: User, attendance_id: int) -> None:
+    """Push the committed attendance row to /attendance/live subscribers (best effort)."""
+    try:
+        rows = await db.run_sync(lambda session: get_live_attendance_rows(session, attendance_id=attendance_id))
+        if rows:
+            await live_feed.publish_async(event_type, user.department, user.role.value if user.role else None, rows[0])
+    except Exception as e:
+        logger.warning(f"⚠️ Could not publish {event_type} for attendance {attendance_id}: {str(e)}")
+
+
+def _record_check_in_activity(db: Session, user: User, attendance: Attendance) -> None:
+    timing = _resolve_office_timing(db, user.department)
+    late = _evaluate_attendance_status(attendance.check_in, None, timing)["check_in_status"] == "late"
+    record_activity(
+        db, "attendance", "check_in", user, attendance.attendance_id,
+        "late" if late else "on-time", "Checked in", actor_id=user.user_id, occurred_at=attendance.check_in,
+    )
+
+
 def _initialize_online_status_on_checkin(db: Session, user_id: int, attendance_id: int) -> None:
     """
     Initialize online status when user checks in.
@@ -305,14 +334,7 @@ def _initialize_online_status_on_checkin(db: Session, user_id: int, attendance_i
         db.flush()
         
         # Create initial "online" log entry
-        initial_log = OnlineStatusLog(
-            user_id=user_id,
-            attendance_id=attendance_id,
-            online_status_id=online_status.id,
-            status="online",
-            started_at=datetime.utcnow()
-        )
-        db.add(initial_log)
+        open_status_log(db, online_status, "online")
         
         logger.info(f"📊 Initialized online status for user {user_id}, attendance {attendance_id}")
         
@@ -326,52 +348,22 @@ def _finalize_online_status_on_checkout(db: Session, user_id: int, attendance_id
     Closes any open status logs and calculates effective work hours.
     """
     try:
-        online_status = (
-            db.query(OnlineStatus)
-            .filter(
-                OnlineStatus.user_id == user_id,
-                OnlineStatus.attendance_id == attendance_id
-            )
-            .first()
-        )
+        online_status = lock_online_status(db, user_id, attendance_id)
         
         if not online_status:
             return {"effective_work_hours": 0, "total_online_minutes": 0, "total_offline_minutes": 0}
         
-        # Close any open log
-        open_log = (
-            db.query(OnlineStatusLog)
-            .filter(
-                OnlineStatusLog.online_status_id == online_status.id,
-                OnlineStatusLog.ended_at.is_(None)
-            )
-            .first()
-        )
-        
+        # Close any open log (adds it to the running totals)
+        open_log = get_open_log(db, online_status.id)
         if open_log:
-            open_log.ended_at = datetime.utcnow()
-            delta = open_log.ended_at - open_log.started_at
-            open_log.duration_minutes = round(delta.total_seconds() / 60, 2)
+            close_status_log(online_status, open_log)
         
         # Set status to offline (checked out)
         online_status.is_online = False
         online_status.updated_at = datetime.utcnow()
         
-        # Calculate totals
-        logs = (
-            db.query(OnlineStatusLog)
-            .filter(OnlineStatusLog.online_status_id == online_status.id)
-            .all()
-        )
-        
-        total_online = 0.0
-        total_offline = 0.0
-        
-        for log in logs:
-            if log.status == "online":
-                total_online += log.duration_minutes or 0
-            else:
-                total_offline += log.duration_minutes or 0
+        total_online = online_status.total_online_minutes or 0.0
+        total_offline = online_status.total_offline_minutes or 0.0
         
         logger.info(f"📊 Finalized online status for user {user_id}: Online={total_online}min, Offline={total_offline}min")
         
@@ -412,7 +404,7 @@ def _build_office_timing_cache(db: Session) -> Tuple[Optional[OfficeTiming], Dic
     records = (
         db.query(OfficeTiming)
         .filter(OfficeTiming.is_active.is_(True))
-        .order_by(OfficeTiming.updated_at.desc())
+        .order_by(OfficeTiming.updated_at.desc(), OfficeTiming.id.desc())
         .all()
     )
 
@@ -526,6 +518,10 @@ def _evaluate_attendance_status(
     }
 
 
+# camelCase copies kept for older app builds; dropped with ?compact=true
+ATTENDANCE_LEGACY_KEYS = ("locationLabel", "checkInSelfie", "workSummary", "workReport", "userName", "userEmail", "user_role")
+
+
 def _prepare_attendance_payload(attendance: Attendance) -> Dict[str, Any]:
     raw_selfie = getattr(attendance, "selfie", None)
     logger.debug(f"📸 Raw selfie data from DB: {raw_selfie}")
@@ -960,13 +956,13 @@ async def employee_check_in_route(
     gps_location: Optional[str] = Form(None),
     selfie: Optional[UploadFile] = File(None),
     location_data: Optional[str] = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         # Parse location data
         try:
             loc_data = json.loads(location_data) if location_data else None
-            processed_location = validate_and_process_location(loc_data or gps_location)
+            processed_location = await run_in_threadpool(validate_and_process_location, loc_data or gps_location)
         except json.JSONDecodeError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -974,7 +970,7 @@ async def employee_check_in_route(
             )
 
         # Validate user exists and is active
-        user = db.query(User).filter(User.user_id == user_id, User.is_active == True).first()
+        user = await db.scalar(select(User).where(User.user_id == user_id, User.is_active == True))
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -986,22 +982,22 @@ async def employee_check_in_route(
 
         # Check for existing check-in today without check-out
         today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        existing_attendance = (
-            db.query(Attendance)
-            .filter(
+        existing_attendance = await db.scalar(
+            select(Attendance)
+            .where(
                 Attendance.user_id == user_id,
                 Attendance.check_in >= today_start,
                 Attendance.check_out.is_(None)
             )
-            .first()
+            .limit(1)
         )
 
         if existing_attendance:
             # Update selfie if provided and not already set
             if selfie_path and not existing_attendance.selfie:
                 existing_attendance.selfie = _dump_selfie_data(None, check_in=selfie_path)
-                db.commit()
-                db.refresh(existing_attendance)
+                await db.commit()
+                await db.refresh(existing_attendance)
                 logger.info(f"📸 Updated existing attendance with selfie: {selfie_path}")
             return _prepare_attendance_payload(existing_attendance)
 
@@ -1015,12 +1011,16 @@ async def employee_check_in_route(
         )
         
         db.add(attendance)
-        db.commit()
-        db.refresh(attendance)
+        await db.commit()
+        await db.refresh(attendance)
         
         # Initialize online status tracking (set to Online by default)
-        _initialize_online_status_on_checkin(db, user_id, attendance.attendance_id)
-        db.commit()
+        await db.run_sync(_initialize_online_status_on_checkin, user_id, attendance.attendance_id)
+        await db.run_sync(_record_check_in_activity, user, attendance)
+        await db.commit()
+        invalidate_dashboards(user.department)
+        await _publish_attendance_event(db, "check_in", user, attendance.attendance_id)
+        presence_registry.forget(user.user_id)
         
         print(f"Successfully created check-in for user {user_id}, attendance ID: {attendance.attendance_id}")
         logger.info(f"📸 Created attendance with selfie: {selfie_path}")
@@ -1028,7 +1028,7 @@ async def employee_check_in_route(
         return _prepare_attendance_payload(attendance)
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error in check-in for user {user_id}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1040,10 +1040,10 @@ async def employee_check_in_route(
 async def employee_check_in_json(
     request: Request,
     payload: AttendanceJSONPayload, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        user = db.query(User).filter(User.user_id == payload.user_id, User.is_active == True).first()
+        user = await db.scalar(select(User).where(User.user_id == payload.user_id, User.is_active == True))
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found or inactive")
 
@@ -1096,7 +1096,7 @@ async def employee_check_in_json(
                 traceback.print_exc()
 
         location_payload = _ensure_location_dict(payload.gps_location)
-        processed_location = validate_and_process_location(location_payload)
+        processed_location = await run_in_threadpool(validate_and_process_location, location_payload)
 
         # Use India timezone for date calculations
         india_now = datetime.now(INDIA_TZ)
@@ -1105,22 +1105,22 @@ async def employee_check_in_json(
         # Convert to UTC for database query (if storing in UTC)
         today_start_utc = today_start.astimezone(UTC_TZ).replace(tzinfo=None)
         
-        existing_attendance = (
-            db.query(Attendance)
-            .filter(
+        existing_attendance = await db.scalar(
+            select(Attendance)
+            .where(
                 Attendance.user_id == payload.user_id,
                 Attendance.check_in >= today_start_utc,
                 Attendance.check_out.is_(None)
             )
-            .first()
+            .limit(1)
         )
         if existing_attendance:
             logger.info(f"📋 Existing attendance found for user {payload.user_id}")
             # Update selfie if provided and not already set
             if selfie_path and not existing_attendance.selfie:
                 existing_attendance.selfie = _dump_selfie_data(None, check_in=selfie_path)
-                db.commit()
-                db.refresh(existing_attendance)
+                await db.commit()
+                await db.refresh(existing_attendance)
                 logger.info(f"📸 Updated existing attendance with selfie: {selfie_path}")
             return _prepare_attendance_payload(existing_attendance)
 
@@ -1141,12 +1141,16 @@ async def employee_check_in_json(
             total_hours=0.0
         )
         db.add(attendance)
-        db.commit()
-        db.refresh(attendance)
+        await db.commit()
+        await db.refresh(attendance)
         
         # Initialize online status tracking (set to Online by default)
-        _initialize_online_status_on_checkin(db, payload.user_id, attendance.attendance_id)
-        db.commit()
+        await db.run_sync(_initialize_online_status_on_checkin, payload.user_id, attendance.attendance_id)
+        await db.run_sync(_record_check_in_activity, user, attendance)
+        await db.commit()
+        invalidate_dashboards(user.department)
+        await _publish_attendance_event(db, "check_in", user, attendance.attendance_id)
+        presence_registry.forget(user.user_id)
         
         logger.info(f"✅ Check-in created for user {payload.user_id}, attendance_id: {attendance.attendance_id}")
         logger.info(f"📸 Selfie data after commit: {attendance.selfie}")
@@ -1154,7 +1158,7 @@ async def employee_check_in_json(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error in JSON check-in: {str(e)}")
 
 
@@ -1168,11 +1172,11 @@ async def employee_check_out_route(
     location_data: Optional[str] = Form(None),
     work_summary: str = Form(..., description="Required summary of today's work"),
     work_report: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         # Validate user exists and is active
-        user = db.query(User).filter(User.user_id == user_id, User.is_active == True).first()
+        user = await db.scalar(select(User).where(User.user_id == user_id, User.is_active == True))
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1184,7 +1188,7 @@ async def employee_check_out_route(
         processed_location: Dict[str, Any]
         try:
             normalized_location = _ensure_location_dict(location_source)
-            processed_location = validate_and_process_location(normalized_location)
+            processed_location = await run_in_threadpool(validate_and_process_location, normalized_location)
         except HTTPException:
             raise
         except Exception:
@@ -1207,15 +1211,15 @@ async def employee_check_out_route(
 
         # Find today's check-in
         today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        attendance = (
-            db.query(Attendance)
-            .filter(
+        attendance = await db.scalar(
+            select(Attendance)
+            .where(
                 Attendance.user_id == user_id,
                 Attendance.check_in >= today_start,
                 Attendance.check_out.is_(None)  # Only update if not already checked out
             )
             .order_by(Attendance.check_in.desc())
-            .first()
+            .limit(1)
         )
 
         if not attendance:
@@ -1244,11 +1248,13 @@ async def employee_check_out_route(
         attendance.total_hours = round(time_worked.total_seconds() / 3600, 2)  # Convert to hours with 2 decimal places
         
         # Finalize online status tracking (close any open sessions)
-        online_status_summary = _finalize_online_status_on_checkout(db, user_id, attendance.attendance_id)
+        online_status_summary = await db.run_sync(_finalize_online_status_on_checkout, user_id, attendance.attendance_id)
         logger.info(f"📊 Online status finalized: {online_status_summary}")
         
-        db.commit()
-        db.refresh(attendance)
+        await db.commit()
+        await db.refresh(attendance)
+        await _publish_attendance_event(db, "check_out", user, attendance.attendance_id)
+        presence_registry.forget(user.user_id)
         
         print(f"Successfully processed check-out for user {user_id}, attendance ID: {attendance.attendance_id}")
         logger.info(f"📸 Final selfie data after commit: {attendance.selfie}")
@@ -1258,7 +1264,7 @@ async def employee_check_out_route(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error in check-out for user {user_id}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1271,10 +1277,10 @@ async def employee_check_out_route(
 async def employee_check_out_json(
     request: Request,
     payload: AttendanceJSONPayload, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        user = db.query(User).filter(User.user_id == payload.user_id, User.is_active == True).first()
+        user = await db.scalar(select(User).where(User.user_id == payload.user_id, User.is_active == True))
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found or inactive")
 
@@ -1345,7 +1351,7 @@ async def employee_check_out_json(
         processed_location: Dict[str, Any]
         try:
             location_payload = _ensure_location_dict(location_source)
-            processed_location = validate_and_process_location(location_payload)
+            processed_location = await run_in_threadpool(validate_and_process_location, location_payload)
         except HTTPException:
             raise
         except Exception:
@@ -1362,15 +1368,15 @@ async def employee_check_out_json(
         # Convert to UTC for database query
         today_start_utc = today_start.astimezone(UTC_TZ).replace(tzinfo=None)
         
-        attendance = (
-            db.query(Attendance)
-            .filter(
+        attendance = await db.scalar(
+            select(Attendance)
+            .where(
                 Attendance.user_id == payload.user_id,
                 Attendance.check_in >= today_start_utc,
                 Attendance.check_out.is_(None)
             )
             .order_by(Attendance.check_in.desc())
-            .first()
+            .limit(1)
         )
         if not attendance:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No active check-in found for today")
@@ -1398,20 +1404,22 @@ async def employee_check_out_json(
         attendance.total_hours = round(time_worked.total_seconds() / 3600, 2)
         
         # Finalize online status tracking (close any open sessions)
-        online_status_summary = _finalize_online_status_on_checkout(db, payload.user_id, attendance.attendance_id)
+        online_status_summary = await db.run_sync(_finalize_online_status_on_checkout, payload.user_id, attendance.attendance_id)
         logger.info(f"📊 Online status finalized: {online_status_summary}")
         
         logger.info(f"✅ Check-out completed for user {payload.user_id}, attendance_id: {attendance.attendance_id}, hours: {attendance.total_hours}")
         logger.info(f"📸 Final selfie data before commit: {attendance.selfie}")
         
-        db.commit()
-        db.refresh(attendance)
+        await db.commit()
+        await db.refresh(attendance)
+        await _publish_attendance_event(db, "check_out", user, attendance.attendance_id)
+        presence_registry.forget(user.user_id)
         logger.info(f"📸 Final selfie data after commit: {attendance.selfie}")
         return _prepare_attendance_payload(attendance)
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error in JSON check-out: {str(e)}")
 
 # Employee Self-Attendance (Last 6 Months)
@@ -1803,8 +1811,9 @@ def get_all_attendance_history(
     department: Optional[str] = None,
     date: Optional[str] = None,
     role: Optional[str] = Query(None, description="Filter by role (HR, Manager, TeamLead, Employee)"),
+    compact: bool = Query(False, description="Drop legacy duplicate keys (camelCase copies of snake_case fields)"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get all attendance history
@@ -1817,6 +1826,7 @@ def get_all_attendance_history(
     - department: Filter by department
     - date: Filter by date (format: YYYY-MM-DD)
     - role: Filter by role (HR, Manager, TeamLead, Employee)
+    - compact: Omit locationLabel, checkInSelfie, workSummary, workReport, userName, userEmail, user_role
     """
     user_role = current_user.role
     user_department = current_user.department
@@ -1929,7 +1939,10 @@ def get_all_attendance_history(
         )
         result.append(payload)
 
-    return result
+    if compact:
+        drop_keys(result, ATTENDANCE_LEGACY_KEYS)
+    # Rows are plain JSON-ready dicts; skip FastAPI's per-row jsonable_encoder pass
+    return FastJSONResponse(result)
 
 
 # Admin endpoint to view all attendance records across all departments and roles
@@ -2160,16 +2173,6 @@ def deactivate_office_timing(
 
 import csv
 from io import StringIO, BytesIO
-try:
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-    from reportlab.lib import colors
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-    HAS_REPORTLAB = True
-except ImportError:
-    HAS_REPORTLAB = False
 
 
 @router.get("/export/csv")
@@ -2180,7 +2183,7 @@ def export_attendance_csv(
     department: Optional[str] = Query(None, description="Filter by department"),
     employee_id: Optional[str] = Query(None, description="Filter by employee ID"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """Export attendance records as CSV"""
     try:
@@ -2323,11 +2326,19 @@ def export_attendance_pdf(
     department: Optional[str] = Query(None, description="Filter by department"),
     employee_id: Optional[str] = Query(None, description="Filter by employee ID"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """Export attendance records as PDF"""
     
-    if not HAS_REPORTLAB:
+    # Loaded on first export, not at import
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_CENTER
+    except ImportError:
         raise HTTPException(
             status_code=status.HTTP_501_NOT_IMPLEMENTED,
             detail="PDF export requires reportlab. Install with: pip install reportlab"
@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Form
+from fastapi import APIRouter, Depends, HTTPException, Form, Request, status
 from sqlalchemy.orm import Session
-from datetime import timedelta
+from typing import List, Optional
 from app.db.database import get_db
 from app.db.models.user import User
 from app.core.otp_utils import generate_otp, verify_otp, get_environment_info, get_otp_info
 from app.services.email_service import send_otp_email, test_email_configuration
-from app.core.security import create_token
+from app.core.security import create_access_token
 from app.core.config import settings
+from app.crud.refresh_token_crud import (
+    create_refresh_token,
+    rotate_refresh_token,
+    find_active_token,
+    list_active_sessions,
+    revoke_session,
+    revoke_all_sessions,
+)
+from app.dependencies import get_current_user, get_current_session_id
+from app.schemas.auth_schema import SessionOut
 import logging
 
 logger = logging.getLogger(__name__)
@@ -48,10 +58,27 @@ def send_otp(email: str = Form(...), db: Session = Depends(get_db)):
     
     return response_data
 
+def _role_value(user: User) -> str:
+    return user.role.value if hasattr(user.role, 'value') else str(user.role)
+
+
+def _token_response(access_token: str, refresh_token: str, session_id: str) -> dict:
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": refresh_token,
+        "refresh_expires_in": settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60,
+        "session_id": session_id,
+    }
+
+
 @router.post("/verify-otp")
 def verify_user(
+    request: Request,
     email: str = Form(...),
     otp: int = Form(...),
+    device_name: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
     """Verify OTP with environment-aware logic"""
@@ -63,12 +90,19 @@ def verify_user(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Convert role enum to string value
-    role_value = user.role.value if hasattr(user.role, 'value') else str(user.role)
-    
-    token = create_token({"sub": user.email, "role": role_value}, timedelta(hours=2))
+    role_value = _role_value(user)
+
+    # Start a device session so the app can renew access tokens without another OTP
+    refresh_token, session = create_refresh_token(
+        db,
+        user.user_id,
+        device_name=device_name,
+        user_agent=request.headers.get("user-agent"),
+        ip_address=request.client.host if request.client else None,
+    )
+    token = create_access_token(user.email, role_value, session.session_id)
     return {
-        "access_token": token,
-        "token_type": "bearer",
+        **_token_response(token, refresh_token, session.session_id),
         "role": role_value,
         "user_id": user.user_id,
         "email": user.email,
@@ -79,6 +113,88 @@ def verify_user(
         "environment": settings.ENVIRONMENT
     }
 
+@router.post("/refresh")
+def refresh_access_token(
+    refresh_token: str = Form(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Exchange a refresh token for a new access token.
+    The refresh token is rotated: the old one stops working and a new one is returned.
+    """
+    rotated = rotate_refresh_token(db, refresh_token)
+    if not rotated:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    new_refresh_token, session, user = rotated
+    role_value = _role_value(user)
+    token = create_access_token(user.email, role_value, session.session_id)
+    return {
+        **_token_response(token, new_refresh_token, session.session_id),
+        "role": role_value,
+        "user_id": user.user_id,
+    }
+
+
+@router.post("/logout")
+def logout(
+    refresh_token: str = Form(...),
+    db: Session = Depends(get_db)
+):
+    """Revoke the session that owns the given refresh token."""
+    record = find_active_token(db, refresh_token)
+    if record:
+        revoke_session(db, record.user_id, record.session_id)
+    return {"message": "Logged out"}
+
+
+@router.get("/sessions", response_model=List[SessionOut])
+def list_sessions(
+    current_user: User = Depends(get_current_user),
+    current_session_id: Optional[str] = Depends(get_current_session_id),
+    db: Session = Depends(get_db)
+):
+    """List the current user's active device sessions."""
+    return [
+        SessionOut(
+            session_id=record.session_id,
+            device_name=record.device_name,
+            user_agent=record.user_agent,
+            ip_address=record.ip_address,
+            session_started_at=record.session_started_at,
+            last_refreshed_at=record.created_at,
+            expires_at=record.expires_at,
+            is_current=record.session_id == current_session_id,
+        )
+        for record in list_active_sessions(db, current_user.user_id)
+    ]
+
+
+@router.delete("/sessions/{session_id}")
+def revoke_device_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Sign out one device. Its access token stays valid until it expires."""
+    if not revoke_session(db, current_user.user_id, session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": "Session revoked", "session_id": session_id}
+
+
+@router.delete("/sessions")
+def revoke_other_sessions(
+    current_user: User = Depends(get_current_user),
+    current_session_id: Optional[str] = Depends(get_current_session_id),
+    db: Session = Depends(get_db)
+):
+    """Sign out every device except the one making this request."""
+    revoked = revoke_all_sessions(db, current_user.user_id, except_session_id=current_session_id)
+    return {"message": "Other sessions revoked", "revoked": revoked}
+
 # Development/Testing endpoints for debugging OTP
 @router.get("/debug/environment")
 def get_debug_environment_info():
@@ -1,12 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from datetime import datetime, timedelta
-
-from app.db.database import get_db
+from sqlalchemy import func, and_, case, true
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.dashboard_cache import dashboard_cache
+from app.crud.activity_crud import activity_item, list_activity
+from app.db.database import get_read_db
 from app.db.models import User, Attendance, Leave, Task
 from app.enums import RoleEnum, TaskStatus
-from app.dependencies import get_current_user
+from app.dependencies import get_current_user, require_roles, security, api_key_header
+from app.services.attendance_rollups import build_trends
+from app.services.dashboard_snapshots import serve_snapshot
+from app.utils.office_timing import is_late_check_in
 
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
@@ -18,85 +25,133 @@ def _today_bounds():
     return today_start, today_end
 
 
+RECENT_ACTIVITY_LIMIT = 15
+HR_ACTIVITY_TYPES = ("leave", "attendance", "join")
+MANAGER_ACTIVITY_TYPES = ("attendance", "leave", "task")
+
+VARIANT_ROLES = {
+    "admin": RoleEnum.ADMIN,
+    "hr": RoleEnum.HR,
+    "manager": RoleEnum.MANAGER,
+    "team-lead": RoleEnum.TEAM_LEAD,
+}
+
+
+def _fresh_requested(
+    fresh: bool = Query(False, description="Recompute instead of serving the latest snapshot (Admin only)"),
+    credentials=Depends(security),
+    api_key=Depends(api_key_header),
+    db: Session = Depends(get_read_db),
+) -> bool:
+    if fresh:
+        user = get_current_user(credentials=credentials, api_key=api_key, db=db)
+        if user.role != RoleEnum.ADMIN:
+            raise HTTPException(status_code=403, detail="Only admins can request a fresh dashboard")
+    return fresh
+
+
+def _dashboard_response(db: Session, variant: str, department: Optional[str], fresh: bool) -> Response:
+    """Latest snapshot (via the in-process cache) as stored JSON; fresh=True recomputes both."""
+    today_start, _ = _today_bounds()
+    body = dashboard_cache.get_or_compute(
+        variant,
+        VARIANT_ROLES[variant].value,
+        department,
+        today_start.date(),
+        lambda: serve_snapshot(db, DASHBOARD_BUILDERS, variant, department or "", fresh=fresh),
+        force=fresh,
+    )
+    return Response(content=body, media_type="application/json")
+
+
 @router.get("/admin")
-def admin_dashboard(db: Session = Depends(get_db)):
+def admin_dashboard(fresh: bool = Depends(_fresh_requested), db: Session = Depends(get_read_db)):
+    return _dashboard_response(db, "admin", None, fresh)
+
+
+def _build_admin_dashboard(db: Session):
     today_start, today_end = _today_bounds()
 
-    total_employees = db.query(func.count(User.user_id)).scalar() or 0
-    present_today = (
-        db.query(func.count(Attendance.attendance_id))
-        .filter(Attendance.check_in >= today_start, Attendance.check_in < today_end)
-        .scalar()
-        or 0
-    )
-    on_leave_today = (
-        db.query(func.count(Leave.leave_id))
-        .filter(
-            Leave.status == "Approved",
-            Leave.start_date <= today_end,
-            Leave.end_date >= today_start,
+    checked_in_today = and_(Attendance.check_in >= today_start, Attendance.check_in < today_end)
+    is_late = is_late_check_in(Attendance.check_in, User.department)
+
+    # Scalar KPIs: one conditional aggregate per table, cross-joined into a single round trip
+    user_kpis = db.query(func.count(User.user_id).label("total")).subquery()
+    attendance_kpis = (
+        db.query(
+            func.count(Attendance.attendance_id).label("present"),
+            func.coalesce(func.sum(case((is_late, 1), else_=0)), 0).label("late"),
         )
-        .scalar()
-        or 0
+        .outerjoin(User, User.user_id == Attendance.user_id)
+        .filter(checked_in_today)
+        .subquery()
     )
-    late_arrivals = (
-        db.query(func.count(Attendance.attendance_id))
-        .filter(Attendance.check_in >= today_start, Attendance.check_in < today_end)
-        .filter(
-            func.extract('hour', Attendance.check_in) * 60 + func.extract('minute', Attendance.check_in) > 9 * 60 + 30
+    leave_kpis = (
+        db.query(
+            func.coalesce(func.sum(case((and_(
+                Leave.status == "Approved",
+                Leave.start_date <= today_end,
+                Leave.end_date >= today_start,
+            ), 1), else_=0)), 0).label("on_leave"),
+            func.coalesce(func.sum(case((and_(
+                Leave.status == "Pending",
+                User.role.in_([RoleEnum.HR, RoleEnum.MANAGER]),
+                User.is_active.is_(True),
+            ), 1), else_=0)), 0).label("pending"),
         )
-        .scalar()
-        or 0
+        .outerjoin(User, User.user_id == Leave.user_id)
+        .subquery()
     )
-    pending_leaves = (
-        db.query(func.count(Leave.leave_id))
-        .join(User, User.user_id == Leave.user_id)
-        .filter(
-            Leave.status == "Pending",
-            User.role.in_([RoleEnum.HR, RoleEnum.MANAGER]),
-            User.is_active.is_(True),
+    task_kpis = (
+        db.query(
+            func.coalesce(func.sum(case((Task.status.in_([str(TaskStatus.PENDING), str(TaskStatus.IN_PROGRESS)]), 1), else_=0)), 0).label("active"),
+            func.coalesce(func.sum(case((Task.status == str(TaskStatus.COMPLETED), 1), else_=0)), 0).label("completed"),
         )
-        .scalar()
-        or 0
-    )
-    active_tasks = (
-        db.query(func.count(Task.task_id)).filter(Task.status.in_([str(TaskStatus.PENDING), str(TaskStatus.IN_PROGRESS)])).scalar() or 0
+        .subquery()
     )
-    completed_tasks = (
-        db.query(func.count(Task.task_id)).filter(Task.status == str(TaskStatus.COMPLETED)).scalar() or 0
+    kpis = (
+        db.query(user_kpis, attendance_kpis, leave_kpis, task_kpis)
+        .select_from(user_kpis)
+        .join(attendance_kpis, true())
+        .join(leave_kpis, true())
+        .join(task_kpis, true())
+        .one()
     )
-    # Department performance (by presence rate today)
-    dept_names = [row[0] for row in db.query(User.department).filter(User.department.isnot(None)).distinct().all()]
-    department_performance = []
-    for dept in dept_names:
-        dept_total = db.query(func.count(User.user_id)).filter(User.department == dept).scalar() or 0
-        dept_present = (
-            db.query(func.count(Attendance.attendance_id))
-            .join(User, User.user_id == Attendance.user_id)
-            .filter(User.department == dept, Attendance.check_in >= today_start, Attendance.check_in < today_end)
-            .scalar() or 0
+
+    # Department performance (by presence rate today): headcount and today's check-ins per department
+    dept_rows = (
+        db.query(
+            User.department,
+            func.count(func.distinct(User.user_id)),
+            func.count(Attendance.attendance_id),
         )
-        performance = int((dept_present / max(dept_total, 1)) * 100)
-        department_performance.append({
+        .outerjoin(Attendance, and_(Attendance.user_id == User.user_id, checked_in_today))
+        .filter(User.department.isnot(None))
+        .group_by(User.department)
+        .order_by(User.department)
+        .all()
+    )
+    department_performance = [
+        {
             "name": dept,
             "employees": dept_total,
-            "performance": performance,
-        })
+            "performance": int((dept_present / max(dept_total, 1)) * 100),
+        }
+        for dept, dept_total, dept_present in dept_rows
+    ]
 
     # Recent activities (today's check-ins)
     attendance_today = (
-        db.query(Attendance, User)
+        db.query(Attendance, User, is_late)
         .join(User, User.user_id == Attendance.user_id)
-        .filter(Attendance.check_in >= today_start, Attendance.check_in < today_end)
+        .filter(checked_in_today)
         .order_by(Attendance.check_in.desc())
         .limit(20)
         .all()
     )
     recent_activities = []
-    for att, usr in attendance_today:
-        minutes = func.extract('hour', att.check_in) * 60 + func.extract('minute', att.check_in)
-        # Fallback compute since SQL func not available here; classify by hour only
-        status = 'on-time' if att.check_in.hour < 9 or (att.check_in.hour == 9 and att.check_in.minute <= 30) else 'late'
+    for att, usr, late in attendance_today:
+        status = 'late' if late else 'on-time'
         recent_activities.append({
             "id": att.attendance_id,
             "type": "check-in",
@@ -105,24 +160,26 @@ def admin_dashboard(db: Session = Depends(get_db)):
             "status": status,
         })
 
-    departments = len(dept_names)
-
     return {
-        "totalEmployees": total_employees,
-        "presentToday": present_today,
-        "onLeave": on_leave_today,
-        "lateArrivals": late_arrivals,
-        "pendingLeaves": pending_leaves,
-        "activeTasks": active_tasks,
-        "completedTasks": completed_tasks,
-        "departments": departments,
+        "totalEmployees": kpis.total or 0,
+        "presentToday": kpis.present or 0,
+        "onLeave": int(kpis.on_leave or 0),
+        "lateArrivals": int(kpis.late or 0),
+        "pendingLeaves": int(kpis.pending or 0),
+        "activeTasks": int(kpis.active or 0),
+        "completedTasks": int(kpis.completed or 0),
+        "departments": len(dept_rows),
         "departmentPerformance": department_performance,
         "recentActivities": recent_activities,
     }
 
 
 @router.get("/hr")
-def hr_dashboard(db: Session = Depends(get_db)):
+def hr_dashboard(fresh: bool = Depends(_fresh_requested), db: Session = Depends(get_read_db)):
+    return _dashboard_response(db, "hr", None, fresh)
+
+
+def _build_hr_dashboard(db: Session):
     today_start, today_end = _today_bounds()
 
     total_employees = db.query(func.count(User.user_id)).scalar() or 0
@@ -142,12 +199,12 @@ def hr_dashboard(db: Session = Depends(get_db)):
         .scalar()
         or 0
     )
+    is_late = is_late_check_in(Attendance.check_in, User.department)
     late_arrivals = (
         db.query(func.count(Attendance.attendance_id))
+        .join(User, User.user_id == Attendance.user_id)
         .filter(Attendance.check_in >= today_start, Attendance.check_in < today_end)
-        .filter(
-            func.extract('hour', Attendance.check_in) * 60 + func.extract('minute', Attendance.check_in) > 9 * 60 + 30
-        )
+        .filter(is_late)
         .scalar()
         or 0
     )
@@ -161,67 +218,11 @@ def hr_dashboard(db: Session = Depends(get_db)):
     exits = db.query(func.count(User.user_id)).filter(User.resignation_date.isnot(None)).filter(User.resignation_date >= month_start, User.resignation_date < next_month).scalar() or 0
     open_positions = 0  # Not modeled; keep zero or derive from another table if exists
 
-    # Recent HR-related activities
-    recent_leave_requests = (
-        db.query(Leave, User)
-        .join(User, User.user_id == Leave.user_id)
-        .order_by(Leave.start_date.desc())
-        .limit(12)
-        .all()
-    )
-
-    attendance_today = (
-        db.query(Attendance, User)
-        .join(User, User.user_id == Attendance.user_id)
-        .filter(Attendance.check_in >= today_start, Attendance.check_in < today_end)
-        .order_by(Attendance.check_in.desc())
-        .limit(10)
-        .all()
-    )
-
-    recent_joiners_records = (
-        db.query(User)
-        .filter(User.joining_date.isnot(None))
-        .order_by(User.joining_date.desc())
-        .limit(8)
-        .all()
-    )
-
-    recent_activities = []
-
-    for leave, usr in recent_leave_requests:
-        recent_activities.append({
-            "id": f"leave-{leave.leave_id}",
-            "type": "leave",
-            "user": usr.name,
-            "time": (leave.start_date or datetime.utcnow()).isoformat(),
-            "status": (leave.status or "pending").lower(),
-            "description": leave.reason or f"{leave.leave_type or 'Leave'} request",
-        })
-
-    for att, usr in attendance_today:
-        status = 'on-time' if att.check_in and (att.check_in.hour < 9 or (att.check_in.hour == 9 and att.check_in.minute <= 30)) else 'late'
-        recent_activities.append({
-            "id": f"attendance-{att.attendance_id}",
-            "type": "attendance",
-            "user": usr.name,
-            "time": att.check_in.isoformat() if att.check_in else datetime.utcnow().isoformat(),
-            "status": status,
-            "description": "Checked in",
-        })
-
-    for joiner in recent_joiners_records:
-        recent_activities.append({
-            "id": f"join-{joiner.user_id}",
-            "type": "join",
-            "user": joiner.name,
-            "time": (joiner.joining_date or joiner.created_at or datetime.utcnow()).isoformat(),
-            "status": "new-joiner",
-            "description": f"Joined {joiner.department or 'company'}",
-        })
-
-    recent_activities.sort(key=lambda item: item.get("time") or "", reverse=True)
-    recent_activities = recent_activities[:15]
+    # Recent HR-related activities (one indexed scan of the activity feed)
+    recent_activities = [
+        activity_item(event)
+        for event in list_activity(db, event_types=HR_ACTIVITY_TYPES, limit=RECENT_ACTIVITY_LIMIT)
+    ]
 
     return {
         "totalEmployees": total_employees,
@@ -237,10 +238,17 @@ def hr_dashboard(db: Session = Depends(get_db)):
 
 
 @router.get("/manager")
-def manager_dashboard(current_user=Depends(get_current_user), db: Session = Depends(get_db)):
+def manager_dashboard(
+    fresh: bool = Depends(_fresh_requested),
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
     if not current_user.department:
         raise HTTPException(status_code=400, detail="Manager must have a department assigned")
-    dept = current_user.department
+    return _dashboard_response(db, "manager", current_user.department, fresh)
+
+
+def _build_manager_dashboard(db: Session, dept: str):
     today_start, today_end = _today_bounds()
 
     team_members = db.query(User).filter(User.department == dept).count()
@@ -258,19 +266,22 @@ def manager_dashboard(current_user=Depends(get_current_user), db: Session = Depe
         .scalar()
         or 0
     )
-    # Task counts by department (based on assigned_to user's department)
-    active_tasks = (
-        db.query(func.count(Task.task_id))
-        .join(User, User.user_id == Task.assigned_to)
-        .filter(User.department == dept, Task.status.in_([str(TaskStatus.PENDING), str(TaskStatus.IN_PROGRESS)]))
-        .scalar() or 0
-    )
-    completed_tasks = (
-        db.query(func.count(Task.task_id))
+    # Task counts by department (based on assigned_to user's department), one conditional aggregate
+    task_counts = (
+        db.query(
+            func.coalesce(func.sum(case((Task.status.in_([str(TaskStatus.PENDING), str(TaskStatus.IN_PROGRESS)]), 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Task.status == str(TaskStatus.COMPLETED), 1), else_=0)), 0),
+            func.coalesce(func.sum(case((and_(
+                Task.status != str(TaskStatus.COMPLETED),
+                Task.due_date.isnot(None),
+                Task.due_date < datetime.utcnow(),
+            ), 1), else_=0)), 0),
+        )
         .join(User, User.user_id == Task.assigned_to)
-        .filter(User.department == dept, Task.status == str(TaskStatus.COMPLETED))
-        .scalar() or 0
+        .filter(User.department == dept)
+        .one()
     )
+    active_tasks, completed_tasks, overdue_items = (int(value or 0) for value in task_counts)
     pending_approvals = (
         db.query(func.count(Leave.leave_id))
         .join(User, User.user_id == Leave.user_id)
@@ -283,102 +294,38 @@ def manager_dashboard(current_user=Depends(get_current_user), db: Session = Depe
         .scalar()
         or 0
     )
-    overdue_items = (
-        db.query(func.count(Task.task_id))
-        .join(User, User.user_id == Task.assigned_to)
-        .filter(
-            User.department == dept,
-            Task.status != str(TaskStatus.COMPLETED),
-            Task.due_date.isnot(None),
-            Task.due_date < datetime.utcnow()
-        )
-        .scalar() or 0
-    )
-
     total_tasks = active_tasks + completed_tasks
     team_performance_percent = int((completed_tasks / max(total_tasks, 1)) * 100)
 
-    # Recent activities within department (today's check-ins)
-    attendance_today = (
-        db.query(Attendance, User)
-        .join(User, User.user_id == Attendance.user_id)
-        .filter(User.department == dept, Attendance.check_in >= today_start, Attendance.check_in < today_end)
-        .order_by(Attendance.check_in.desc())
-        .limit(20)
-        .all()
-    )
-    activities = []
-    for att, usr in attendance_today:
-        status = 'on-time' if att.check_in.hour < 9 or (att.check_in.hour == 9 and att.check_in.minute <= 30) else 'late'
-        activities.append({
-            "id": f"attendance-{att.attendance_id}",
-            "type": "attendance",
-            "user": usr.name,
-            "time": att.check_in.isoformat(),
-            "description": "Checked in",
-            "status": status,
-        })
-
-    pending_leaves = (
-        db.query(Leave, User)
-        .join(User, User.user_id == Leave.user_id)
-        .filter(
-            User.department == dept,
-            Leave.status == "Pending",
-            User.role.in_([RoleEnum.EMPLOYEE, RoleEnum.TEAM_LEAD]),
-            User.is_active.is_(True),
+    # Recent activities within department (one indexed scan of the activity feed)
+    team_activities = [
+        activity_item(event)
+        for event in list_activity(db, scope=dept, event_types=MANAGER_ACTIVITY_TYPES, limit=RECENT_ACTIVITY_LIMIT)
+    ]
+
+    # Per-lead totals, completions and distinct assignees for every lead in one grouped query
+    lead_rows = (
+        db.query(
+            User.user_id,
+            User.name,
+            User.designation,
+            func.count(Task.task_id),
+            func.coalesce(func.sum(case((Task.status == str(TaskStatus.COMPLETED), 1), else_=0)), 0),
+            func.count(func.distinct(Task.assigned_to)),
         )
-        .order_by(Leave.start_date.desc())
-        .limit(10)
-        .all()
-    )
-    for leave, usr in pending_leaves:
-        activities.append({
-            "id": f"leave-{leave.leave_id}",
-            "type": "leave",
-            "user": usr.name,
-            "time": leave.start_date.isoformat(),
-            "description": "Leave request pending approval",
-            "status": leave.status.lower(),
-        })
-
-    recent_tasks = (
-        db.query(Task, User)
-        .join(User, User.user_id == Task.assigned_to)
-        .filter(User.department == dept)
-        .order_by(Task.due_date.is_(None), Task.due_date.desc())
-        .limit(10)
+        .outerjoin(Task, Task.assigned_by == User.user_id)
+        .filter(User.department == dept, User.role == RoleEnum.TEAM_LEAD)
+        .group_by(User.user_id, User.name, User.designation)
+        .order_by(User.user_id)
         .all()
     )
-    for task, usr in recent_tasks:
-        activities.append({
-            "id": f"task-{task.task_id}",
-            "type": "task",
-            "user": usr.name,
-            "time": (task.due_date or datetime.utcnow()).isoformat(),
-            "description": task.title,
-            "status": task.status.lower(),
-        })
-
-    activities.sort(key=lambda item: item["time"], reverse=True)
-    team_activities = activities[:15]
-
-    team_leads = db.query(User).filter(User.department == dept, User.role == RoleEnum.TEAM_LEAD).all()
     team_performance = []
-    for lead in team_leads:
-        lead_tasks = (
-            db.query(Task)
-            .filter(Task.assigned_by == lead.user_id)
-            .all()
-        )
-        total_lead_tasks = len(lead_tasks)
-        completed_lead_tasks = len([t for t in lead_tasks if t.status == str(TaskStatus.COMPLETED)])
-        completion_rate = int((completed_lead_tasks / max(total_lead_tasks, 1)) * 100)
-        member_ids = {task.assigned_to for task in lead_tasks if task.assigned_to}
+    for _, lead_name, designation, total_lead_tasks, completed_lead_tasks, members in lead_rows:
+        completion_rate = int((int(completed_lead_tasks or 0) / max(total_lead_tasks, 1)) * 100)
         team_performance.append({
-            "team": lead.designation or f"{lead.name}'s Team",
-            "lead": lead.name,
-            "members": len(member_ids),
+            "team": designation or f"{lead_name}'s Team",
+            "lead": lead_name,
+            "members": members,
             "completion": completion_rate,
         })
 
@@ -405,11 +352,18 @@ def manager_dashboard(current_user=Depends(get_current_user), db: Session = Depe
 
 
 @router.get("/team-lead")
-def team_lead_dashboard(current_user=Depends(get_current_user), db: Session = Depends(get_db)):
+def team_lead_dashboard(
+    fresh: bool = Depends(_fresh_requested),
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
     # Using department as team proxy
     if not current_user.department:
         raise HTTPException(status_code=400, detail="Team Lead must have a department assigned")
-    dept = current_user.department
+    return _dashboard_response(db, "team-lead", current_user.department, fresh)
+
+
+def _build_team_lead_dashboard(db: Session, dept: str):
     today_start, today_end = _today_bounds()
 
     team_size = db.query(User).filter(User.department == dept).count()
@@ -425,24 +379,22 @@ def team_lead_dashboard(current_user=Depends(get_current_user), db: Session = De
         .filter(User.department == dept, Leave.status == "Approved", Leave.start_date <= today_end, Leave.end_date >= today_start)
         .scalar() or 0
     )
-    tasks_in_progress = (
-        db.query(func.count(Task.task_id))
-        .join(User, User.user_id == Task.assigned_to)
-        .filter(User.department == dept, Task.status == str(TaskStatus.IN_PROGRESS))
-        .scalar() or 0
-    )
-    completed_today = (
-        db.query(func.count(Task.task_id))
+    task_counts = (
+        db.query(
+            func.coalesce(func.sum(case((Task.status == str(TaskStatus.IN_PROGRESS), 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Task.status == str(TaskStatus.COMPLETED), 1), else_=0)), 0),
+        )
         .join(User, User.user_id == Task.assigned_to)
-        .filter(User.department == dept, Task.status == str(TaskStatus.COMPLETED))
-        .scalar() or 0
+        .filter(User.department == dept)
+        .one()
     )
+    tasks_in_progress, completed_today = (int(value or 0) for value in task_counts)
     pending_reviews = 0  # Not modeled
     team_efficiency = 0  # Not modeled
 
     # Recent activities within team (today's check-ins)
     attendance_today = (
-        db.query(Attendance, User)
+        db.query(Attendance, User, is_late_check_in(Attendance.check_in, User.department))
         .join(User, User.user_id == Attendance.user_id)
         .filter(User.department == dept, Attendance.check_in >= today_start, Attendance.check_in < today_end)
         .order_by(Attendance.check_in.desc())
@@ -450,8 +402,8 @@ def team_lead_dashboard(current_user=Depends(get_current_user), db: Session = De
         .all()
     )
     recent_activities = []
-    for att, usr in attendance_today:
-        status = 'on-time' if att.check_in.hour < 9 or (att.check_in.hour == 9 and att.check_in.minute <= 30) else 'late'
+    for att, usr, late in attendance_today:
+        status = 'late' if late else 'on-time'
         recent_activities.append({
             "id": att.attendance_id,
             "type": "check-in",
@@ -472,8 +424,17 @@ def team_lead_dashboard(current_user=Depends(get_current_user), db: Session = De
     }
 
 
+# (db, department) -> payload, used for snapshots
+DASHBOARD_BUILDERS = {
+    "admin": lambda db, department: _build_admin_dashboard(db),
+    "hr": lambda db, department: _build_hr_dashboard(db),
+    "manager": _build_manager_dashboard,
+    "team-lead": _build_team_lead_dashboard,
+}
+
+
 @router.get("/employee")
-def employee_dashboard(current_user=Depends(get_current_user), db: Session = Depends(get_db)):
+def employee_dashboard(current_user=Depends(get_current_user), db: Session = Depends(get_read_db)):
     user_id = current_user.user_id
     if not user_id:
         raise HTTPException(status_code=400, detail="Invalid user")
@@ -514,3 +475,63 @@ def employee_dashboard(current_user=Depends(get_current_user), db: Session = Dep
     }
 
 
+@router.get("/trends")
+def attendance_trends(
+    start: date = Query(..., description="First day (UTC) of the range"),
+    end: Optional[date] = Query(None, description="Last day of the range (default today)"),
+    bucket: str = Query("week", pattern="^(day|week|month)$"),
+    department: Optional[List[str]] = Query(None, description="Repeat for several departments; default all"),
+    current_user=Depends(require_roles(RoleEnum.ADMIN, RoleEnum.HR, RoleEnum.MANAGER)),
+    db: Session = Depends(get_read_db),
+):
+    """Presence, late arrivals and average hours per day/week/month and department."""
+    end = end or datetime.utcnow().date()
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (end - start).days >= settings.ATTENDANCE_TRENDS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {settings.ATTENDANCE_TRENDS_MAX_DAYS} days")
+
+    if current_user.role == RoleEnum.MANAGER:
+        own = (current_user.department or "").strip()
+        if not own:
+            raise HTTPException(status_code=400, detail="Manager must have a department assigned")
+        if department and any((d or "").strip() != own for d in department):
+            raise HTTPException(status_code=403, detail="Managers can only view their own department")
+        department = [own]
+
+    return build_trends(db, start, end, bucket, department)
+
+
+def _activity_cursor(cursor: Optional[str]):
+    if not cursor:
+        return None
+    occurred_at, _, event_id = cursor.rpartition("_")
+    try:
+        return datetime.fromisoformat(occurred_at), int(event_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/activity")
+def activity_feed(
+    department: Optional[str] = Query(None, description="Admin/HR only; default organisation-wide"),
+    event_type: Optional[List[str]] = Query(None, alias="type", description="attendance, leave, task, join; repeatable"),
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    current_user=Depends(require_roles(RoleEnum.ADMIN, RoleEnum.HR, RoleEnum.MANAGER, RoleEnum.TEAM_LEAD)),
+    db: Session = Depends(get_read_db),
+):
+    """Newest-first activity feed; Managers and Team Leads see their own department."""
+    scope = department
+    if current_user.role in (RoleEnum.MANAGER, RoleEnum.TEAM_LEAD):
+        own = (current_user.department or "").strip()
+        if not own:
+            raise HTTPException(status_code=400, detail="User must have a department assigned")
+        if department is not None and department.strip() != own:
+            raise HTTPException(status_code=403, detail="You can only view your own department")
+        scope = own
+
+    events = list_activity(db, scope=scope, event_types=event_type, before=_activity_cursor(cursor), limit=limit + 1)
+    page = events[:limit]
+    next_cursor = f"{page[-1].occurred_at.isoformat()}_{page[-1].id}" if len(events) > limit else None
+    return {"items": [activity_item(event) for event in page], "nextCursor": next_cursor}
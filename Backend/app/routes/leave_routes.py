@@ -3,8 +3,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
-from datetime import datetime
-from app.db.database import get_db
+from datetime import date, datetime, timedelta
+from typing import Optional
+from app.core.config import settings
+from app.core.dashboard_cache import invalidate_dashboards
+from app.db.database import get_db, get_read_db
 from app.crud.leave_crud import (
     apply_leave,
     approve_leave as approve_leave_db,
@@ -14,23 +17,30 @@ from app.crud.leave_crud import (
     delete_leave as delete_leave_db,
     list_pending_all,
     list_pending_by_department,
-    list_pending_by_requester_roles,
-    list_pending_by_department_and_roles,
-    list_decided_by_approver,
     create_leave_request_notifications,
     create_leave_decision_notification,
     list_leave_notifications,
     mark_leave_notification_as_read,
-    get_leave_balance,
+    decide_leaves,
+    list_leaves_with_users,
 )
+from app.crud.leave_calendar_crud import department_leave_calendar, overlapping_user_leaves
+from app.crud.leave_balance_crud import carry_forward, get_leave_balance, list_ledger, post_ledger_entry
 from app.dependencies import get_current_user, require_roles
 from app.schemas.leave_schema import (
     LeaveCreate,
     LeaveOut,
+    LeaveApplyOut,
+    LeaveOverlapCheck,
+    LeaveCalendarResponse,
     LeaveWithUserOut,
     LeaveNotificationOut,
     LeaveUpdate,
     LeaveBalanceResponse,
+    LeaveLedgerEntryOut,
+    LeaveBalanceAdjustment,
+    LeaveBulkDecision,
+    LeaveBulkDecisionResponse,
 )
 from app.db.models.user import User
 from app.db.models.leave import Leave
@@ -39,13 +49,46 @@ from app.enums import RoleEnum
 
 router = APIRouter(prefix="/leave", tags=["Leave"])
 
-# Employee applies for leave
-@router.post("/", response_model=LeaveOut)
+def _check_date_order(start_date: date, end_date: date) -> None:
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+
+
+def _check_date_range(start_date: date, end_date: date) -> None:
+    _check_date_order(start_date, end_date)
+    if (end_date - start_date).days + 1 > settings.LEAVE_CALENDAR_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {settings.LEAVE_CALENDAR_MAX_DAYS} days")
+
+
+def _reject_overlaps(db: Session, user_id: int, start_date: date, end_date: date, exclude_leave_id: Optional[int] = None) -> None:
+    # Lock the requester's row until the caller commits its insert / update, so two concurrent
+    # requests of one user can't both pass the check (locking the overlapping leaves instead
+    # wouldn't block anything when there are none yet)
+    db.query(User.user_id).filter(User.user_id == user_id).with_for_update().first()
+    overlaps = overlapping_user_leaves(db, user_id, start_date, end_date, exclude_leave_id)
+    if overlaps:
+        ids = ", ".join(str(leave.leave_id) for leave in overlaps)
+        raise HTTPException(status_code=409, detail=f"Overlaps your pending or approved leave request(s): {ids}")
+
+
+def _department_coverage(db: Session, department: Optional[str], start_date: date, end_date: date) -> dict:
+    """Team coverage over the range, or its first LEAVE_CALENDAR_MAX_DAYS days for longer leaves."""
+    if not (department or "").strip():
+        return {"headcount": None, "coverage": []}
+    end_date = min(end_date, start_date + timedelta(days=settings.LEAVE_CALENDAR_MAX_DAYS - 1))
+    calendar = department_leave_calendar(db, department, start_date, end_date)
+    return {"headcount": calendar["headcount"], "coverage": calendar["coverage"]}
+
+
+# Employee applies for leave; the response reports team coverage over the requested days
+@router.post("/", response_model=LeaveApplyOut)
 def request_leave(
     leave: LeaveCreate,
     db: Session = Depends(get_db),
     user=Depends(get_current_user)
 ):
+    _check_date_order(leave.start_date, leave.end_date)
+    _reject_overlaps(db, user.user_id, leave.start_date, leave.end_date)
     start_dt = datetime.combine(leave.start_date, datetime.min.time())
     end_dt = datetime.combine(leave.end_date, datetime.min.time())
     new_leave = apply_leave(
@@ -58,7 +101,48 @@ def request_leave(
     )
     # Create notifications for appropriate recipients based on department and role
     create_leave_request_notifications(db, new_leave, user)
-    return new_leave
+    return {
+        **LeaveOut.model_validate(new_leave).model_dump(),
+        **_department_coverage(db, user.department, leave.start_date, leave.end_date),
+    }
+
+
+# Check a date range before applying: own overlapping requests and team coverage
+@router.get("/overlap-check", response_model=LeaveOverlapCheck)
+def check_leave_overlap(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_user)
+):
+    _check_date_order(start_date, end_date)
+    return {
+        "overlaps": overlapping_user_leaves(db, user.user_id, start_date, end_date),
+        **_department_coverage(db, user.department, start_date, end_date),
+    }
+
+
+# Department leave calendar: who is off (or has asked to be) per day of the range
+@router.get("/calendar", response_model=LeaveCalendarResponse)
+def leave_calendar(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    department: Optional[str] = Query(None, description="Admin/HR only; everyone else gets their own"),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_user)
+):
+    _check_date_range(start_date, end_date)
+    if user.role not in (RoleEnum.ADMIN, RoleEnum.HR):
+        own = (user.department or "").strip()
+        if not own:
+            raise HTTPException(status_code=400, detail="User must have a department assigned")
+        if department is not None and department.strip() != own:
+            raise HTTPException(status_code=403, detail="You can only view your own department")
+        department = own
+    department = (department or "").strip()
+    if not department:
+        raise HTTPException(status_code=400, detail="department is required")
+    return department_leave_calendar(db, department, start_date, end_date)
 
 
 # Manager/Admin can approve leave
@@ -72,6 +156,7 @@ def approve_leave_request(
     leave = approve_leave_db(db, leave_id, approver_id=user.user_id, comments=comments)
     if not leave:
         raise HTTPException(status_code=404, detail="Leave not found")
+    invalidate_dashboards(leave.user.department if leave.user else None)
     create_leave_decision_notification(db, leave=leave, approver=user, approved=True)
     return leave
 
@@ -87,10 +172,43 @@ def reject_leave_request(
     leave = reject_leave(db, leave_id, approver_id=user.user_id, rejection_reason=rejection_reason)
     if not leave:
         raise HTTPException(status_code=404, detail="Leave not found")
+    invalidate_dashboards(leave.user.department if leave.user else None)
     create_leave_decision_notification(db, leave=leave, approver=user, approved=False)
     return leave
 
 
+# Approve or reject many pending requests at once (same permissions as the approvals inbox)
+@router.post("/approvals/bulk", response_model=LeaveBulkDecisionResponse)
+def bulk_decide_leave_requests(
+    payload: LeaveBulkDecision,
+    db: Session = Depends(get_db),
+    user=Depends(require_roles("Manager", "Admin", "HR"))
+):
+    approve = payload.decision == "approve"
+    comments = (payload.comments or "").strip() or None
+    if not approve and not comments:
+        raise HTTPException(status_code=400, detail="comments (the rejection reason) are required to reject")
+    leave_ids = list(dict.fromkeys(payload.leave_ids))
+
+    results = decide_leaves(db, leave_ids, user, approve, comments or ("Approved" if approve else None))
+    decided = [leave_id for leave_id, result in results.items() if result in ("approved", "rejected")]
+    if decided:
+        departments = {
+            department
+            for (department,) in db.query(User.department)
+            .join(Leave, Leave.user_id == User.user_id)
+            .filter(Leave.leave_id.in_(decided))
+            .distinct()
+        }
+        for department in departments:
+            invalidate_dashboards(department)
+    return {
+        "decision": payload.decision,
+        "updated": len(decided),
+        "results": [{"leave_id": leave_id, "result": results[leave_id]} for leave_id in leave_ids],
+    }
+
+
 # View logged-in user's leave requests
 @router.get("/", response_model=list[LeaveOut])
 def view_my_leave(
@@ -112,11 +230,61 @@ def view_my_leave(
 
 @router.get("/balance", response_model=LeaveBalanceResponse)
 def leave_balance(
+    year: Optional[int] = Query(default=None, description="Calendar year (default: current year)"),
     db: Session = Depends(get_db),
     user=Depends(get_current_user)
 ):
-    balances = get_leave_balance(db, user.user_id)
-    return {"balances": balances}
+    year = year or datetime.utcnow().year
+    balances = get_leave_balance(db, user.user_id, year)
+    return {"year": year, "balances": balances}
+
+
+@router.get("/ledger", response_model=list[LeaveLedgerEntryOut])
+def leave_ledger(
+    year: Optional[int] = Query(default=None),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user)
+):
+    """Accruals, debits and adjustments behind the logged-in user's balances."""
+    return list_ledger(db, user.user_id, year)
+
+
+# Admin/HR: manual balance corrections (positive or negative days)
+@router.post("/balance/adjust", response_model=LeaveLedgerEntryOut)
+def adjust_leave_balance(
+    adjustment: LeaveBalanceAdjustment,
+    db: Session = Depends(get_db),
+    user=Depends(require_roles(RoleEnum.ADMIN, RoleEnum.HR))
+):
+    if not adjustment.days:
+        raise HTTPException(status_code=400, detail="days must not be 0")
+    if not db.get(User, adjustment.user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    entry = post_ledger_entry(
+        db,
+        adjustment.user_id,
+        adjustment.year,
+        adjustment.leave_type,
+        "adjustment",
+        adjustment.days,
+        actor_id=user.user_id,
+        note=adjustment.note or "Manual adjustment",
+    )
+    db.commit()
+    db.refresh(entry)
+    return entry
+
+
+# Admin/HR: carry unused days of a year into the next one (safe to repeat)
+@router.post("/balance/carry-forward")
+def carry_forward_balances(
+    year: int = Body(..., embed=True),
+    db: Session = Depends(get_db),
+    user=Depends(require_roles(RoleEnum.ADMIN, RoleEnum.HR))
+):
+    carried = carry_forward(db, year, actor_id=user.user_id)
+    db.commit()
+    return {"year": year, "carried_forward": carried}
 
 
 @router.put("/{leave_id}", response_model=LeaveOut)
@@ -135,6 +303,13 @@ def update_leave_request(
         end_date = datetime.combine(leave_update.end_date, datetime.min.time())
     if leave_update.leave_type:
         leave_type = leave_update.leave_type.lower()
+    if start_date or end_date:
+        current = db.query(Leave).filter(Leave.leave_id == leave_id, Leave.user_id == user.user_id).first()
+        if current:
+            new_start = (start_date or current.start_date).date()
+            new_end = (end_date or current.end_date).date()
+            _check_date_order(new_start, new_end)
+            _reject_overlaps(db, user.user_id, new_start, new_end, exclude_leave_id=leave_id)
 
     updated_leave = update_leave_db(
         db,
@@ -175,51 +350,27 @@ def delete_leave_request(
 # Get all leaves (Admin only - all roles)
 @router.get("/all", response_model=list[LeaveWithUserOut])
 def get_all_leaves(
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500),
     db: Session = Depends(get_db),
     user=Depends(require_roles("Admin"))
 ):
     """Admin only: View leave requests from all roles (HR, Manager, TeamLead, Employee)"""
     # Admin can see all leave requests from all roles
-    all_leaves = (
-        db.query(Leave)
-        .join(User, User.user_id == Leave.user_id)
-        .filter(User.role.in_([RoleEnum.HR, RoleEnum.MANAGER, RoleEnum.TEAM_LEAD, RoleEnum.EMPLOYEE]))
-        .order_by(Leave.created_at.desc())
-        .all()
+    return list_leaves_with_users(
+        db,
+        User.role.in_([RoleEnum.HR, RoleEnum.MANAGER, RoleEnum.TEAM_LEAD, RoleEnum.EMPLOYEE]),
+        order_by=(Leave.created_at.desc(), Leave.leave_id.desc()),
+        skip=skip,
+        limit=limit,
     )
-    
-    results = []
-    for leave in all_leaves:
-        u: User = leave.user
-        days = (leave.end_date.date() - leave.start_date.date()).days + 1
-        results.append({
-            "leave_id": leave.leave_id,
-            "user_id": leave.user_id,
-            "start_date": leave.start_date.date(),
-            "end_date": leave.end_date.date(),
-            "reason": leave.reason,
-            "status": leave.status,
-            "leave_type": (leave.leave_type or "annual").lower(),
-            "type": (leave.leave_type or "annual").lower(),
-            "employee_id": u.employee_id if u else "",
-            "name": u.name if u else "",
-            "department": u.department if u else None,
-            "role": str(u.role) if u and u.role else None,
-            "profile_photo": u.profile_photo if u else None,
-            "email": u.email if u else None,
-            "days": days,
-            "created_at": leave.created_at if hasattr(leave, 'created_at') else None,
-            "approved_by": leave.approved_by if hasattr(leave, 'approved_by') else None,
-            "approved_at": leave.approved_at if hasattr(leave, 'approved_at') else None,
-            "rejection_reason": leave.rejection_reason if hasattr(leave, 'rejection_reason') else None,
-            "comments": leave.comments if hasattr(leave, 'comments') else None,
-        })
-    return results
 
 
 # Get department leaves (HR/Manager only - their department, Employee/TeamLead only)
 @router.get("/department", response_model=list[LeaveWithUserOut])
 def get_department_leaves(
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500),
     db: Session = Depends(get_db),
     user=Depends(require_roles("HR", "Manager"))
 ):
@@ -228,44 +379,14 @@ def get_department_leaves(
         raise HTTPException(status_code=400, detail="User has no department assigned")
     
     # Get Employee and TeamLead leaves from user's department only
-    department_leaves = (
-        db.query(Leave)
-        .join(User, User.user_id == Leave.user_id)
-        .filter(
-            User.department == user.department,
-            User.role.in_([RoleEnum.EMPLOYEE, RoleEnum.TEAM_LEAD])
-        )
-        .order_by(Leave.created_at.desc())
-        .all()
+    return list_leaves_with_users(
+        db,
+        User.department == user.department,
+        User.role.in_([RoleEnum.EMPLOYEE, RoleEnum.TEAM_LEAD]),
+        order_by=(Leave.created_at.desc(), Leave.leave_id.desc()),
+        skip=skip,
+        limit=limit,
     )
-    
-    results = []
-    for leave in department_leaves:
-        u: User = leave.user
-        days = (leave.end_date.date() - leave.start_date.date()).days + 1
-        results.append({
-            "leave_id": leave.leave_id,
-            "user_id": leave.user_id,
-            "start_date": leave.start_date.date(),
-            "end_date": leave.end_date.date(),
-            "reason": leave.reason,
-            "status": leave.status,
-            "leave_type": (leave.leave_type or "annual").lower(),
-            "type": (leave.leave_type or "annual").lower(),
-            "employee_id": u.employee_id if u else "",
-            "name": u.name if u else "",
-            "department": u.department if u else None,
-            "role": str(u.role) if u and u.role else None,
-            "profile_photo": u.profile_photo if u else None,
-            "email": u.email if u else None,
-            "days": days,
-            "created_at": leave.created_at if hasattr(leave, 'created_at') else None,
-            "approved_by": leave.approved_by if hasattr(leave, 'approved_by') else None,
-            "approved_at": leave.approved_at if hasattr(leave, 'approved_at') else None,
-            "rejection_reason": leave.rejection_reason if hasattr(leave, 'rejection_reason') else None,
-            "comments": leave.comments if hasattr(leave, 'comments') else None,
-        })
-    return results
 
 
 # Get my leaves (TeamLead/Employee - own leaves only)
@@ -286,6 +407,8 @@ def get_my_leaves_only(
 # Approvals inbox for approvers based on hierarchy
 @router.get("/approvals", response_model=list[LeaveWithUserOut])
 def approvals_inbox(
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500),
     db: Session = Depends(get_db),
     user=Depends(get_current_user)
 ):
@@ -293,115 +416,49 @@ def approvals_inbox(
     role_value = getattr(user.role, "value", str(user.role))
     if role_value == RoleEnum.ADMIN.value:
         # Admin approves all leave requests (HR, Manager, TeamLead, Employee)
-        pending = list_pending_by_requester_roles(db, [RoleEnum.HR.value, RoleEnum.MANAGER.value, RoleEnum.TEAM_LEAD.value, RoleEnum.EMPLOYEE.value])
+        criteria = [User.role.in_([RoleEnum.HR.value, RoleEnum.MANAGER.value, RoleEnum.TEAM_LEAD.value, RoleEnum.EMPLOYEE.value])]
     elif role_value in (RoleEnum.HR.value, RoleEnum.MANAGER.value):
         if not user.department:
             return []
         # HR/Manager see only Employee/TeamLead requests from their department
-        pending = list_pending_by_department_and_roles(db, user.department, [RoleEnum.EMPLOYEE.value, RoleEnum.TEAM_LEAD.value])
+        criteria = [User.department == user.department, User.role.in_([RoleEnum.EMPLOYEE.value, RoleEnum.TEAM_LEAD.value])]
     else:
         return []
 
-    # enrich with user details
-    results = []
-    for leave in pending:
-        u: User = leave.user
-        # Calculate days
-        days = (leave.end_date.date() - leave.start_date.date()).days + 1
-        results.append({
-            "leave_id": leave.leave_id,
-            "user_id": leave.user_id,
-            "start_date": leave.start_date.date(),
-            "end_date": leave.end_date.date(),
-            "reason": leave.reason,
-            "status": leave.status,
-            "leave_type": (leave.leave_type or "annual").lower(),
-            "type": (leave.leave_type or "annual").lower(),
-            "employee_id": u.employee_id if u else "",
-            "name": u.name if u else "",
-            "department": u.department if u else None,
-            "role": str(u.role) if u and u.role else None,
-            "profile_photo": u.profile_photo if u else None,
-            "email": u.email if u else None,
-            "days": days,
-            "created_at": leave.created_at if hasattr(leave, 'created_at') else None,
-            "approved_by": leave.approved_by if hasattr(leave, 'approved_by') else None,
-            "approved_at": leave.approved_at if hasattr(leave, 'approved_at') else None,
-            "rejection_reason": leave.rejection_reason if hasattr(leave, 'rejection_reason') else None,
-            "comments": leave.comments if hasattr(leave, 'comments') else None,
-        })
-    return results
+    return list_leaves_with_users(db, Leave.status == "Pending", *criteria, skip=skip, limit=limit)
 
 
 # Approver's decision history
 @router.get("/approvals/history", response_model=list[LeaveWithUserOut])
 def approvals_history(
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500),
     db: Session = Depends(get_db),
     user=Depends(get_current_user)
 ):
     # Admin sees decided leaves from all roles and all departments
     # HR/Manager see decided Employee/TeamLead leaves from their department
+    # Anyone else only the leaves they decided themselves
     role_value = getattr(user.role, "value", str(user.role))
     if role_value == RoleEnum.ADMIN.value:
-        # Get decided leaves from all roles (all departments)
-        decided = (
-            db.query(Leave)
-            .join(User, User.user_id == Leave.user_id)
-            .filter(
-                Leave.status != "Pending",
-                User.role.in_([RoleEnum.HR, RoleEnum.MANAGER, RoleEnum.TEAM_LEAD, RoleEnum.EMPLOYEE])
-            )
-            .order_by(Leave.end_date.desc())
-            .all()
-        )
+        # Decided leaves from all roles (all departments)
+        criteria = [User.role.in_([RoleEnum.HR, RoleEnum.MANAGER, RoleEnum.TEAM_LEAD, RoleEnum.EMPLOYEE])]
     elif role_value in (RoleEnum.HR.value, RoleEnum.MANAGER.value):
         if not user.department:
-            decided = []
-        else:
-            # Get decided Employee/TeamLead leaves from their department
-            decided = (
-                db.query(Leave)
-                .join(User, User.user_id == Leave.user_id)
-                .filter(
-                    Leave.status != "Pending",
-                    User.department == user.department,
-                    User.role.in_([RoleEnum.EMPLOYEE, RoleEnum.TEAM_LEAD])
-                )
-                .order_by(Leave.end_date.desc())
-                .all()
-            )
+            return []
+        # Decided Employee/TeamLead leaves from their department
+        criteria = [User.department == user.department, User.role.in_([RoleEnum.EMPLOYEE, RoleEnum.TEAM_LEAD])]
     else:
-        # Other roles see only leaves they decided
-        decided = list_decided_by_approver(db, user.user_id)
-    
-    results: list[dict] = []
-    for leave in decided:
-        u: User = leave.user
-        # Calculate days
-        days = (leave.end_date.date() - leave.start_date.date()).days + 1
-        results.append({
-            "leave_id": leave.leave_id,
-            "user_id": leave.user_id,
-            "start_date": leave.start_date.date(),
-            "end_date": leave.end_date.date(),
-            "reason": leave.reason,
-            "status": leave.status,
-            "leave_type": (leave.leave_type or "annual").lower(),
-            "type": (leave.leave_type or "annual").lower(),
-            "employee_id": u.employee_id if u else "",
-            "name": u.name if u else "",
-            "department": u.department if u else None,
-            "role": str(u.role) if u and u.role else None,
-            "profile_photo": u.profile_photo if u else None,
-            "email": u.email if u else None,
-            "days": days,
-            "created_at": leave.created_at if hasattr(leave, 'created_at') else None,
-            "approved_by": leave.approved_by if hasattr(leave, 'approved_by') else None,
-            "approved_at": leave.approved_at if hasattr(leave, 'approved_at') else None,
-            "rejection_reason": leave.rejection_reason if hasattr(leave, 'rejection_reason') else None,
-            "comments": leave.comments if hasattr(leave, 'comments') else None,
-        })
-    return results
+        criteria = [Leave.approved_by == user.user_id]
+
+    return list_leaves_with_users(
+        db,
+        Leave.status != "Pending",
+        *criteria,
+        order_by=(Leave.end_date.desc(), Leave.leave_id.desc()),
+        skip=skip,
+        limit=limit,
+    )
 
 
 # Leave notifications endpoints
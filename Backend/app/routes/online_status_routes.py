@@ -3,16 +3,32 @@ Online/Offline Status Routes - Add-on to existing attendance system.
 Does NOT modify check-in/check-out logic.
 """
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import and_
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from typing import Optional
 
-from app.db.database import get_db
+from app.core.config import settings
+from app.core.dashboard_cache import DashboardCache
+from app.core.live_feed import live_feed
+from app.core.responses import dumps
+from app.crud.online_status_crud import (
+    close_status_log,
+    get_open_log,
+    load_status_logs,
+    lock_online_status,
+    open_status_log,
+    status_time_summary,
+    team_presence,
+)
+from app.db.database import get_db, get_read_db
+from app.db.async_database import get_async_db
 from app.db.models.attendance import Attendance
-from app.db.models.online_status import OnlineStatus, OnlineStatusLog
+from app.db.models.online_status import OnlineStatus
 from app.db.models.user import User
 from app.schemas.online_status_schema import (
     OnlineStatusOut,
@@ -20,8 +36,12 @@ from app.schemas.online_status_schema import (
     OnlineStatusLogOut,
     ToggleStatusRequest,
     ToggleStatusResponse,
+    HeartbeatResponse,
+    TeamPresenceBoard,
 )
-from app.dependencies import get_current_user
+from app.enums import RoleEnum
+from app.services.presence import presence_registry
+from app.dependencies import get_current_user, require_roles
 
 router = APIRouter(prefix="/online-status", tags=["Online Status"])
 logger = logging.getLogger(__name__)
@@ -29,20 +49,20 @@ logger = logging.getLogger(__name__)
 INDIA_TZ = ZoneInfo("Asia/Kolkata")
 UTC_TZ = ZoneInfo("UTC")
 
+# Team boards are polled by every manager's screen; reuse one per department for a few seconds
+team_presence_cache = DashboardCache(settings.TEAM_PRESENCE_CACHE_SECONDS, name="team_presence")
 
-def _calculate_duration_minutes(start: datetime, end: datetime) -> float:
-    """Calculate duration in minutes between two timestamps."""
-    if not start or not end:
-        return 0.0
-    delta = end - start
-    return round(delta.total_seconds() / 60, 2)
+
+def _today_start_utc() -> datetime:
+    """Start of today (India time) as a naive UTC datetime."""
+    india_now = datetime.now(INDIA_TZ)
+    today_start = india_now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return today_start.astimezone(UTC_TZ).replace(tzinfo=None)
 
 
 def _get_today_attendance(db: Session, user_id: int) -> Optional[Attendance]:
     """Get today's active attendance record (checked in, not checked out)."""
-    india_now = datetime.now(INDIA_TZ)
-    today_start = india_now.replace(hour=0, minute=0, second=0, microsecond=0)
-    today_start_utc = today_start.astimezone(UTC_TZ).replace(tzinfo=None)
+    today_start_utc = _today_start_utc()
     
     return (
         db.query(Attendance)
@@ -56,16 +76,19 @@ def _get_today_attendance(db: Session, user_id: int) -> Optional[Attendance]:
     )
 
 
-def _get_or_create_online_status(db: Session, user_id: int, attendance_id: int) -> OnlineStatus:
-    """Get existing online status or create new one (defaults to Online)."""
-    online_status = (
-        db.query(OnlineStatus)
-        .filter(
-            OnlineStatus.user_id == user_id,
-            OnlineStatus.attendance_id == attendance_id
+def _get_or_create_online_status(db: Session, user_id: int, attendance_id: int, lock: bool = False) -> OnlineStatus:
+    """Get existing online status or create new one (defaults to Online); `lock` returns it locked."""
+    if lock:
+        online_status = lock_online_status(db, user_id, attendance_id)
+    else:
+        online_status = (
+            db.query(OnlineStatus)
+            .filter(
+                OnlineStatus.user_id == user_id,
+                OnlineStatus.attendance_id == attendance_id
+            )
+            .first()
         )
-        .first()
-    )
     
     if not online_status:
         # Create new online status (default: Online)
@@ -78,64 +101,29 @@ def _get_or_create_online_status(db: Session, user_id: int, attendance_id: int)
         db.flush()
         
         # Create initial "online" log entry
-        initial_log = OnlineStatusLog(
-            user_id=user_id,
-            attendance_id=attendance_id,
-            online_status_id=online_status.id,
-            status="online",
-            started_at=datetime.utcnow()
-        )
-        db.add(initial_log)
+        open_status_log(db, online_status, "online")
         db.commit()
         db.refresh(online_status)
         logger.info(f"Created new online status for user {user_id}, attendance {attendance_id}")
+        if lock:
+            online_status = lock_online_status(db, user_id, attendance_id)
     
     return online_status
 
 
-def _calculate_time_summary(db: Session, online_status_id: int) -> dict:
-    """Calculate total online and offline time from logs."""
-    logs = (
-        db.query(OnlineStatusLog)
-        .filter(OnlineStatusLog.online_status_id == online_status_id)
-        .order_by(OnlineStatusLog.started_at)
-        .all()
-    )
-    
-    total_online = 0.0
-    total_offline = 0.0
-    offline_count = 0
-    
-    for log in logs:
-        if log.ended_at:
-            duration = _calculate_duration_minutes(log.started_at, log.ended_at)
-        else:
-            # Current active session
-            duration = _calculate_duration_minutes(log.started_at, datetime.utcnow())
-        
-        if log.status == "online":
-            total_online += duration
-        else:
-            total_offline += duration
-            offline_count += 1
-    
-    return {
-        "total_online_minutes": round(total_online, 2),
-        "total_offline_minutes": round(total_offline, 2),
-        "effective_work_hours": round(total_online / 60, 2),
-        "offline_count": offline_count
-    }
-
-
 @router.get("/current/{user_id}", response_model=OnlineStatusOut)
-def get_current_status(
+async def get_current_status(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get current online/offline status for a user.
     Returns status only if user has an active attendance (checked in, not checked out).
     """
+    return await db.run_sync(_current_status, user_id)
+
+
+def _current_status(db: Session, user_id: int) -> OnlineStatusOut:
     # Check for active attendance
     attendance = _get_today_attendance(db, user_id)
     if not attendance:
@@ -144,11 +132,11 @@ def get_current_status(
             detail="No active attendance found. Please check in first."
         )
     
-    # Get or create online status
+    # Plain read: only the writers (toggle, check-out) lock the row
     online_status = _get_or_create_online_status(db, user_id, attendance.attendance_id)
     
     # Calculate time summary
-    summary = _calculate_time_summary(db, online_status.id)
+    summary = status_time_summary(db, online_status)
     
     return OnlineStatusOut(
         id=online_status.id,
@@ -163,11 +151,79 @@ def get_current_status(
     )
 
 
+@router.get("/team", response_model=TeamPresenceBoard)
+def get_team_presence(
+    department: Optional[str] = Query(None, description="Admin/HR only; Managers and Team Leads get their own"),
+    current_user: User = Depends(require_roles(RoleEnum.ADMIN, RoleEnum.HR, RoleEnum.MANAGER, RoleEnum.TEAM_LEAD)),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Presence board for a department: every active member's attendance state, online flag,
+    current period start and online minutes today, in a single query instead of one
+    /current call per member. Cached per department for TEAM_PRESENCE_CACHE_SECONDS.
+    """
+    if current_user.role in (RoleEnum.MANAGER, RoleEnum.TEAM_LEAD):
+        own = (current_user.department or "").strip()
+        if not own:
+            raise HTTPException(status_code=400, detail="User must have a department assigned")
+        if department is not None and department.strip() != own:
+            raise HTTPException(status_code=403, detail="You can only view your own department")
+        department = own
+    department = (department or "").strip()
+    if not department:
+        raise HTTPException(status_code=400, detail="department is required")
+
+    today_start_utc = _today_start_utc()
+    body = team_presence_cache.get_or_compute(
+        "team",
+        "",
+        department,
+        today_start_utc.date(),
+        lambda: dumps(_team_presence_board(db, department, today_start_utc).model_dump()),
+    )
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"Cache-Control": f"private, max-age={int(settings.TEAM_PRESENCE_CACHE_SECONDS)}"},
+    )
+
+
+def _team_presence_board(db: Session, department: str, today_start_utc: datetime) -> TeamPresenceBoard:
+    now = datetime.utcnow()
+    members = team_presence(db, department, today_start_utc, now)
+    checked_in = [m for m in members if m["attendance_state"] == "checked_in"]
+    return TeamPresenceBoard(
+        department=department,
+        generated_at=now,
+        online_count=sum(1 for m in checked_in if m["is_online"]),
+        offline_count=sum(1 for m in checked_in if not m["is_online"]),
+        checked_out_count=sum(1 for m in members if m["attendance_state"] == "checked_out"),
+        absent_count=sum(1 for m in members if m["attendance_state"] == "absent"),
+        members=members,
+    )
+
+
+@router.post("/heartbeat/{user_id}", response_model=HeartbeatResponse)
+async def heartbeat(user_id: int):
+    """
+    Automatic presence: the app calls this periodically while in use.
+    - Held in memory and written to the database in batches (see app.services.presence)
+    - No heartbeat for PRESENCE_TIMEOUT_SECONDS marks the user offline; the next one brings them back
+    """
+    entry = await run_in_threadpool(presence_registry.heartbeat, user_id)
+    return HeartbeatResponse(
+        active=entry.status_id is not None,
+        attendance_id=entry.attendance_id,
+        is_online=entry.is_online,
+        next_heartbeat_seconds=max(settings.PRESENCE_TIMEOUT_SECONDS / 4, 5),
+    )
+
+
 @router.post("/toggle/{user_id}", response_model=ToggleStatusResponse)
-def toggle_status(
+async def toggle_status(
     user_id: int,
     request: ToggleStatusRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Toggle online/offline status for a user.
@@ -175,6 +231,18 @@ def toggle_status(
     - When going online: offline_reason is ignored
     - Only works if user has active attendance (not checked out)
     """
+    events: list = []
+    response = await db.run_sync(_apply_toggle, user_id, request, events)
+    # Published off the event loop: a slow redis must not stall other requests
+    for event in events:
+        await live_feed.publish_async(*event)
+    return response
+
+
+def _apply_toggle(
+    db: Session, user_id: int, request: ToggleStatusRequest, events: Optional[list] = None
+) -> ToggleStatusResponse:
+    """Toggle and commit; the live feed event is appended to `events` when given, else published."""
     # Check for active attendance
     attendance = _get_today_attendance(db, user_id)
     if not attendance:
@@ -183,8 +251,8 @@ def toggle_status(
             detail="Cannot toggle status. No active attendance found or already checked out."
         )
     
-    # Get or create online status
-    online_status = _get_or_create_online_status(db, user_id, attendance.attendance_id)
+    # Get or create online status, locked until commit (the presence flush and sweeper skip / wait)
+    online_status = _get_or_create_online_status(db, user_id, attendance.attendance_id, lock=True)
     
     # Determine new status (toggle)
     new_is_online = not online_status.is_online
@@ -197,33 +265,18 @@ def toggle_status(
         )
     
     try:
-        # Close current log entry
-        current_log = (
-            db.query(OnlineStatusLog)
-            .filter(
-                OnlineStatusLog.online_status_id == online_status.id,
-                OnlineStatusLog.ended_at.is_(None)
-            )
-            .first()
-        )
-        
+        # Close current log entry (adds it to the running totals)
+        current_log = get_open_log(db, online_status.id)
         if current_log:
-            current_log.ended_at = datetime.utcnow()
-            current_log.duration_minutes = _calculate_duration_minutes(
-                current_log.started_at, 
-                current_log.ended_at
-            )
+            close_status_log(online_status, current_log)
         
         # Create new log entry
-        new_log = OnlineStatusLog(
-            user_id=user_id,
-            attendance_id=attendance.attendance_id,
-            online_status_id=online_status.id,
-            status="online" if new_is_online else "offline",
-            offline_reason=request.offline_reason if not new_is_online else None,
-            started_at=datetime.utcnow()
+        new_log = open_status_log(
+            db,
+            online_status,
+            "online" if new_is_online else "offline",
+            offline_reason=request.offline_reason,
         )
-        db.add(new_log)
         
         # Update online status
         online_status.is_online = new_is_online
@@ -233,10 +286,11 @@ def toggle_status(
         db.refresh(online_status)
         
         # Calculate updated summary
-        summary = _calculate_time_summary(db, online_status.id)
+        summary = status_time_summary(db, online_status)
         
         status_text = "Online" if new_is_online else "Offline"
         logger.info(f"User {user_id} toggled to {status_text}")
+        _publish_status_change(db, user_id, attendance.attendance_id, new_is_online, new_log.offline_reason, events)
         
         return ToggleStatusResponse(
             success=True,
@@ -256,6 +310,30 @@ def toggle_status(
         )
 
 
+def _publish_status_change(
+    db: Session, user_id: int, attendance_id: int, is_online: bool, offline_reason: Optional[str], events: Optional[list] = None
+) -> None:
+    """Push the toggle to /attendance/live subscribers (or queue it on `events` for the caller)."""
+    user = db.query(User.department, User.role).filter(User.user_id == user_id).first()
+    if not user:
+        return
+    event = (
+        "status",
+        user.department,
+        user.role.value if user.role else None,
+        {
+            "user_id": user_id,
+            "attendance_id": attendance_id,
+            "is_online": is_online,
+            "offline_reason": offline_reason,
+        },
+    )
+    if events is None:
+        live_feed.publish(*event)
+    else:
+        events.append(event)
+
+
 @router.get("/summary/{user_id}", response_model=OnlineStatusSummary)
 def get_status_summary(
     user_id: int,
@@ -302,16 +380,11 @@ def get_status_summary(
             logs=[]
         )
     
-    # Get all logs
-    logs = (
-        db.query(OnlineStatusLog)
-        .filter(OnlineStatusLog.online_status_id == online_status.id)
-        .order_by(OnlineStatusLog.started_at)
-        .all()
-    )
+    # Get all logs (archived ones included)
+    logs = load_status_logs(db, online_status.id)
     
     # Calculate summary
-    summary = _calculate_time_summary(db, online_status.id)
+    summary = status_time_summary(db, online_status)
     
     return OnlineStatusSummary(
         user_id=user_id,
@@ -355,12 +428,7 @@ def get_status_logs(
     if not online_status:
         return []
     
-    logs = (
-        db.query(OnlineStatusLog)
-        .filter(OnlineStatusLog.online_status_id == online_status.id)
-        .order_by(OnlineStatusLog.started_at.desc())
-        .all()
-    )
+    logs = load_status_logs(db, online_status.id, newest_first=True)
     
     return [
         {
@@ -385,34 +453,15 @@ def finalize_status_on_checkout(
     Called internally when user checks out.
     Closes any open status logs and calculates final work hours.
     """
-    online_status = (
-        db.query(OnlineStatus)
-        .filter(
-            OnlineStatus.user_id == user_id,
-            OnlineStatus.attendance_id == attendance_id
-        )
-        .first()
-    )
+    online_status = lock_online_status(db, user_id, attendance_id)
     
     if not online_status:
         return {"message": "No online status to finalize", "effective_work_hours": 0}
     
     # Close any open log
-    open_log = (
-        db.query(OnlineStatusLog)
-        .filter(
-            OnlineStatusLog.online_status_id == online_status.id,
-            OnlineStatusLog.ended_at.is_(None)
-        )
-        .first()
-    )
-    
+    open_log = get_open_log(db, online_status.id)
     if open_log:
-        open_log.ended_at = datetime.utcnow()
-        open_log.duration_minutes = _calculate_duration_minutes(
-            open_log.started_at,
-            open_log.ended_at
-        )
+        close_status_log(online_status, open_log)
     
     # Set status to offline (checked out)
     online_status.is_online = False
@@ -421,7 +470,7 @@ def finalize_status_on_checkout(
     db.commit()
     
     # Calculate final summary
-    summary = _calculate_time_summary(db, online_status.id)
+    summary = status_time_summary(db, online_status)
     
     return {
         "message": "Status finalized on checkout",
@@ -4,6 +4,7 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
+from app.core.dashboard_cache import invalidate_dashboards
 from app.db.database import get_db
 from app.crud.task_crud import (
     create_task,
@@ -107,6 +108,7 @@ def update_status(task_id: int, status: TaskStatus, db: Session = Depends(get_db
     task = update_task_status(db, task_id, status, user.user_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+    invalidate_dashboards(task.assigned_to_user.department if task.assigned_to_user else None)
     return task
 
 
@@ -16,8 +16,9 @@ from app.crud.user_crud import (
     export_users_pdf,
     export_users_csv,
 )
-from app.db.database import get_db
-from app.dependencies import require_roles, get_current_user
+from app.core.dashboard_cache import invalidate_dashboards
+from app.db.database import get_db, get_read_db
+from app.dependencies import require_roles, get_current_user, get_current_user_async
 from app.enums import RoleEnum
 from app.db.models.user import User
 import os
@@ -370,11 +371,12 @@ def update_employee_status(
     employee = update_user_status(db, user_id, status_data.is_active)
     if not employee:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Employee not found")
+    invalidate_dashboards(employee.department)
     return _sanitize_users_response(employee)
 
 @router.get("/export/pdf", summary="Download all user details as PDF")
 def download_users_pdf(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     # _: RoleEnum = Depends(require_roles([RoleEnum.ADMIN, RoleEnum.HR])) # Example for role-based access
 ):
     try:
@@ -395,7 +397,7 @@ def download_users_pdf(
 
 @router.get("/export/csv", summary="Download all user details as CSV")
 def download_users_csv(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     # _: RoleEnum = Depends(require_roles([RoleEnum.ADMIN, RoleEnum.HR])) # Example for role-based access
 ):
     csv_buffer = export_users_csv(db)
@@ -695,15 +697,11 @@ def remove_employee(
 
 # ✅ Get current user's own profile (any authenticated user)
 @router.get("/me", response_model=UserOut)
-def get_my_profile(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_my_profile(
+    current_user: User = Depends(get_current_user_async)
 ):
     """Get the profile of the currently logged-in user"""
-    employee = get_user(db, current_user.user_id)
-    if not employee:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Employee not found")
-    return _sanitize_users_response(employee)
+    return _sanitize_users_response(current_user)
 
 # ✅ Admin & HR: Get single employee by ID
 @router.get("/{user_id}", response_model=UserOut)
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+
+class SessionOut(BaseModel):
+    """An active login session (one per device) backed by a refresh token."""
+    session_id: str
+    device_name: Optional[str] = None
+    user_agent: Optional[str] = None
+    ip_address: Optional[str] = None
+    session_started_at: datetime
+    last_refreshed_at: datetime
+    expires_at: datetime
+    is_current: bool = False
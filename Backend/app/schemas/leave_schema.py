@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date, datetime
-from typing import Optional
+from typing import Literal, Optional
 
 class LeaveBase(BaseModel):
     start_date: date
@@ -21,6 +21,45 @@ class LeaveOut(LeaveBase):
     model_config = {"from_attributes": True}
 
 
+class TeamCoverageDay(BaseModel):
+    date: date
+    on_leave: int  # approved leave
+    pending: int  # pending requests
+    available: int  # headcount - on_leave
+
+
+class LeaveApplyOut(LeaveOut):
+    headcount: Optional[int] = None  # active members of the requester's department
+    coverage: list[TeamCoverageDay] = []  # that department over the requested days (at most LEAVE_CALENDAR_MAX_DAYS)
+
+
+class LeaveOverlapCheck(BaseModel):
+    overlaps: list[LeaveOut]  # own pending / approved leaves sharing a day with the range
+    headcount: Optional[int] = None
+    coverage: list[TeamCoverageDay] = []
+
+
+class LeaveCalendarEntry(BaseModel):
+    leave_id: int
+    user_id: int
+    name: str
+    employee_id: Optional[str] = None
+    leave_type: str
+    status: Optional[str] = None
+    start_date: date
+    end_date: date
+    days: int
+
+
+class LeaveCalendarResponse(BaseModel):
+    department: str
+    start_date: date
+    end_date: date
+    headcount: int
+    leaves: list[LeaveCalendarEntry]
+    coverage: list[TeamCoverageDay]
+
+
 class LeaveWithUserOut(LeaveOut):
     employee_id: str
     name: str
@@ -51,9 +90,51 @@ class LeaveBalanceItem(BaseModel):
 
 
 class LeaveBalanceResponse(BaseModel):
+    year: Optional[int] = None
     balances: list[LeaveBalanceItem]
 
 
+class LeaveLedgerEntryOut(BaseModel):
+    id: int
+    user_id: int
+    year: int
+    leave_type: str
+    entry_type: str
+    days: int
+    leave_id: Optional[int] = None
+    actor_id: Optional[int] = None
+    note: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class LeaveBalanceAdjustment(BaseModel):
+    user_id: int
+    year: int
+    leave_type: str = "annual"
+    days: int
+    note: Optional[str] = None
+
+
+class LeaveBulkDecision(BaseModel):
+    leave_ids: list[int] = Field(..., min_length=1, max_length=500)
+    decision: Literal["approve", "reject"]
+    comments: Optional[str] = Field(None, description="Approval comments, or the rejection reason (required to reject)")
+
+
+class LeaveBulkDecisionItem(BaseModel):
+    leave_id: int
+    result: str  # approved, rejected, not_found, forbidden, not_pending
+
+
+class LeaveBulkDecisionResponse(BaseModel):
+    decision: str
+    updated: int
+    results: list[LeaveBulkDecisionItem]
+
+
 class LeaveNotificationOut(BaseModel):
     notification_id: int
     user_id: int
@@ -96,3 +96,38 @@ class ToggleStatusResponse(BaseModel):
     total_online_minutes: float
     total_offline_minutes: float
     effective_work_hours: float
+
+
+class HeartbeatResponse(BaseModel):
+    """Response schema for presence heartbeat"""
+    active: bool = Field(..., description="False when the user has no active attendance")
+    attendance_id: Optional[int] = None
+    is_online: bool = Field(False, description="As of the last presence flush")
+    next_heartbeat_seconds: float
+
+
+class TeamPresenceMember(BaseModel):
+    """One row of the team presence board"""
+    user_id: int
+    name: str
+    role: Optional[str] = None
+    designation: Optional[str] = None
+    attendance_state: str = Field(..., description="checked_in, checked_out or absent (today, India time)")
+    attendance_id: Optional[int] = None
+    check_in: Optional[datetime] = None
+    check_out: Optional[datetime] = None
+    is_online: bool = False
+    offline_reason: Optional[str] = None
+    session_started_at: Optional[datetime] = Field(None, description="Start of the current online/offline period")
+    online_minutes_today: float = 0.0
+
+
+class TeamPresenceBoard(BaseModel):
+    """Presence of every active member of a department"""
+    department: str
+    generated_at: datetime
+    online_count: int
+    offline_count: int
+    checked_out_count: int
+    absent_count: int
+    members: List[TeamPresenceMember] = []
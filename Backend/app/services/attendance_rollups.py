@@ -0,0 +1,258 @@
+"""
+Attendance trend rollups.
+
+Per-day, per-department attendance totals are stored in `attendance_daily_rollups`
+so trend charts read a few thousand small rows instead of scanning attendance:
+
+- days older than ATTENDANCE_ROLLUP_SETTLE_DAYS are rolled up once (lazily, the first
+  time a trend query covers them, or with the backfill below) and then read as-is
+- the most recent days (check-outs still arriving) are always aggregated from raw rows
+
+Days are UTC dates, like the dashboards' day bounds. Lateness is classified with
+the office timing in effect when the day was rolled up, so later changes to office
+hours don't rewrite history; call invalidate_rollups() after correcting past
+attendance.
+
+Run `python -m app.services.attendance_rollups [days]` to backfill the last `days`
+days (default 400), e.g. after deploying or from a nightly cron.
+"""
+import logging
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import ReadSessionLocal, SessionLocal
+from app.db.models.attendance import Attendance
+from app.db.models.attendance_rollup import AttendanceDailyRollup, AttendanceRollupDay
+from app.db.models.user import User
+from app.utils.office_timing import is_late_check_in
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ("day", "week", "month")
+
+# (day, department) -> [present, late, checked_out, total_hours]
+DailyTotals = Dict[Tuple[date, str], List[float]]
+
+
+def _as_date(value) -> date:
+    # SQLite returns DATE() as a string
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _department_key(value: Optional[str]) -> str:
+    return (value or "").strip()
+
+
+def _department_filter(column, departments: Optional[List[str]]):
+    return func.coalesce(func.trim(column), "").in_([_department_key(d) for d in departments])
+
+
+def aggregate_raw(db: Session, start: date, end: date, departments: Optional[List[str]] = None) -> DailyTotals:
+    """Totals for [start, end] computed from attendance rows, in one grouped query."""
+    day = func.date(Attendance.check_in)
+    department = func.coalesce(func.trim(User.department), "")
+    checked_out = Attendance.check_out.isnot(None)
+    query = (
+        db.query(
+            day,
+            department,
+            func.count(Attendance.attendance_id),
+            func.sum(case((is_late_check_in(Attendance.check_in, User.department), 1), else_=0)),
+            func.sum(case((checked_out, 1), else_=0)),
+            func.sum(case((checked_out, func.coalesce(Attendance.total_hours, 0.0)), else_=0.0)),
+        )
+        .join(User, User.user_id == Attendance.user_id)
+        .filter(
+            Attendance.check_in >= datetime.combine(start, datetime.min.time()),
+            Attendance.check_in < datetime.combine(end + timedelta(days=1), datetime.min.time()),
+        )
+    )
+    if departments:
+        query = query.filter(_department_filter(User.department, departments))
+
+    totals: DailyTotals = {}
+    for row_day, row_department, present, late, checked_out_count, hours in query.group_by(day, department).all():
+        totals[(_as_date(row_day), row_department)] = [present or 0, late or 0, checked_out_count or 0, float(hours or 0.0)]
+    return totals
+
+
+def _covered_days(db: Session, start: date, end: date) -> set:
+    return {
+        _as_date(day)
+        for (day,) in db.query(AttendanceRollupDay.day)
+        .filter(AttendanceRollupDay.day >= start, AttendanceRollupDay.day <= end)
+        .all()
+    }
+
+
+def _save_rollups(days: Iterable[date], totals: DailyTotals) -> None:
+    """Store rollup rows and mark the days covered, on the primary in one transaction."""
+    days = set(days)
+    db = SessionLocal()
+    try:
+        for (day, department), (present, late, checked_out_count, hours) in totals.items():
+            db.add(AttendanceDailyRollup(
+                day=day,
+                department=department,
+                present_count=present,
+                late_count=late,
+                checked_out_count=checked_out_count,
+                total_hours=hours,
+            ))
+        db.add_all(AttendanceRollupDay(day=day) for day in days)
+        db.commit()
+    except IntegrityError:
+        # Another worker rolled up (some of) these days first; theirs are equivalent
+        db.rollback()
+        logger.info(f"Attendance rollups for {len(days)} days were stored concurrently; keeping the existing ones")
+    finally:
+        db.close()
+
+
+def roll_up_days(db: Session, start: date, end: date) -> Tuple[List[date], DailyTotals]:
+    """Roll up every uncovered settled day in [start, end]; returns those days and their totals."""
+    end = min(end, settled_before() - timedelta(days=1))
+    if end < start:
+        return [], {}
+    covered = _covered_days(db, start, end)
+    missing = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    missing = [day for day in missing if day not in covered]
+    if not missing:
+        return [], {}
+    totals = aggregate_raw(db, missing[0], missing[-1])
+    wanted = set(missing)
+    totals = {key: values for key, values in totals.items() if key[0] in wanted}
+    _save_rollups(missing, totals)
+    return missing, totals
+
+
+def invalidate_rollups(days: Iterable[date]) -> None:
+    """Forget the rollups of `days` so they are recomputed on the next trend query."""
+    days = sorted(set(days))
+    if not days:
+        return
+    db = SessionLocal()
+    try:
+        db.query(AttendanceDailyRollup).filter(AttendanceDailyRollup.day.in_(days)).delete(synchronize_session=False)
+        db.query(AttendanceRollupDay).filter(AttendanceRollupDay.day.in_(days)).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def settled_before() -> date:
+    """First day that is still aggregated from raw rows on every query."""
+    return datetime.utcnow().date() - timedelta(days=max(settings.ATTENDANCE_ROLLUP_SETTLE_DAYS, 0))
+
+
+def daily_totals(db: Session, start: date, end: date, departments: Optional[List[str]] = None) -> DailyTotals:
+    """Totals for [start, end]: stored rollups for settled days, raw aggregation for the rest."""
+    recent_start = max(start, settled_before())
+    totals: DailyTotals = {}
+    if start < recent_start:
+        # Use what was just rolled up directly: `db` may be a replica that hasn't seen it yet
+        _, added = roll_up_days(db, start, end)
+        query = db.query(
+            AttendanceDailyRollup.day,
+            AttendanceDailyRollup.department,
+            AttendanceDailyRollup.present_count,
+            AttendanceDailyRollup.late_count,
+            AttendanceDailyRollup.checked_out_count,
+            AttendanceDailyRollup.total_hours,
+        ).filter(
+            AttendanceDailyRollup.day >= start,
+            AttendanceDailyRollup.day < recent_start,
+        )
+        if departments:
+            keys = [_department_key(d) for d in departments]
+            query = query.filter(AttendanceDailyRollup.department.in_(keys))
+            added = {key: values for key, values in added.items() if key[1] in keys}
+        for day, department, *values in query.all():
+            totals[(_as_date(day), department)] = list(values)
+        totals.update(added)
+    if recent_start <= end:
+        totals.update(aggregate_raw(db, recent_start, end, departments))
+    return totals
+
+
+def bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())  # ISO weeks start on Monday
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _periods(start: date, end: date, bucket: str) -> List[date]:
+    periods = []
+    day = bucket_start(start, bucket)
+    while day <= end:
+        periods.append(day)
+        if bucket == "month":
+            day = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            day += timedelta(days=7 if bucket == "week" else 1)
+    return periods
+
+
+def _point(period: date, present: int, late: int, checked_out_count: int, hours: float) -> dict:
+    return {
+        "period": period.isoformat(),
+        "presentCount": int(present),
+        "lateArrivals": int(late),
+        "lateRate": round(late / present * 100, 1) if present else 0.0,
+        "averageHours": round(hours / checked_out_count, 2) if checked_out_count else 0.0,
+    }
+
+
+def build_trends(db: Session, start: date, end: date, bucket: str, departments: Optional[List[str]] = None) -> dict:
+    """Bucketed presence, lateness and average-hours series per department plus an overall series."""
+    totals = daily_totals(db, start, end, departments)
+    periods = _periods(start, end, bucket)
+    names = sorted({_department_key(d) for d in departments} if departments else {key[1] for key in totals})
+
+    by_department = {name: defaultdict(lambda: [0, 0, 0, 0.0]) for name in names}
+    overall = defaultdict(lambda: [0, 0, 0, 0.0])
+    for (day, department), values in totals.items():
+        if department not in by_department:
+            continue
+        period = bucket_start(day, bucket)
+        for acc in (by_department[department][period], overall[period]):
+            for i, value in enumerate(values):
+                acc[i] += value
+
+    return {
+        "bucket": bucket,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "departments": [
+            {
+                "department": name or None,
+                "series": [_point(period, *by_department[name][period]) for period in periods],
+            }
+            for name in names
+        ],
+        "overall": [_point(period, *overall[period]) for period in periods],
+    }
+
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    db = ReadSessionLocal()
+    try:
+        today = datetime.utcnow().date()
+        added, _ = roll_up_days(db, today - timedelta(days=days), today)
+        print(f"✅ Rolled up {len(added)} attendance days")
+    finally:
+        db.close()
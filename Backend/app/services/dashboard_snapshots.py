@@ -0,0 +1,301 @@
+"""
+Precomputed dashboard snapshots.
+
+Each dashboard variant (admin, hr, and manager / team-lead per department) is stored
+in `dashboard_snapshots` as its serialized JSON response plus a generated-at time,
+so the endpoints serve it with a single keyed lookup. Snapshots are rebuilt:
+
+- by the in-app scheduler every DASHBOARD_SNAPSHOT_INTERVAL_SECONDS (only the ones
+  older than the interval, so several workers don't repeat each other's work)
+- a few seconds after dashboard-relevant events (invalidate_dashboards); with the
+  scheduler disabled the affected snapshots are expired instead (on a background
+  thread, see SnapshotExpirer), so their next read rebuilds them
+- on read, when missing, from a previous day or older than DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS
+- on demand with ?fresh=true (admins)
+
+Builders are passed in by the caller (see dashboard_routes.DASHBOARD_BUILDERS) and
+take (db, department).
+
+Run `python -m app.services.dashboard_snapshots` to rebuild every snapshot once,
+e.g. from cron when the in-app scheduler is disabled.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.dashboard_cache import add_invalidation_listener, dashboard_cache, remove_invalidation_listener
+from app.core.responses import dumps
+from app.db.database import ReadSessionLocal, SessionLocal
+from app.db.models.dashboard_snapshot import DashboardSnapshot
+from app.db.models.user import User
+from app.enums import RoleEnum
+
+logger = logging.getLogger(__name__)
+
+Builder = Callable[[Session, Optional[str]], dict]
+Variant = Tuple[str, str]  # (variant, department or "" for organisation-wide)
+
+ORG_WIDE_VARIANTS = ("admin", "hr")
+DEPARTMENT_VARIANTS = {"manager": RoleEnum.MANAGER, "team-lead": RoleEnum.TEAM_LEAD}
+
+# generated_at of expired snapshots: never current, and older than any rebuild
+EXPIRED_AT = datetime(1970, 1, 1)
+
+
+def _today_start() -> datetime:
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def is_current(snapshot: DashboardSnapshot, now: Optional[datetime] = None) -> bool:
+    """Generated today (UTC, like the dashboards' day bounds) and within the max age."""
+    now = now or datetime.utcnow()
+    if snapshot.generated_at < now.replace(hour=0, minute=0, second=0, microsecond=0):
+        return False
+    return now - snapshot.generated_at <= timedelta(seconds=settings.DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS)
+
+
+def load_snapshot(db: Session, variant: str, department: str = "") -> Optional[DashboardSnapshot]:
+    return (
+        db.query(DashboardSnapshot)
+        .filter(DashboardSnapshot.variant == variant, DashboardSnapshot.department == department)
+        .first()
+    )
+
+
+def save_snapshot(variant: str, department: str, payload: str, generated_at: datetime) -> None:
+    """Upsert on the primary (the caller's session may be a read replica)."""
+    db = SessionLocal()
+    try:
+        snapshot = load_snapshot(db, variant, department)
+        if snapshot is None:
+            db.add(DashboardSnapshot(variant=variant, department=department, payload=payload, generated_at=generated_at))
+            try:
+                db.commit()
+                return
+            except IntegrityError:
+                # Another worker inserted it first; overwrite theirs below
+                db.rollback()
+                snapshot = load_snapshot(db, variant, department)
+        if snapshot.generated_at <= generated_at:
+            snapshot.payload = payload
+            snapshot.generated_at = generated_at
+            db.commit()
+    finally:
+        db.close()
+
+
+def build_snapshot(db: Session, builders: Dict[str, Builder], variant: str, department: str = "") -> str:
+    """Recompute one variant, store it and return the serialized JSON."""
+    generated_at = datetime.utcnow()
+    payload = builders[variant](db, department or None)
+    payload["generatedAt"] = generated_at.isoformat()
+    body = dumps(payload).decode("utf-8")
+    save_snapshot(variant, department, body, generated_at)
+    return body
+
+
+def serve_snapshot(db: Session, builders: Dict[str, Builder], variant: str, department: str = "", fresh: bool = False) -> str:
+    if not fresh:
+        snapshot = load_snapshot(db, variant, department)
+        if snapshot is not None and is_current(snapshot):
+            return snapshot.payload
+    return build_snapshot(db, builders, variant, department)
+
+
+def expire_snapshots(department: Optional[str] = None) -> None:
+    """Make the variants affected by a change in `department` (None = all) rebuild on their next read."""
+    db = SessionLocal()
+    try:
+        query = db.query(DashboardSnapshot)
+        if department is not None:
+            query = query.filter(DashboardSnapshot.department.in_(["", department]))
+        query.update({DashboardSnapshot.generated_at: EXPIRED_AT}, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to expire dashboard snapshots for '{department}': {str(e)}")
+    finally:
+        db.close()
+
+
+class SnapshotExpirer:
+    """
+    Invalidation listener running expire_snapshots on its own thread: invalidations come
+    from async check-in / check-out routes, whose event loop must not wait for the UPDATE.
+    Departments invalidated while an expiry is queued are expired together.
+    """
+
+    def __init__(self):
+        self._pending: Set[Optional[str]] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-expiry")
+
+    def __call__(self, department: Optional[str] = None) -> None:
+        with self._lock:
+            queued = bool(self._pending)
+            self._pending.add(department)
+        if not queued:
+            self._executor.submit(self._expire_pending)
+
+    def flush(self) -> None:
+        """Wait for the queued expiries (one worker thread: anything submitted before has run)."""
+        self._executor.submit(lambda: None).result()
+
+    def _expire_pending(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        for department in [None] if None in pending else sorted(pending):
+            expire_snapshots(department)
+
+
+snapshot_expirer = SnapshotExpirer()
+
+
+def snapshot_variants(db: Session) -> List[Variant]:
+    """Every variant worth precomputing: org-wide ones plus departments that have a manager / team lead."""
+    variants: List[Variant] = [(variant, "") for variant in ORG_WIDE_VARIANTS]
+    rows = (
+        db.query(User.role, User.department)
+        .filter(User.department.isnot(None), User.department != "", User.role.in_(list(DEPARTMENT_VARIANTS.values())))
+        .distinct()
+        .all()
+    )
+    for variant, role in DEPARTMENT_VARIANTS.items():
+        variants.extend(sorted((variant, department) for row_role, department in rows if row_role == role))
+    return variants
+
+
+def refresh_snapshots(
+    builders: Dict[str, Builder],
+    departments: Optional[Iterable[Optional[str]]] = None,
+    older_than: Optional[timedelta] = None,
+) -> int:
+    """
+    Rebuild snapshots and return how many were rebuilt.
+    - departments: only variants affected by changes in these departments (None in the set = all)
+    - older_than: skip snapshots generated more recently than this (another worker just did them)
+    """
+    db = ReadSessionLocal()
+    try:
+        variants = snapshot_variants(db)
+        if departments is not None:
+            touched = set(departments)
+            if None not in touched:
+                variants = [v for v in variants if v[1] == "" or v[1] in touched]
+        if older_than is not None:
+            cutoff = datetime.utcnow() - older_than
+            recent = {
+                (variant, department)
+                for variant, department in db.query(DashboardSnapshot.variant, DashboardSnapshot.department)
+                .filter(DashboardSnapshot.generated_at > cutoff, DashboardSnapshot.generated_at >= _today_start())
+                .all()
+            }
+            variants = [v for v in variants if v not in recent]
+
+        rebuilt = 0
+        for variant, department in variants:
+            try:
+                build_snapshot(db, builders, variant, department)
+                rebuilt += 1
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to rebuild {variant} dashboard snapshot for '{department}': {str(e)}")
+        return rebuilt
+    finally:
+        db.close()
+
+
+class DashboardSnapshotScheduler:
+    """Background thread rebuilding snapshots on a fixed cadence and shortly after events."""
+
+    def __init__(self, interval_seconds: float, debounce_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.debounce_seconds = debounce_seconds
+        self._builders: Dict[str, Builder] = {}
+        self._dirty: Set[Optional[str]] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, builders: Dict[str, Builder]) -> None:
+        if self.interval_seconds <= 0:
+            # Nothing rebuilds them in the background: events expire the snapshots instead
+            add_invalidation_listener(snapshot_expirer)
+            return
+        if self.running:
+            return
+        self._builders = builders
+        self._stopping.clear()
+        add_invalidation_listener(self.mark_stale)
+        self._thread = threading.Thread(target=self._run, name="dashboard-snapshots", daemon=True)
+        self._thread.start()
+        logger.info(f"📸 Dashboard snapshot scheduler started (every {self.interval_seconds:g}s)")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        remove_invalidation_listener(snapshot_expirer)
+        remove_invalidation_listener(self.mark_stale)
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def mark_stale(self, department: Optional[str] = None) -> None:
+        """Queue the variants affected by a change in `department` (None = all) for a rebuild."""
+        with self._lock:
+            self._dirty.add(department)
+        self._wake.set()
+
+    def _take_dirty(self) -> Set[Optional[str]]:
+        self._wake.clear()  # before taking the set, so an event arriving now wakes the next loop
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def _run(self) -> None:
+        interval = timedelta(seconds=self.interval_seconds)
+        self._refresh(older_than=interval)
+        while not self._stopping.is_set():
+            woken = self._wake.wait(self.interval_seconds)
+            if self._stopping.is_set():
+                break
+            if woken:
+                # Let a burst of events (the morning check-in rush) collapse into one rebuild
+                self._stopping.wait(self.debounce_seconds)
+                self._refresh(departments=self._take_dirty())
+            else:
+                self._refresh(older_than=interval)
+
+    def _refresh(self, departments=None, older_than=None) -> None:
+        try:
+            rebuilt = refresh_snapshots(self._builders, departments=departments, older_than=older_than)
+            if rebuilt:
+                # Drop this worker's cached copies of the old snapshots
+                for department in (departments if departments is not None else [None]):
+                    dashboard_cache.invalidate(department)
+        except Exception as e:
+            logger.error(f"Dashboard snapshot refresh failed: {str(e)}")
+
+
+snapshot_scheduler = DashboardSnapshotScheduler(
+    settings.DASHBOARD_SNAPSHOT_INTERVAL_SECONDS,
+    settings.DASHBOARD_SNAPSHOT_DEBOUNCE_SECONDS,
+)
+
+
+if __name__ == "__main__":
+    from app.routes.dashboard_routes import DASHBOARD_BUILDERS
+
+    count = refresh_snapshots(DASHBOARD_BUILDERS)
+    print(f"✅ Rebuilt {count} dashboard snapshots")
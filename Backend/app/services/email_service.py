@@ -2,6 +2,7 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from app.core.config import settings
+from app.core.metrics import external_call_duration
 import logging
 
 logger = logging.getLogger(__name__)
@@ -80,7 +81,7 @@ def send_otp_email(email: str, otp: int, environment_info: dict = None):
         msg.attach(MIMEText(body, 'html'))
         
         # Send email
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
+        with external_call_duration.time("smtp", "ok"), smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
             server.starttls()
             server.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
             server.send_message(msg)
@@ -0,0 +1,336 @@
+"""
+Automatic presence from app heartbeats (POST /online-status/heartbeat/{user_id}).
+
+Heartbeats only touch this worker's in-memory registry. A background thread flushes
+it every PRESENCE_FLUSH_SECONDS in a handful of batched statements:
+
+- last_seen_at of every user heard from since the previous flush (one executemany,
+  never moving it backwards, so several workers can write it)
+- users who were automatically marked offline and are heartbeating again go back
+  online, from their first heartbeat after the gap
+- users whose last_seen_at is older than PRESENCE_TIMEOUT_SECONDS go offline from
+  their last heartbeat, with reason PRESENCE_OFFLINE_REASON
+
+The timeout sweep reads last_seen_at from the database rather than the registry, so
+users are still timed out after a worker restart or when their heartbeats landed on
+another worker. Transitions lock the rows they switch (skipping rows another worker's
+flush holds), so concurrent flushes never write the same log twice. A manual "offline"
+toggle is left alone: heartbeats only bring back users that the sweep took offline.
+Users who never sent a heartbeat (last_seen_at NULL) keep the manual toggle behaviour.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.live_feed import live_feed
+from app.crud.online_status_crud import duration_minutes
+from app.db.database import SessionLocal
+from app.db.models.attendance import Attendance
+from app.db.models.online_status import OnlineStatus, OnlineStatusLog
+from app.db.models.user import User
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_OFFLINE_REASON = "No heartbeat (app inactive)"
+
+# How long a heartbeat's resolved attendance / online status is trusted before re-reading it
+RESOLVE_TTL = timedelta(minutes=10)
+
+_status_table = OnlineStatus.__table__
+_log_table = OnlineStatusLog.__table__
+
+
+@dataclass
+class PresenceEntry:
+    user_id: int
+    status_id: Optional[int]  # None: no active attendance (cached miss)
+    attendance_id: Optional[int]
+    resolved_at: datetime
+    is_online: bool = True
+    last_seen: Optional[datetime] = None
+    flushed_seen: Optional[datetime] = None
+    active_since: Optional[datetime] = None  # first heartbeat after a gap
+
+
+def switch_presence(db: Session, transitions: List[Tuple[int, bool, datetime]]) -> List[int]:
+    """
+    Apply (status_id, go_online, at) transitions: close the open log at `at` (adding it to
+    the running totals) and open a new one. The caller selects the rows FOR UPDATE so the
+    transitions still hold; returns the switched status ids, caller commits.
+    """
+    if not transitions:
+        return []
+    now = datetime.utcnow()
+    ids = [status_id for status_id, _, _ in transitions]
+    open_logs: Dict[int, List] = {}
+    for log in (
+        db.query(OnlineStatusLog.id, OnlineStatusLog.online_status_id, OnlineStatusLog.status, OnlineStatusLog.started_at)
+        .filter(OnlineStatusLog.online_status_id.in_(ids), OnlineStatusLog.ended_at.is_(None))
+    ):
+        open_logs.setdefault(log.online_status_id, []).append(log)
+    owners = {
+        row.id: row
+        for row in db.query(OnlineStatus.id, OnlineStatus.user_id, OnlineStatus.attendance_id).filter(OnlineStatus.id.in_(ids))
+    }
+
+    switched, closed, opened = [], [], []
+    for status_id, go_online, at in transitions:
+        added = {"online": 0.0, "offline": 0.0}
+        for log in open_logs.get(status_id, []):
+            at = max(at, log.started_at)
+            minutes = duration_minutes(log.started_at, at)
+            added["online" if log.status == "online" else "offline"] += minutes
+            closed.append({"log_id": log.id, "ended": at, "duration": minutes})
+        switched.append({
+            "status_id": status_id,
+            "online": go_online,
+            "was_online": not go_online,
+            "now": now,
+            "add_online": added["online"],
+            "add_offline": added["offline"],
+            "add_count": 0 if go_online else 1,
+        })
+        owner = owners[status_id]
+        opened.append({
+            "user_id": owner.user_id,
+            "attendance_id": owner.attendance_id,
+            "online_status_id": status_id,
+            "status": "online" if go_online else "offline",
+            "offline_reason": None if go_online else PRESENCE_OFFLINE_REASON,
+            "started_at": at,
+            "duration_minutes": 0.0,
+        })
+
+    c = _status_table.c
+    db.execute(
+        _status_table.update()
+        .where(c.id == bindparam("status_id"), c.is_online == bindparam("was_online"))
+        .values(
+            is_online=bindparam("online"),
+            updated_at=bindparam("now"),
+            total_online_minutes=func.coalesce(c.total_online_minutes, 0.0) + bindparam("add_online"),
+            total_offline_minutes=func.coalesce(c.total_offline_minutes, 0.0) + bindparam("add_offline"),
+            offline_count=func.coalesce(c.offline_count, 0) + bindparam("add_count"),
+        ),
+        switched,
+    )
+    if closed:
+        db.execute(
+            _log_table.update()
+            .where(_log_table.c.id == bindparam("log_id"))
+            .values(ended_at=bindparam("ended"), duration_minutes=bindparam("duration")),
+            closed,
+        )
+    db.execute(_log_table.insert(), opened)
+    return ids
+
+
+class PresenceRegistry:
+    def __init__(self, flush_seconds: float, timeout_seconds: float):
+        self.flush_seconds = flush_seconds
+        self.timeout_seconds = timeout_seconds
+        self._entries: Dict[int, PresenceEntry] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---- heartbeats -------------------------------------------------------
+
+    def _resolve(self, user_id: int, now: datetime) -> PresenceEntry:
+        """Today's active attendance and its online status (one read per user per RESOLVE_TTL)."""
+        # Imported here: the routes module imports this one
+        from app.routes.online_status_routes import _get_or_create_online_status, _get_today_attendance
+
+        db = SessionLocal()
+        try:
+            attendance = _get_today_attendance(db, user_id)
+            if not attendance:
+                return PresenceEntry(user_id, None, None, now, is_online=False)
+            online_status = _get_or_create_online_status(db, user_id, attendance.attendance_id)
+            return PresenceEntry(
+                user_id,
+                online_status.id,
+                attendance.attendance_id,
+                now,
+                is_online=online_status.is_online,
+                last_seen=online_status.last_seen_at,
+                flushed_seen=online_status.last_seen_at,
+            )
+        finally:
+            db.close()
+
+    def heartbeat(self, user_id: int, now: Optional[datetime] = None) -> PresenceEntry:
+        now = now or datetime.utcnow()
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is None or now - entry.resolved_at > RESOLVE_TTL:
+            resolved = self._resolve(user_id, now)
+            if entry is not None and entry.status_id == resolved.status_id:
+                resolved.last_seen = max(filter(None, (entry.last_seen, resolved.last_seen)), default=None)
+                resolved.active_since = entry.active_since
+            entry = resolved
+        if entry.status_id is not None:
+            gap = timedelta(seconds=self.timeout_seconds)
+            if entry.last_seen is None or now - entry.last_seen > gap:
+                entry.active_since = now
+            entry.last_seen = now
+        with self._lock:
+            self._entries[user_id] = entry
+        return entry
+
+    def forget(self, user_id: int) -> None:
+        """Drop the cached attendance (call on check-in / check-out)."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    # ---- write-behind -----------------------------------------------------
+
+    def flush(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        now = now or datetime.utcnow()
+        timeout = timedelta(seconds=self.timeout_seconds)
+        with self._lock:
+            entries = [e for e in self._entries.values() if e.status_id is not None]
+            # Forget users gone quiet; their next heartbeat re-reads the database
+            for entry in list(self._entries.values()):
+                if entry.last_seen is None or now - entry.last_seen > timeout * 2:
+                    if now - entry.resolved_at > timeout:
+                        self._entries.pop(entry.user_id, None)
+
+        # (entry, last_seen) pairs: heartbeats may move last_seen while we write
+        seen = [(e, e.last_seen) for e in entries if e.last_seen and (e.flushed_seen is None or e.last_seen > e.flushed_seen)]
+        stats = {"seen": len(seen), "online": 0, "offline": 0}
+        db = SessionLocal()
+        try:
+            if seen:
+                db.execute(
+                    _status_table.update()
+                    .where(
+                        _status_table.c.id == bindparam("status_id"),
+                        or_(_status_table.c.last_seen_at.is_(None), _status_table.c.last_seen_at < bindparam("seen")),
+                    )
+                    .values(last_seen_at=bindparam("seen")),
+                    [{"status_id": e.status_id, "seen": last_seen} for e, last_seen in seen],
+                )
+
+            transitions: List[Tuple[int, bool, datetime]] = []
+            # Back online: automatically-offline users heard from within the timeout
+            recent = {e.status_id: e for e, last_seen in seen if now - last_seen <= timeout}
+            if recent:
+                rows = (
+                    db.query(OnlineStatus.id)
+                    .join(OnlineStatusLog, OnlineStatusLog.online_status_id == OnlineStatus.id)
+                    .join(Attendance, Attendance.attendance_id == OnlineStatus.attendance_id)
+                    .filter(
+                        OnlineStatus.id.in_(list(recent)),
+                        OnlineStatus.is_online.is_(False),
+                        OnlineStatusLog.ended_at.is_(None),
+                        OnlineStatusLog.offline_reason == PRESENCE_OFFLINE_REASON,
+                        Attendance.check_out.is_(None),
+                    )
+                    .with_for_update(of=OnlineStatus, skip_locked=True)
+                    .all()
+                )
+                transitions += [(status_id, True, recent[status_id].active_since or now) for (status_id,) in rows]
+
+            # Timed out: online, heartbeat-driven, and silent for longer than the timeout
+            stale = (
+                db.query(OnlineStatus.id, OnlineStatus.last_seen_at)
+                .join(Attendance, Attendance.attendance_id == OnlineStatus.attendance_id)
+                .filter(
+                    OnlineStatus.is_online.is_(True),
+                    OnlineStatus.last_seen_at.isnot(None),
+                    OnlineStatus.last_seen_at < now - timeout,
+                    Attendance.check_out.is_(None),
+                )
+                .with_for_update(of=OnlineStatus, skip_locked=True)  # rows another worker's flush is switching are skipped
+                .all()
+            )
+            transitions += [(status_id, False, last_seen) for status_id, last_seen in stale]
+
+            switched = set(switch_presence(db, transitions))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        for entry, last_seen in seen:
+            entry.flushed_seen = last_seen
+        changes = [(status_id, go_online) for status_id, go_online, _ in transitions if status_id in switched]
+        with self._lock:
+            by_status = {e.status_id: e for e in self._entries.values() if e.status_id is not None}
+        for status_id, go_online in changes:
+            stats["online" if go_online else "offline"] += 1
+            if status_id in by_status:
+                by_status[status_id].is_online = go_online
+        if changes:
+            self._publish(changes)
+        return stats
+
+    def _publish(self, changes: List[Tuple[int, bool]]) -> None:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(OnlineStatus.id, OnlineStatus.user_id, OnlineStatus.attendance_id, User.department, User.role)
+                .join(User, User.user_id == OnlineStatus.user_id)
+                .filter(OnlineStatus.id.in_([status_id for status_id, _ in changes]))
+                .all()
+            )
+        finally:
+            db.close()
+        online = dict(changes)
+        for row in rows:
+            live_feed.publish(
+                "status",
+                row.department,
+                row.role.value if row.role else None,
+                {
+                    "user_id": row.user_id,
+                    "attendance_id": row.attendance_id,
+                    "is_online": online[row.id],
+                    "offline_reason": None if online[row.id] else PRESENCE_OFFLINE_REASON,
+                },
+            )
+
+    # ---- background thread ------------------------------------------------
+
+    def start(self) -> None:
+        if self.flush_seconds <= 0 or self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="presence-flush", daemon=True)
+        self._thread.start()
+        logger.info(f"💓 Presence write-behind started (flush every {self.flush_seconds:g}s)")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._safe_flush()  # don't lose the last interval's heartbeats on shutdown
+
+    def _safe_flush(self) -> None:
+        try:
+            stats = self.flush()
+            if stats["online"] or stats["offline"]:
+                logger.info(f"💓 Presence flush: {stats}")
+        except Exception as e:
+            logger.error(f"Presence flush failed: {str(e)}")
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.flush_seconds):
+            self._safe_flush()
+
+
+presence_registry = PresenceRegistry(settings.PRESENCE_FLUSH_SECONDS, settings.PRESENCE_TIMEOUT_SECONDS)
@@ -0,0 +1,305 @@
+"""
+Stale-session sweeper.
+
+People forget to check out, leaving attendances (check_out NULL) and their online
+status logs open for days: they inflate online minutes and every "today" query has
+to step over them. A background thread runs every SESSION_SWEEP_SECONDS and closes
+them in batches of SESSION_SWEEP_BATCH_SIZE, each a fixed handful of statements:
+
+- an open attendance is checked out at its shift end: the office timing end time on
+  the (office-local) check-in day, the next day for overnight timings, or, when no
+  timing applies or the check-in came after the end time, AUTO_CHECKOUT_DEFAULT_SHIFT_HOURS
+  after check-in (never past midnight), so a forgotten check-out isn't credited a
+  whole day. It is swept once AUTO_CHECKOUT_GRACE_MINUTES have passed since then;
+  total_hours is computed like a manual check-out.
+- its open online/offline log is closed at the same time and added to the running
+  totals; open logs of attendances that are already checked out are closed at the
+  check-out.
+
+Rows the sweeper closes get auto_closed_at (attendances and online_status_logs), so
+reports can tell automatic check-outs from real ones. Each automatic check-out is
+published to the live feed like a manual one and recorded in the activity feed. Selected attendances are
+locked (skipping rows a check-out is writing), and updates only apply to rows that
+are still open, so the sweep is safe alongside requests and other workers.
+
+Run `python -m app.services.session_sweeper` to sweep once, e.g. from cron when the
+in-app thread is disabled.
+"""
+import logging
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import bindparam, func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.dashboard_cache import invalidate_dashboards
+from app.core.live_feed import live_feed
+from app.crud.activity_crud import activity_row, record_activities
+from app.crud.attendance_crud import get_live_attendance_rows
+from app.crud.online_status_crud import duration_minutes
+from app.db.database import SessionLocal
+from app.db.models.attendance import Attendance
+from app.db.models.office_timing import OfficeTiming
+from app.db.models.online_status import OnlineStatus, OnlineStatusLog
+from app.db.models.user import User
+from app.routes.attendance_routes import _build_office_timing_cache, _resolve_office_timing
+from app.services.attendance_rollups import invalidate_rollups, settled_before
+from app.services.presence import presence_registry
+from app.utils.office_timing import OFFICE_TZ
+
+UTC_TZ = ZoneInfo("UTC")
+
+logger = logging.getLogger(__name__)
+
+_attendance_table = Attendance.__table__
+_status_table = OnlineStatus.__table__
+_log_table = OnlineStatusLog.__table__
+
+
+def shift_end(check_in: datetime, timing: Optional[OfficeTiming], default_hours: Optional[float] = None) -> datetime:
+    """
+    Naive UTC end of the shift a (naive UTC) check-in belongs to. Without a usable timing:
+    `default_hours` (AUTO_CHECKOUT_DEFAULT_SHIFT_HOURS) after check-in, at most midnight.
+    """
+    if default_hours is None:
+        default_hours = settings.AUTO_CHECKOUT_DEFAULT_SHIFT_HOURS
+    local_check_in = check_in.replace(tzinfo=UTC_TZ).astimezone(OFFICE_TZ)
+    day = local_check_in.date()
+    fallback = datetime.combine(day + timedelta(days=1), time.min, tzinfo=OFFICE_TZ)
+    if default_hours > 0:
+        fallback = min(fallback, local_check_in + timedelta(hours=default_hours))
+    end = fallback
+    if timing:
+        end = datetime.combine(day, timing.end_time, tzinfo=OFFICE_TZ)
+        if timing.end_time <= timing.start_time and local_check_in.time() >= timing.end_time:
+            end += timedelta(days=1)  # overnight shift
+        elif end <= local_check_in:
+            end = fallback  # checked in after the shift ended
+    return end.astimezone(UTC_TZ).replace(tzinfo=None)
+
+
+def close_status_sessions(db: Session, closes: Dict[int, datetime], now: datetime) -> int:
+    """
+    Close the open logs of online statuses {status_id: at} at `at` (never before they
+    started), add them to the running totals and mark the statuses offline. Caller commits.
+    """
+    if not closes:
+        return 0
+    # Wait for toggles / check-outs holding these rows, then read the logs they left open
+    db.query(OnlineStatus.id).filter(OnlineStatus.id.in_(list(closes))).with_for_update().all()
+    added: Dict[int, Dict[str, float]] = {status_id: {"online": 0.0, "offline": 0.0} for status_id in closes}
+    closed = []
+    for log in (
+        db.query(OnlineStatusLog.id, OnlineStatusLog.online_status_id, OnlineStatusLog.status, OnlineStatusLog.started_at)
+        .filter(OnlineStatusLog.online_status_id.in_(list(closes)), OnlineStatusLog.ended_at.is_(None))
+    ):
+        ended = max(closes[log.online_status_id], log.started_at)
+        minutes = duration_minutes(log.started_at, ended)
+        added[log.online_status_id]["online" if log.status == "online" else "offline"] += minutes
+        closed.append({"log_id": log.id, "ended": ended, "duration": minutes, "now": now})
+    if closed:
+        db.execute(
+            _log_table.update()
+            .where(_log_table.c.id == bindparam("log_id"), _log_table.c.ended_at.is_(None))
+            .values(ended_at=bindparam("ended"), duration_minutes=bindparam("duration"), auto_closed_at=bindparam("now")),
+            closed,
+        )
+    c = _status_table.c
+    db.execute(
+        _status_table.update()
+        .where(c.id == bindparam("status_id"))
+        .values(
+            is_online=False,
+            updated_at=bindparam("now"),
+            total_online_minutes=func.coalesce(c.total_online_minutes, 0.0) + bindparam("add_online"),
+            total_offline_minutes=func.coalesce(c.total_offline_minutes, 0.0) + bindparam("add_offline"),
+        ),
+        [
+            {"status_id": status_id, "now": now, "add_online": minutes["online"], "add_offline": minutes["offline"]}
+            for status_id, minutes in added.items()
+        ],
+    )
+    return len(closed)
+
+
+class SessionSweeper:
+    def __init__(self, interval_seconds: float, batch_size: int, grace_minutes: int, default_shift_hours: Optional[float] = None):
+        self.interval_seconds = interval_seconds
+        self.batch_size = max(batch_size, 1)
+        self.grace_minutes = grace_minutes
+        self.default_shift_hours = default_shift_hours  # None = AUTO_CHECKOUT_DEFAULT_SHIFT_HOURS
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def sweep(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Close every stale session; returns how many attendances and logs were closed."""
+        now = now or datetime.utcnow()
+        stats = {"checked_out": 0, "logs_closed": 0}
+        departments: Set[str] = set()
+        days: Set[date] = set()
+
+        after_id = 0
+        while True:
+            checked_out, logs_closed, after_id, done = self._check_out_batch(now, after_id, departments, days)
+            stats["checked_out"] += checked_out
+            stats["logs_closed"] += logs_closed
+            if done:
+                break
+        while True:
+            logs_closed = self._close_orphan_logs_batch(now)
+            stats["logs_closed"] += logs_closed
+            if logs_closed < self.batch_size:
+                break
+
+        # Settled days may already be rolled up without these check-outs
+        invalidate_rollups(day for day in days if day < settled_before())
+        for department in departments:
+            invalidate_dashboards(department)
+        return stats
+
+    def _check_out_batch(
+        self, now: datetime, after_id: int, departments: Set[str], days: Set[date]
+    ) -> Tuple[int, int, int, bool]:
+        """One batch of open attendances by id; returns (checked out, logs closed, last id, done)."""
+        grace = timedelta(minutes=self.grace_minutes)
+        db = SessionLocal()
+        try:
+            candidates = (
+                db.query(Attendance.attendance_id, Attendance.user_id, Attendance.check_in, User.name, User.department)
+                .join(User, User.user_id == Attendance.user_id)
+                .filter(
+                    Attendance.attendance_id > after_id,
+                    Attendance.check_out.is_(None),
+                    Attendance.check_in < now - grace,  # no shift ends before it starts
+                )
+                .order_by(Attendance.attendance_id)
+                .limit(self.batch_size)
+                .with_for_update(of=Attendance, skip_locked=True)  # check-outs in progress are left to finish
+                .all()
+            )
+            if not candidates:
+                return 0, 0, after_id, True
+
+            timings = _build_office_timing_cache(db)
+            due = []
+            for row in candidates:
+                timing = _resolve_office_timing(db, row.department, timings)
+                ended = max(shift_end(row.check_in, timing, self.default_shift_hours), row.check_in)
+                if ended + grace <= now:
+                    due.append((row, ended))
+
+            logs_closed = 0
+            live_rows = []
+            if due:
+                db.execute(
+                    _attendance_table.update()
+                    .where(
+                        _attendance_table.c.attendance_id == bindparam("target_id"),
+                        _attendance_table.c.check_out.is_(None),
+                    )
+                    .values(check_out=bindparam("ended"), total_hours=bindparam("hours"), auto_closed_at=bindparam("now")),
+                    [
+                        {
+                            "target_id": row.attendance_id,
+                            "ended": ended,
+                            "hours": round((ended - row.check_in).total_seconds() / 3600, 2),
+                            "now": now,
+                        }
+                        for row, ended in due
+                    ],
+                )
+                ended_by_attendance = {row.attendance_id: ended for row, ended in due}
+                closes = {
+                    status_id: ended_by_attendance[attendance_id]
+                    for status_id, attendance_id in db.query(OnlineStatus.id, OnlineStatus.attendance_id)
+                    .filter(OnlineStatus.attendance_id.in_(list(ended_by_attendance)))
+                }
+                logs_closed = close_status_sessions(db, closes, now)
+                record_activities(db, [
+                    activity_row(
+                        "attendance", "check_out", row, row.attendance_id, "auto",
+                        "Automatically checked out", occurred_at=ended,
+                    )
+                    for row, ended in due
+                ])
+            db.commit()
+            if due:
+                live_rows = get_live_attendance_rows(db, attendance_ids=[row.attendance_id for row, _ in due])
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        for row, ended in due:
+            presence_registry.forget(row.user_id)
+            departments.add(row.department)
+            days.add(row.check_in.date())
+        for live_row in live_rows:
+            live_feed.publish("check_out", live_row["department"], live_row["role"], live_row)
+        return len(due), logs_closed, candidates[-1].attendance_id, len(candidates) < self.batch_size
+
+    def _close_orphan_logs_batch(self, now: datetime) -> int:
+        """Open logs whose attendance is already checked out are closed at the check-out."""
+        db = SessionLocal()
+        try:
+            closes = dict(
+                db.query(OnlineStatusLog.online_status_id, Attendance.check_out)
+                .join(Attendance, Attendance.attendance_id == OnlineStatusLog.attendance_id)
+                .filter(OnlineStatusLog.ended_at.is_(None), Attendance.check_out.isnot(None))
+                .limit(self.batch_size)
+                .all()
+            )
+            logs_closed = close_status_sessions(db, closes, now)
+            db.commit()
+            return logs_closed
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # ---- background thread ------------------------------------------------
+
+    def start(self) -> None:
+        if self.interval_seconds <= 0 or self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+        self._thread.start()
+        logger.info(f"🧹 Stale-session sweeper started (every {self.interval_seconds:g}s)")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _safe_sweep(self) -> None:
+        try:
+            stats = self.sweep()
+            if stats["checked_out"] or stats["logs_closed"]:
+                logger.info(f"🧹 Stale sessions closed: {stats}")
+        except Exception as e:
+            logger.error(f"Stale-session sweep failed: {str(e)}")
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval_seconds):
+            self._safe_sweep()
+
+
+session_sweeper = SessionSweeper(
+    settings.SESSION_SWEEP_SECONDS, settings.SESSION_SWEEP_BATCH_SIZE, settings.AUTO_CHECKOUT_GRACE_MINUTES
+)
+
+
+if __name__ == "__main__":
+    stats = session_sweeper.sweep()
+    print(f"✅ Checked out {stats['checked_out']} stale attendances, closed {stats['logs_closed']} status logs")
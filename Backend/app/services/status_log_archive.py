@@ -0,0 +1,202 @@
+"""
+Online status log archival.
+
+online_status_logs gains a row per toggle per user per day, but only recent sessions
+are read in detail. For attendances that checked in more than ONLINE_STATUS_ARCHIVE_DAYS
+ago (checked out, no open log) the archival job, in batches of ARCHIVE_BATCH_SIZE
+attendances, each in one transaction:
+
+- writes one `online_status_day_summaries` row per attendance: online/offline minutes,
+  offline count and the minutes / count per offline reason. Logs added to an attendance
+  after it was archived are folded into its existing summary on the next run
+- copies the raw rows to `online_status_log_archive` (INSERT ... SELECT) and deletes
+  them from online_status_logs
+
+The running totals on online_statuses are untouched, and the logs / summary endpoints
+read archived rows through load_status_logs, so archived days look the same to clients.
+The archive table only serves those detail views: it can be dumped and truncated
+independently, the day summaries keep the totals and reasons.
+
+Run `python -m app.services.status_log_archive [days]`, e.g. nightly from cron.
+"""
+import json
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, exists, func, literal, select
+from sqlalchemy.orm import Session, aliased
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models.attendance import Attendance
+from app.db.models.online_status import OnlineStatusDaySummary, OnlineStatusLog, OnlineStatusLogArchive
+
+ARCHIVE_BATCH_SIZE = 500
+
+_log_table = OnlineStatusLog.__table__
+_archive_table = OnlineStatusLogArchive.__table__
+ARCHIVED_COLUMNS = [column.name for column in _log_table.columns]
+
+
+def archivable_attendance_ids(db: Session, cutoff: datetime, limit: int) -> List[int]:
+    """Checked-out attendances from before `cutoff` that still have logs, none of them open."""
+    open_log = aliased(OnlineStatusLog)
+    return [
+        attendance_id
+        for (attendance_id,) in db.query(OnlineStatusLog.attendance_id)
+        .join(Attendance, Attendance.attendance_id == OnlineStatusLog.attendance_id)
+        .filter(
+            Attendance.check_in < cutoff,
+            Attendance.check_out.isnot(None),
+            ~exists().where(and_(open_log.attendance_id == OnlineStatusLog.attendance_id, open_log.ended_at.is_(None))),
+        )
+        .distinct()
+        .order_by(OnlineStatusLog.attendance_id)
+        .limit(limit)
+        .all()
+    ]
+
+
+def build_day_summaries(db: Session, attendance_ids: List[int], now: datetime) -> List[dict]:
+    """One summary row per attendance, from a single grouped query over its logs."""
+    days = dict(
+        db.query(Attendance.attendance_id, Attendance.check_in).filter(Attendance.attendance_id.in_(attendance_ids)).all()
+    )
+    summaries: Dict[int, dict] = {}
+    reasons: Dict[int, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+    for row in (
+        db.query(
+            OnlineStatusLog.attendance_id,
+            OnlineStatusLog.online_status_id,
+            OnlineStatusLog.user_id,
+            OnlineStatusLog.status,
+            OnlineStatusLog.offline_reason,
+            func.count(OnlineStatusLog.id),
+            func.sum(OnlineStatusLog.duration_minutes),
+            func.min(OnlineStatusLog.started_at),
+            func.max(OnlineStatusLog.ended_at),
+        )
+        .filter(OnlineStatusLog.attendance_id.in_(attendance_ids))
+        .group_by(
+            OnlineStatusLog.attendance_id,
+            OnlineStatusLog.online_status_id,
+            OnlineStatusLog.user_id,
+            OnlineStatusLog.status,
+            OnlineStatusLog.offline_reason,
+        )
+    ):
+        attendance_id, status_id, user_id, status, reason, count, minutes, first, last = row
+        summary = summaries.setdefault(attendance_id, {
+            "attendance_id": attendance_id,
+            "online_status_id": status_id,
+            "user_id": user_id,
+            "day": days[attendance_id].date(),
+            "online_minutes": 0.0,
+            "offline_minutes": 0.0,
+            "offline_count": 0,
+            "log_count": 0,
+            "first_started_at": first,
+            "last_ended_at": last,
+            "archived_at": now,
+        })
+        minutes = float(minutes or 0.0)
+        summary["log_count"] += count
+        summary["first_started_at"] = min(summary["first_started_at"], first)
+        summary["last_ended_at"] = max(summary["last_ended_at"], last)
+        if status == "online":
+            summary["online_minutes"] += minutes
+        else:
+            summary["offline_minutes"] += minutes
+            summary["offline_count"] += count
+            totals = reasons[attendance_id][reason or ""]
+            totals[0] += count
+            totals[1] += minutes
+
+    for attendance_id, summary in summaries.items():
+        summary["online_minutes"] = round(summary["online_minutes"], 2)
+        summary["offline_minutes"] = round(summary["offline_minutes"], 2)
+        summary["offline_reasons"] = _reasons_json(reasons[attendance_id])
+    return list(summaries.values())
+
+
+def _reasons_json(reasons: Dict[str, List[float]]) -> str:
+    """{reason: [count, minutes]} as the offline_reasons column, most minutes first."""
+    by_reason = sorted(reasons.items(), key=lambda item: -item[1][1])
+    return json.dumps(
+        [{"reason": reason or None, "count": count, "minutes": round(minutes, 2)} for reason, (count, minutes) in by_reason]
+    )
+
+
+def merge_day_summary(row: OnlineStatusDaySummary, summary: dict) -> None:
+    """Fold a summary of logs written after `row` was archived into it."""
+    reasons: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+    for item in json.loads(row.offline_reasons or "[]") + json.loads(summary["offline_reasons"]):
+        totals = reasons[item["reason"] or ""]
+        totals[0] += item["count"]
+        totals[1] += item["minutes"]
+    row.online_minutes = round((row.online_minutes or 0.0) + summary["online_minutes"], 2)
+    row.offline_minutes = round((row.offline_minutes or 0.0) + summary["offline_minutes"], 2)
+    row.offline_count = (row.offline_count or 0) + summary["offline_count"]
+    row.log_count = (row.log_count or 0) + summary["log_count"]
+    row.offline_reasons = _reasons_json(reasons)
+    row.first_started_at = min(filter(None, (row.first_started_at, summary["first_started_at"])), default=None)
+    row.last_ended_at = max(filter(None, (row.last_ended_at, summary["last_ended_at"])), default=None)
+    row.archived_at = summary["archived_at"]
+
+
+def archive_batch(db: Session, cutoff: datetime, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Compact and move the logs of up to ARCHIVE_BATCH_SIZE attendances; caller commits."""
+    now = now or datetime.utcnow()
+    attendance_ids = archivable_attendance_ids(db, cutoff, ARCHIVE_BATCH_SIZE)
+    if not attendance_ids:
+        return {"attendances": 0, "logs": 0}
+    archived = {
+        row.attendance_id: row
+        for row in db.query(OnlineStatusDaySummary).filter(OnlineStatusDaySummary.attendance_id.in_(attendance_ids))
+    }
+    new_summaries = []
+    for summary in build_day_summaries(db, attendance_ids, now):
+        if summary["attendance_id"] in archived:
+            merge_day_summary(archived[summary["attendance_id"]], summary)
+        else:
+            new_summaries.append(summary)
+    if new_summaries:
+        db.execute(OnlineStatusDaySummary.__table__.insert(), new_summaries)
+    in_batch = _log_table.c.attendance_id.in_(attendance_ids)
+    db.execute(
+        _archive_table.insert().from_select(
+            ARCHIVED_COLUMNS + ["archived_at"],
+            select(*[_log_table.c[name] for name in ARCHIVED_COLUMNS], literal(now)).where(in_batch),
+        )
+    )
+    moved = db.execute(_log_table.delete().where(in_batch)).rowcount
+    return {"attendances": len(attendance_ids), "logs": moved}
+
+
+def archive_logs(days: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Archive everything older than `days` (default ONLINE_STATUS_ARCHIVE_DAYS), batch by batch."""
+    now = now or datetime.utcnow()
+    days = settings.ONLINE_STATUS_ARCHIVE_DAYS if days is None else days
+    cutoff = now - timedelta(days=days)
+    totals = {"attendances": 0, "logs": 0}
+    db = SessionLocal()
+    try:
+        while True:
+            stats = archive_batch(db, cutoff, now)
+            db.commit()
+            totals["attendances"] += stats["attendances"]
+            totals["logs"] += stats["logs"]
+            if stats["attendances"] < ARCHIVE_BATCH_SIZE:
+                return totals
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    stats = archive_logs(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    print(f"✅ Archived {stats['logs']} status logs of {stats['attendances']} attendances")
@@ -4,6 +4,7 @@ from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 import logging
 import time
 from datetime import datetime
+from app.core.metrics import external_call_duration, record_cache_lookup
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +51,8 @@ class LocationService:
     def get_address_from_coords(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
         """Get address details from coordinates using geocoding"""
         try:
-            location = self.geolocator.reverse(f"{lat}, {lon}", exactly_one=True)
+            with external_call_duration.time("geocoder", "ok"):
+                location = self.geolocator.reverse(f"{lat}, {lon}", exactly_one=True)
             if location:
                 return {
                     'address': location.address,
@@ -98,7 +100,9 @@ class LocationService:
         cached = self._cache.get(cache_key)
         now = time.time()
         if cached and (now - cached[0]) < self._cache_ttl_seconds:
+            record_cache_lookup("location", hit=True)
             return cached[1]
+        record_cache_lookup("location", hit=False)
 
         address_info = self.get_address_from_coords(lat, lon)
         
@@ -0,0 +1,62 @@
+"""
+SQL expressions for office-timing-aware attendance classification.
+
+Mirrors the attendance module's `_resolve_office_timing` / `_evaluate_attendance_status`
+so aggregate queries (dashboards) can count late arrivals in the database:
+
+- the effective timing for a department is its most recently updated active
+  OfficeTiming, falling back to the most recent active global one
+- a check-in is late when its local (office timezone) time of day is after the
+  timing's start_time plus check_in_grace_minutes
+- with no office timing configured nobody is late
+"""
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func, or_, select
+
+from app.db.models.office_timing import OfficeTiming
+
+OFFICE_TZ = ZoneInfo("Asia/Kolkata")
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def _seconds_of_day(column):
+    return (
+        func.extract('hour', column) * 3600
+        + func.extract('minute', column) * 60
+        + func.extract('second', column)
+    )
+
+
+def local_seconds_of_day(utc_column):
+    """Office-local time of day (in seconds) of a naive UTC datetime column."""
+    offset = int(datetime.now(OFFICE_TZ).utcoffset().total_seconds())
+    return (_seconds_of_day(utc_column) + offset + SECONDS_PER_DAY) % SECONDS_PER_DAY
+
+
+def _check_in_deadline(*criteria):
+    return (
+        select(_seconds_of_day(OfficeTiming.start_time) + func.coalesce(OfficeTiming.check_in_grace_minutes, 0) * 60)
+        .where(OfficeTiming.is_active.is_(True), *criteria)
+        .order_by(OfficeTiming.updated_at.desc(), OfficeTiming.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def check_in_deadline(department_column):
+    """Latest on-time check-in (seconds of day, grace included) for each row's department; NULL if no timing."""
+    department_deadline = _check_in_deadline(
+        func.trim(OfficeTiming.department) == func.trim(department_column),
+        func.trim(OfficeTiming.department) != "",
+    )
+    global_deadline = _check_in_deadline(
+        or_(OfficeTiming.department.is_(None), func.trim(OfficeTiming.department) == "")
+    )
+    return func.coalesce(department_deadline, global_deadline)
+
+
+def is_late_check_in(check_in_column, department_column):
+    """Boolean SQL expression; NULL (treated as on time) when no office timing applies."""
+    return local_seconds_of_day(check_in_column) > check_in_deadline(department_column)
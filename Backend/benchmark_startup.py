@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: time to import app.main and to serve the first request.
+
+Each run happens in a fresh interpreter so module caches don't hide regressions.
+Also reports whether heavy export/parsing libraries were pulled in at import time.
+
+Usage:
+    python benchmark_startup.py            # 5 runs
+    python benchmark_startup.py --runs 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["reportlab", "pandas", "PyPDF2", "openpyxl"]
+
+CHILD_SCRIPT = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+
+async def first_request():
+    messages = []
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/", "raw_path": b"/",
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 50000), "server": ("localhost", 8000),
+    }
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        messages.append(message)
+    await app.main.app(scope, receive, send)
+    return messages[0]["status"]
+
+status = asyncio.run(first_request())
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "first_request_ms": (t2 - t1) * 1000,
+    "status": status,
+    "heavy_loaded": [m for m in HEAVY if m in sys.modules],
+}))
+"""
+
+
+def run_once() -> dict:
+    code = f"HEAVY = {HEAVY_MODULES!r}\n" + CHILD_SCRIPT
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # The app may print during import; the measurement is the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = [run_once() for _ in range(args.runs)]
+    imports = [s["import_ms"] for s in samples]
+    firsts = [s["first_request_ms"] for s in samples]
+    totals = [i + f for i, f in zip(imports, firsts)]
+    heavy = sorted({m for s in samples for m in s["heavy_loaded"]})
+
+    print("🚀 Cold start benchmark")
+    print("=" * 50)
+    print(f"Runs:                {args.runs}")
+    print(f"Import app.main:     median {statistics.median(imports):8.1f} ms   max {max(imports):8.1f} ms")
+    print(f"First request:       median {statistics.median(firsts):8.1f} ms   max {max(firsts):8.1f} ms")
+    print(f"Total:               median {statistics.median(totals):8.1f} ms   max {max(totals):8.1f} ms")
+    if heavy:
+        print(f"❌ Heavy modules loaded at import: {', '.join(heavy)}")
+        sys.exit(1)
+    print(f"✅ No heavy modules loaded at import ({', '.join(HEAVY_MODULES)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -73,6 +73,25 @@ case $ENVIRONMENT in
             echo "⚠️  Warning: Using default JWT secret"
             echo "Please change JWT_SECRET for production"
         fi
+
+        # Several workers only share rate limits, the live feed and read-your-writes through redis
+        MEMORY_BACKENDS=""
+        [[ "${RATE_LIMIT_ENABLED:-true}" == "true" && "${RATE_LIMIT_BACKEND:-memory}" != "redis" ]] && MEMORY_BACKENDS="$MEMORY_BACKENDS RATE_LIMIT_BACKEND"
+        [[ "${LIVE_FEED_BACKEND:-memory}" != "redis" ]] && MEMORY_BACKENDS="$MEMORY_BACKENDS LIVE_FEED_BACKEND"
+        [[ -n "$READ_DATABASE_URL" && "${READ_YOUR_WRITES_BACKEND:-memory}" != "redis" ]] && MEMORY_BACKENDS="$MEMORY_BACKENDS READ_YOUR_WRITES_BACKEND"
+        if [[ -z "$WEB_CONCURRENCY" ]]; then
+            # Not chosen: 4 workers when their state is shared, otherwise a single one
+            if [[ -n "$MEMORY_BACKENDS" ]]; then
+                WEB_CONCURRENCY=1
+                echo "⚠️  Warning: running 1 worker; set$MEMORY_BACKENDS to redis (and RATE_LIMIT_REDIS_URL) for 4"
+            else
+                WEB_CONCURRENCY=4
+            fi
+        elif (( WEB_CONCURRENCY > 1 )) && [[ -n "$MEMORY_BACKENDS" ]]; then
+            echo "❌ WEB_CONCURRENCY=$WEB_CONCURRENCY needs redis for:$MEMORY_BACKENDS"
+            echo "Set them to redis (and RATE_LIMIT_REDIS_URL), or WEB_CONCURRENCY=1"
+            exit 1
+        fi
         ;;
 esac
 
@@ -84,8 +103,7 @@ pip install -r requirements.txt
 # Database migrations (if needed)
 echo ""
 echo "🗄️  Database setup..."
-# Add migration commands here if needed
-# alembic upgrade head
+python -m app.db.init_db
 
 # Run tests
 if [[ "$ENVIRONMENT" != "production" ]]; then
@@ -116,5 +134,6 @@ if [[ "$ENVIRONMENT" == "development" ]]; then
 elif [[ "$ENVIRONMENT" == "testing" ]]; then
     uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
 else
-    uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers 4
+    export WEB_CONCURRENCY
+    uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers "$WEB_CONCURRENCY"
 fi
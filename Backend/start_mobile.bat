@@ -10,6 +10,7 @@ echo Starting backend with mobile access...
 echo This command makes the backend accessible from your mobile device
 echo.
 cd /d "%~dp0"
+python -m app.db.init_db
 uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
 
 pause
@@ -11,4 +11,5 @@ Write-Host "This command makes the backend accessible from your mobile device" -
 Write-Host ""
 
 Set-Location $PSScriptRoot
+python -m app.db.init_db
 uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
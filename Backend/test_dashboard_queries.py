@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Query-count regression tests for the dashboards.
+
+Runs the dashboard functions against an in-memory SQLite database (see conftest.py)
+and counts the statements they issue, so per-department (N+1) loops can't creep back in.
+
+    python -m pytest -q test_dashboard_queries.py
+"""
+import json
+from datetime import datetime, time, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.dashboard_cache import dashboard_cache, invalidate_dashboards
+from app.crud.activity_crud import list_activity, rebuild_activity_events
+from app.crud.leave_crud import apply_leave, approve_leave
+from app.crud.online_status_crud import open_status_log, team_presence
+from app.crud.task_crud import create_task, update_task_status
+from app.db.models import ActivityEvent, Attendance, Leave, OfficeTiming, OnlineStatus, Task, User
+from app.enums import RoleEnum, TaskStatus
+from app.routes.attendance_routes import _evaluate_attendance_status, _resolve_office_timing
+from app.routes.dashboard_routes import (
+    DASHBOARD_BUILDERS,
+    _build_admin_dashboard,
+    _build_hr_dashboard,
+    _build_manager_dashboard,
+    admin_dashboard,
+)
+from app.services import attendance_rollups, dashboard_snapshots
+from app.utils.office_timing import is_late_check_in
+
+
+def seed(db, departments: int, per_department: int = 3, first: int = 0):
+    """Departments first..first+departments-1; the office timings come with the first call."""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    if first == 0:
+        # Office hours 09:30 IST everywhere, 10:00 + 15 min grace in Dept 000
+        db.add(OfficeTiming(department=None, start_time=time(9, 30), end_time=time(18, 0), check_in_grace_minutes=0))
+        db.add(OfficeTiming(department="Dept 000", start_time=time(10, 0), end_time=time(19, 0), check_in_grace_minutes=15))
+    for d in range(first, first + departments):
+        for i in range(per_department):
+            user = User(
+                name=f"User {d}-{i}",
+                email=f"user{d}-{i}@example.com",
+                employee_id=f"EMP{d:03d}{i}",
+                department=f"Dept {d:03d}",
+                role=RoleEnum.MANAGER if i == 0 else RoleEnum.EMPLOYEE,
+                is_active=True,
+            )
+            db.add(user)
+            db.flush()
+            if i < 2:  # two of three checked in today (09:10 and 09:50 IST)
+                db.add(Attendance(user_id=user.user_id, check_in=today + timedelta(hours=3, minutes=40 + 40 * i)))
+            if i == 0:
+                db.add(Leave(user_id=user.user_id, start_date=today + timedelta(days=2), end_date=today + timedelta(days=3), status="Pending"))
+            if i == 2:
+                db.add(Leave(user_id=user.user_id, start_date=today, end_date=today + timedelta(days=1), status="Approved"))
+            db.add(Task(title="Task", assigned_by=user.user_id, assigned_to=user.user_id,
+                        status=str(TaskStatus.COMPLETED) if i == 0 else str(TaskStatus.PENDING)))
+    db.commit()
+
+
+@pytest.fixture
+def snapshot_sessions(engine, monkeypatch):
+    session_factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(dashboard_snapshots, "SessionLocal", session_factory)
+    monkeypatch.setattr(dashboard_snapshots, "ReadSessionLocal", session_factory)
+    dashboard_cache.clear()
+    yield
+    dashboard_cache.clear()
+
+
+def test_admin_dashboard_query_count_is_independent_of_departments(db, count_queries):
+    counts = []
+    for first, departments in ((0, 2), (2, 38)):
+        seed(db, departments, first=first)
+        db.expunge_all()
+        with count_queries() as statements:
+            _build_admin_dashboard(db)
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+    assert counts[1] <= 3
+
+
+def test_admin_dashboard_aggregates(db):
+    seed(db, departments=4)
+    result = _build_admin_dashboard(db)
+    assert result["totalEmployees"] == 12
+    assert result["presentToday"] == 8
+    assert result["lateArrivals"] == 3  # 09:50 is within Dept 000's grace period
+    assert result["onLeave"] == 4
+    assert result["pendingLeaves"] == 4  # requested by managers
+    assert result["activeTasks"] == 8
+    assert result["completedTasks"] == 4
+    assert result["departments"] == 4
+    assert result["departmentPerformance"][0] == {"name": "Dept 000", "employees": 3, "performance": 66}
+
+
+def add_team_leads(db, members, first: int, count: int):
+    """Leads first..first+count-1 of Ops, lead n assigning tasks to the first 1 + n % 4 members."""
+    for n in range(first, first + count):
+        lead = User(name=f"Lead {n}", email=f"lead{n}@example.com", employee_id=f"LEAD{n}",
+                    department="Ops", role=RoleEnum.TEAM_LEAD, is_active=True)
+        db.add(lead)
+        db.flush()
+        for i, member in enumerate(members[: 1 + n % 4]):
+            for status in (TaskStatus.COMPLETED, TaskStatus.PENDING, TaskStatus.COMPLETED)[: 1 + i % 3]:
+                db.add(Task(title="Task", assigned_by=lead.user_id, assigned_to=member.user_id, status=str(status)))
+    db.commit()
+
+
+def test_manager_dashboard_query_count_is_independent_of_team_leads(db, count_queries):
+    members = [User(name=f"Member {i}", email=f"member{i}@example.com", employee_id=f"MEM{i}",
+                    department="Ops", role=RoleEnum.EMPLOYEE, is_active=True) for i in range(4)]
+    db.add_all(members)
+    counts = []
+    for first, leads in ((0, 2), (2, 18)):
+        add_team_leads(db, members, first, leads)
+        with count_queries() as statements:
+            result = _build_manager_dashboard(db, "Ops")
+        counts.append(len(statements))
+        if first == 0:
+            assert result["teamPerformance"] == [
+                {"team": "Lead 0's Team", "lead": "Lead 0", "members": 1, "completion": 100},
+                {"team": "Lead 1's Team", "lead": "Lead 1", "members": 2, "completion": 66},
+            ]
+    assert counts[0] == counts[1]
+
+
+def test_sql_late_classification_matches_attendance_status(db):
+    seed(db, departments=3)
+    day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    users = db.query(User).all()
+    for n, user in enumerate(users):
+        for minutes in range(150, 330, 7):  # 08:00-11:00 IST
+            db.add(Attendance(user_id=user.user_id, check_in=day - timedelta(days=n + 1) + timedelta(minutes=minutes)))
+    db.commit()
+
+    rows = (
+        db.query(Attendance, User, is_late_check_in(Attendance.check_in, User.department))
+        .join(User, User.user_id == Attendance.user_id)
+        .all()
+    )
+    for attendance, user, late in rows:
+        timing = _resolve_office_timing(db, user.department)
+        expected = _evaluate_attendance_status(attendance.check_in, None, timing)["check_in_status"] == "late"
+        assert bool(late) == expected, (user.department, attendance.check_in)
+
+
+def test_admin_dashboard_serves_snapshot_until_invalidated(db, count_queries, snapshot_sessions):
+    seed(db, departments=2)
+    first = json.loads(admin_dashboard(fresh=False, db=db).body)
+    assert first["totalEmployees"] == 6 and "generatedAt" in first
+
+    # Cached in-process, then one keyed snapshot lookup once the cache is dropped
+    with count_queries() as statements:
+        admin_dashboard(fresh=False, db=db)
+    assert statements == []
+    invalidate_dashboards("Dept 001")  # admin dashboard is organisation-wide
+    with count_queries() as statements:
+        again = json.loads(admin_dashboard(fresh=False, db=db).body)
+    assert len(statements) == 1 and again == first
+
+    # Scheduled/event refresh picks up new data; ?fresh=true recomputes immediately
+    db.add(User(name="New", email="new@example.com", employee_id="NEW1", department="Dept 001", role=RoleEnum.EMPLOYEE))
+    db.commit()
+    assert dashboard_snapshots.refresh_snapshots(DASHBOARD_BUILDERS, departments={"Dept 001"}) >= 2
+    dashboard_cache.clear()
+    assert json.loads(admin_dashboard(fresh=False, db=db).body)["totalEmployees"] == 7
+    fresh = json.loads(admin_dashboard(fresh=True, db=db).body)
+    assert fresh["generatedAt"] > first["generatedAt"]
+
+
+def test_events_expire_snapshots_when_the_scheduler_is_off(db, snapshot_sessions):
+    scheduler = dashboard_snapshots.DashboardSnapshotScheduler(interval_seconds=0, debounce_seconds=0)
+    scheduler.start(DASHBOARD_BUILDERS)
+    try:
+        seed(db, departments=2)
+        manager = db.query(User).filter(User.employee_id == "EMP0000").one()
+        assert json.loads(admin_dashboard(fresh=False, db=db).body)["totalEmployees"] == 6
+        team = dashboard_snapshots.serve_snapshot(db, DASHBOARD_BUILDERS, "manager", manager.department)
+
+        db.add(User(name="New", email="new@example.com", employee_id="NEW1", department="Dept 001", role=RoleEnum.EMPLOYEE))
+        db.commit()
+        invalidate_dashboards("Dept 001")
+        assert not scheduler.running
+        dashboard_snapshots.snapshot_expirer.flush()  # expired on its own thread
+        # Organisation-wide snapshot rebuilt on its next read; other departments' kept
+        assert json.loads(admin_dashboard(fresh=False, db=db).body)["totalEmployees"] == 7
+        assert dashboard_snapshots.serve_snapshot(db, DASHBOARD_BUILDERS, "manager", manager.department) == team
+        invalidate_dashboards()
+        dashboard_snapshots.snapshot_expirer.flush()
+        assert dashboard_snapshots.serve_snapshot(db, DASHBOARD_BUILDERS, "manager", manager.department) != team
+    finally:
+        scheduler.stop()
+
+
+def test_trends_from_rollups_match_raw_rows(db, engine, count_queries, monkeypatch):
+    monkeypatch.setattr(attendance_rollups, "SessionLocal", sessionmaker(bind=engine))
+    seed(db, departments=3)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    for n, user in enumerate(db.query(User).all()):
+        for days_ago in range(1, 70, 1 + n % 3):
+            check_in = today - timedelta(days=days_ago) + timedelta(minutes=200 + 13 * n)
+            db.add(Attendance(user_id=user.user_id, check_in=check_in, check_out=check_in + timedelta(hours=8 + n % 2),
+                              total_hours=8 + n % 2))
+    db.commit()
+    start = (today - timedelta(days=75)).date()
+
+    monkeypatch.setattr(settings, "ATTENDANCE_ROLLUP_SETTLE_DAYS", 10000)  # everything from raw rows
+    raw = attendance_rollups.build_trends(db, start, today.date(), "week")
+    monkeypatch.setattr(settings, "ATTENDANCE_ROLLUP_SETTLE_DAYS", 2)
+    first = attendance_rollups.build_trends(db, start, today.date(), "week")
+    with count_queries() as statements:
+        again = attendance_rollups.build_trends(db, start, today.date(), "week")
+    assert raw == first == again
+    assert len(statements) == 3  # coverage, stored rollups, recent raw days
+    assert sum(point["presentCount"] for point in raw["overall"]) == db.query(Attendance).count()
+
+    only = attendance_rollups.build_trends(db, start, today.date(), "month", ["Dept 001"])
+    assert [d["department"] for d in only["departments"]] == ["Dept 001"]
+    assert only["overall"] == only["departments"][0]["series"]
+
+
+def test_recent_activities_come_from_the_activity_feed(db, count_queries):
+    seed(db, departments=2)
+    ops, sales = db.query(User).filter(User.employee_id.in_(["EMP0000", "EMP0010"])).order_by(User.employee_id).all()
+    leave = apply_leave(db, ops.user_id, datetime.utcnow(), datetime.utcnow(), "Doctor", "sick")
+    approve_leave(db, leave.leave_id, approver_id=sales.user_id)
+    create_task(db, "Quarterly report", "", sales.user_id, sales.user_id, None)
+
+    with count_queries() as statements:
+        hr = _build_hr_dashboard(db)
+    assert [(a["type"], a["status"]) for a in hr["recentActivities"]] == [("leave", "approved"), ("leave", "pending")]
+    assert len(statements) <= 9
+
+    manager = _build_manager_dashboard(db, "Dept 001")
+    assert [(a["type"], a["description"]) for a in manager["teamActivities"]] == [("task", "Quarterly report")]
+
+    first = list_activity(db, limit=2)
+    rest = list_activity(db, before=(first[-1].occurred_at, first[-1].id), limit=2)
+    assert [e.event_type for e in first + rest] == ["task", "leave", "leave"]
+
+
+def test_activity_backfill_rebuilds_the_recent_feed_from_existing_rows(db):
+    seed(db, departments=2)
+    ops, sales = db.query(User).filter(User.employee_id.in_(["EMP0000", "EMP0010"])).order_by(User.employee_id).all()
+    leave = apply_leave(db, ops.user_id, datetime.utcnow(), datetime.utcnow(), "Doctor", "sick")
+    approve_leave(db, leave.leave_id, approver_id=sales.user_id)
+    task = create_task(db, "Quarterly report", "", sales.user_id, ops.user_id, None)
+    update_task_status(db, task.task_id, TaskStatus.COMPLETED, ops.user_id)
+    db.add(Attendance(user_id=ops.user_id, check_in=datetime.utcnow() - timedelta(days=40)))
+    db.commit()
+
+    def feed():
+        return sorted(
+            (e.event_type, e.action, e.subject_id, e.user_id, e.actor_id, e.status, e.scope)
+            for e in db.query(ActivityEvent).all()
+        )
+
+    recorded = feed()
+    db.query(ActivityEvent).delete()
+    db.commit()
+    assert rebuild_activity_events(db, days=30) == 4 + 5 + 1 + 2 + 6
+    rebuilt = feed()
+    assert set(recorded) <= set(rebuilt)
+    check_ins = [(status, scope) for event_type, _, _, _, _, status, scope in rebuilt if event_type == "attendance"]
+    # 09:10 / 09:50 IST; 09:50 is within Dept 000's grace period; the 40 day old one is left out
+    assert sorted(check_ins) == [("late", "Dept 001"), ("on-time", "Dept 000"), ("on-time", "Dept 000"), ("on-time", "Dept 001")]
+
+
+def test_team_presence_is_one_query_for_any_team_size(db, count_queries):
+    seed(db, departments=1, per_department=30)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    for n, attendance in enumerate(db.query(Attendance).order_by(Attendance.attendance_id).all()):
+        online_status = OnlineStatus(user_id=attendance.user_id, attendance_id=attendance.attendance_id,
+                                     is_online=n != 0, total_online_minutes=30.0)
+        db.add(online_status)
+        db.flush()
+        open_status_log(db, online_status, "online" if n else "offline", offline_reason="Lunch")
+    db.commit()
+
+    with count_queries() as statements:
+        members = team_presence(db, " Dept 000 ", today)
+    assert len(statements) == 1
+    states = sorted((m["attendance_state"], m["is_online"]) for m in members)
+    assert states == [("absent", False)] * 28 + [("checked_in", False), ("checked_in", True)]
+    offline = next(m for m in members if m["attendance_state"] == "checked_in" and not m["is_online"])
+    assert offline["offline_reason"] == "Lunch" and offline["online_minutes_today"] == 30.0
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Leave balance, calendar and list tests.
+
+Runs the leave crud and route functions against an in-memory SQLite database (see
+conftest.py), checking both results and the number of statements they issue.
+
+    python -m pytest -q test_leave_queries.py
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func
+
+from app.crud.leave_balance_crud import carry_forward, get_leave_balance, list_ledger, post_ledger_entry
+from app.crud.leave_calendar_crud import department_leave_calendar
+from app.core.config import settings
+from app.crud.leave_crud import apply_leave, approve_leave, decide_leaves, reject_leave
+from app.db.models import Leave, User
+from app.db.models.leave_balance import LeaveLedgerEntry
+from app.enums import RoleEnum
+from app.routes.leave_routes import (
+    approvals_history,
+    approvals_inbox,
+    check_leave_overlap,
+    get_all_leaves,
+    get_department_leaves,
+    leave_calendar,
+    request_leave,
+    update_leave_request,
+)
+from app.schemas.leave_schema import LeaveCreate, LeaveUpdate
+
+TODAY = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def org(db):
+    """
+    add_departments(n): n more departments "Dept 000"... of three users each, EMP<d><i>:
+    a manager with a pending leave (days 2-3), an employee without leave and an
+    employee on approved leave (today and tomorrow).
+    """
+    created = []
+
+    def add_departments(count: int, per_department: int = 3):
+        for d in range(len(created), len(created) + count):
+            for i in range(per_department):
+                user = User(
+                    name=f"User {d}-{i}",
+                    email=f"user{d}-{i}@example.com",
+                    employee_id=f"EMP{d:03d}{i}",
+                    department=f"Dept {d:03d}",
+                    role=RoleEnum.MANAGER if i == 0 else RoleEnum.EMPLOYEE,
+                    is_active=True,
+                )
+                db.add(user)
+                db.flush()
+                if i == 0:
+                    db.add(Leave(user_id=user.user_id, start_date=TODAY + timedelta(days=2), end_date=TODAY + timedelta(days=3), status="Pending"))
+                if i == 2:
+                    db.add(Leave(user_id=user.user_id, start_date=TODAY, end_date=TODAY + timedelta(days=1), status="Approved"))
+            created.append(d)
+        db.commit()
+
+    return add_departments
+
+
+def user_id_of(db, employee_id: str) -> int:
+    return db.query(User.user_id).filter(User.employee_id == employee_id).scalar()
+
+
+def test_leave_balance_is_kept_per_year_by_the_ledger(db, org, count_queries):
+    org(1)
+    user_id = user_id_of(db, "EMP0001")
+    # 3 days, 2 of them next year
+    leave = apply_leave(db, user_id, datetime(2030, 12, 31), datetime(2031, 1, 2), "Trip", "annual")
+    approve_leave(db, leave.leave_id)
+    approve_leave(db, leave.leave_id)  # re-approving debits once
+
+    with count_queries() as statements:
+        balances = get_leave_balance(db, user_id, 2031)
+    assert len(statements) == 1
+    assert balances[0] == {"leave_type": "annual", "allocated": 15, "used": 2, "remaining": 13}
+    assert get_leave_balance(db, user_id, 2030)[0]["used"] == 1
+
+    reject_leave(db, leave.leave_id)
+    assert get_leave_balance(db, user_id, 2031)[0]["used"] == 0
+
+
+def test_leave_calendar_sweeps_coverage_from_one_interval_query(db, org, count_queries):
+    org(2)
+    user_id = user_id_of(db, "EMP0001")
+    # Overlapping approved leaves of one person count once; rejected ones not at all
+    db.add(Leave(user_id=user_id, start_date=TODAY + timedelta(days=1), end_date=TODAY + timedelta(days=3), status="Approved"))
+    db.add(Leave(user_id=user_id, start_date=TODAY + timedelta(days=3), end_date=TODAY + timedelta(days=4), status="Approved"))
+    db.add(Leave(user_id=user_id, start_date=TODAY, end_date=TODAY + timedelta(days=5), status="Rejected"))
+    db.commit()
+
+    with count_queries() as statements:
+        calendar = department_leave_calendar(db, "Dept 000", TODAY.date(), (TODAY + timedelta(days=5)).date())
+    assert len(statements) == 2
+    assert calendar["headcount"] == 3 and len(calendar["leaves"]) == 4
+    assert [(day["on_leave"], day["pending"], day["available"]) for day in calendar["coverage"]] == [
+        (1, 0, 2), (2, 0, 1), (1, 1, 2), (1, 1, 2), (1, 0, 2), (0, 0, 3),
+    ]
+
+
+def test_leave_lists_join_requesters_in_one_query(db, org, count_queries):
+    admin = User(name="Admin", email="admin@example.com", employee_id="ADM", role=RoleEnum.ADMIN, is_active=True)
+    db.add(admin)
+    org(2)
+    db.refresh(admin)
+    manager = db.query(User).filter(User.employee_id == "EMP0000").one()
+    page = {"skip": 0, "limit": None}
+    lists = [
+        lambda: get_all_leaves(db=db, user=admin, **page),
+        lambda: get_department_leaves(db=db, user=manager, **page),
+        lambda: approvals_inbox(db=db, user=admin, **page),
+        lambda: approvals_history(db=db, user=admin, **page),
+    ]
+
+    def run():
+        counts, sizes = [], []
+        for leave_list in lists:
+            with count_queries() as statements:
+                rows = leave_list()
+            counts.append(len(statements))
+            sizes.append(len(rows))
+        return counts, sizes, rows
+
+    small_counts, small_sizes, _ = run()
+    org(6)
+    db.refresh(admin)
+    db.refresh(manager)
+    large_counts, large_sizes, history = run()
+    assert small_counts == large_counts == [1, 1, 1, 1]
+    # all / department / pending inbox / decided history
+    assert small_sizes == [4, 1, 2, 2] and large_sizes == [16, 1, 8, 8]
+    assert history[0]["name"].startswith("User ") and history[0]["days"] == 2
+    assert get_all_leaves(db=db, user=admin, skip=3, limit=2)[0]["leave_id"] == get_all_leaves(db=db, user=admin, **page)[3]["leave_id"]
+
+
+def test_approvals_history_of_other_roles_only_has_their_own_decisions(db, org):
+    org(2)
+    lead = db.query(User).filter(User.employee_id == "EMP0001").one()
+    lead.role = RoleEnum.TEAM_LEAD
+    employee = db.query(User).filter(User.employee_id == "EMP0011").one()
+    pending = db.query(Leave).filter(Leave.user_id == user_id_of(db, "EMP0000")).one()
+    reject_leave(db, pending.leave_id, approver_id=lead.user_id, rejection_reason="Busy week")
+    db.refresh(lead)
+    db.refresh(employee)
+
+    history = approvals_history(skip=0, limit=None, db=db, user=lead)
+    assert [(row["leave_id"], row["rejection_reason"]) for row in history] == [(pending.leave_id, "Busy week")]
+    assert approvals_history(skip=0, limit=None, db=db, user=employee) == []
+
+
+def test_carry_forward_includes_users_without_leave(db, org):
+    org(1)
+    busy, idle = user_id_of(db, "EMP0001"), user_id_of(db, "EMP0002")
+    leave = apply_leave(db, busy, datetime(2030, 3, 1), datetime(2030, 3, 12), "Trip", "annual")
+    approve_leave(db, leave.leave_id)  # 12 of 15 used
+    db.add(User(name="Gone", email="gone@example.com", employee_id="GONE", is_active=False))
+    db.add(User(name="New", email="new@example.com", employee_id="NEW", is_active=True, joining_date=datetime(2031, 2, 1)))
+    db.commit()
+
+    assert carry_forward(db, 2030) == 3  # the three Dept 000 users, not the inactive or the 2031 joiner
+    db.commit()
+    assert carry_forward(db, 2030) == 0
+    assert get_leave_balance(db, busy, 2031)[0]["allocated"] == 15 + 3
+    # No 2030 balance row: the whole default allowance was unused, capped at 5
+    assert get_leave_balance(db, idle, 2031)[0] == {"leave_type": "annual", "allocated": 20, "used": 0, "remaining": 20}
+    assert [(entry.entry_type, entry.days) for entry in list_ledger(db, idle, 2031)] == [("accrual", 15), ("adjustment", 5)]
+
+
+def test_bulk_decision_posts_the_ledger_in_a_fixed_number_of_statements(db, org, count_queries):
+    org(2)
+    manager = db.query(User).filter(User.employee_id == "EMP0000").one()
+
+    def pending_leaves(count, prefix):
+        """`count` Dept 000 employees asking for 3 days in 2031; every other one already has a 2031 balance."""
+        leave_ids = []
+        for i in range(count):
+            user = User(name=f"{prefix} {i}", email=f"{prefix}{i}@example.com", employee_id=f"{prefix}{i}",
+                        department="Dept 000", role=RoleEnum.EMPLOYEE, is_active=True)
+            db.add(user)
+            db.flush()
+            if i % 2:
+                post_ledger_entry(db, user.user_id, 2031, "annual", "adjustment", 1, note="Opening balance")
+            leave = Leave(user_id=user.user_id, start_date=datetime(2031, 3, 3), end_date=datetime(2031, 3, 5), status="Pending")
+            db.add(leave)
+            db.flush()
+            leave_ids.append(leave.leave_id)
+        db.commit()
+        db.refresh(manager)
+        return leave_ids
+
+    counts = []
+    for count, prefix in ((2, "small"), (20, "large")):
+        leave_ids = pending_leaves(count, prefix)
+        with count_queries() as statements:
+            results = decide_leaves(db, leave_ids, manager, approve=True)
+        counts.append(len(statements))
+        assert results == {leave_id: "approved" for leave_id in leave_ids}
+    assert counts[0] == counts[1]
+
+    requesters = db.query(User).filter(User.employee_id.like("large%")).order_by(User.user_id).all()
+    for i, user in enumerate(requesters):
+        allocated = 15 + (1 if i % 2 else 0)
+        assert get_leave_balance(db, user.user_id, 2031)[0] == {
+            "leave_type": "annual", "allocated": allocated, "used": 3, "remaining": allocated - 3,
+        }
+        entries = [(entry.entry_type, entry.days) for entry in list_ledger(db, user.user_id, 2031)]
+        assert entries == ([("accrual", 15), ("adjustment", 1)] if i % 2 else [("accrual", 15)]) + [("debit", 3)]
+    debits = db.query(func.count(LeaveLedgerEntry.id), func.sum(LeaveLedgerEntry.days)).filter(
+        LeaveLedgerEntry.entry_type == "debit"
+    ).one()
+    assert tuple(debits) == (22, 66)
+
+    # Own request, another department, already decided, unknown id; nothing changes
+    own = db.query(Leave.leave_id).filter(Leave.user_id == manager.user_id).scalar()
+    other = db.query(Leave.leave_id).filter(Leave.user_id == user_id_of(db, "EMP0012")).scalar()
+    decided = db.query(Leave.leave_id).filter(Leave.user_id == requesters[0].user_id).scalar()
+    assert decide_leaves(db, [own, other, decided, 99999], manager, approve=False) == {
+        own: "forbidden", other: "forbidden", decided: "not_pending", 99999: "not_found",
+    }
+    assert db.query(Leave.status).filter(Leave.leave_id == decided).scalar() == "Approved"
+    assert db.query(func.count(LeaveLedgerEntry.id)).filter(LeaveLedgerEntry.entry_type == "debit").scalar() == 22
+
+
+def test_long_leave_is_accepted_with_coverage_over_the_calendar_window(db, org):
+    org(1)
+    user = db.query(User).filter(User.employee_id == "EMP0001").one()
+    start = (TODAY + timedelta(days=30)).date()
+    end = start + timedelta(days=settings.LEAVE_CALENDAR_MAX_DAYS + 60)
+
+    with pytest.raises(HTTPException) as error:
+        request_leave(LeaveCreate(employee_id="EMP0001", start_date=end, end_date=start, reason="Sabbatical"), db=db, user=user)
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        leave_calendar(start_date=start, end_date=end, department=None, db=db, user=user)
+    assert error.value.status_code == 400
+
+    check = check_leave_overlap(start_date=start, end_date=end, db=db, user=user)
+    assert check["overlaps"] == [] and len(check["coverage"]) == settings.LEAVE_CALENDAR_MAX_DAYS
+    applied = request_leave(
+        LeaveCreate(employee_id="EMP0001", start_date=start, end_date=end, reason="Sabbatical", leave_type="annual"), db=db, user=user
+    )
+    assert (applied["start_date"], applied["end_date"]) == (start, end) and applied["headcount"] == 3
+    assert len(applied["coverage"]) == settings.LEAVE_CALENDAR_MAX_DAYS
+    assert applied["coverage"][0]["date"] == start and applied["coverage"][0]["pending"] == 1
+
+
+def day(n: int):
+    return (TODAY + timedelta(days=n)).date()
+
+
+def test_overlapping_requests_are_rejected_except_against_the_edited_leave(db, org):
+    org(1)
+    user = db.query(User).filter(User.employee_id == "EMP0000").one()
+    pending = db.query(Leave.leave_id).filter(Leave.user_id == user.user_id).scalar()  # days 2-3
+
+    with pytest.raises(HTTPException) as error:
+        request_leave(LeaveCreate(employee_id="EMP0000", start_date=day(3), end_date=day(5), reason="Trip"), db=db, user=user)
+    assert error.value.status_code == 409 and str(pending) in error.value.detail
+    later = request_leave(
+        LeaveCreate(employee_id="EMP0000", start_date=day(6), end_date=day(7), reason="Trip", leave_type="annual"), db=db, user=user
+    )["leave_id"]
+
+    # Moving a leave over its own days is fine, over another pending one is not
+    moved = update_leave_request(pending, LeaveUpdate(end_date=day(4)), db=db, user=user)
+    assert (moved.start_date.date(), moved.end_date.date()) == (day(2), day(4))
+    with pytest.raises(HTTPException) as error:
+        update_leave_request(later, LeaveUpdate(start_date=day(4)), db=db, user=user)
+    assert error.value.status_code == 409 and error.value.detail.endswith(str(pending))
+    assert db.query(Leave.start_date).filter(Leave.leave_id == later).scalar().date() == day(6)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Live attendance feed (/attendance/live): snapshot, resume, scoping and close codes.
+
+    python -m pytest -q test_live_feed.py
+"""
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.config import settings
+from app.core.live_feed import LiveFeed, MemoryFeedBackend
+from app.core.security import create_access_token
+from app.db.models import Attendance, User
+from app.enums import RoleEnum
+from app.routes import attendance_live_routes
+from app.routes.attendance_live_routes import CLOSE_FORBIDDEN, CLOSE_LAGGING, CLOSE_UNAUTHORIZED
+
+
+@pytest.fixture
+def feed(engine, monkeypatch):
+    session_factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(attendance_live_routes, "SessionLocal", session_factory)
+    monkeypatch.setattr(attendance_live_routes, "ReadSessionLocal", session_factory)
+    live_feed = LiveFeed(MemoryFeedBackend(buffer_size=5))
+    monkeypatch.setattr(attendance_live_routes, "live_feed", live_feed)
+    return live_feed
+
+
+@pytest.fixture
+def client(feed):
+    app = FastAPI()
+    app.include_router(attendance_live_routes.router)
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def people(db):
+    """Checked in today: an Ops and an Eng employee and an admin; HR / manager of Ops; an admin."""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    users = {}
+    for key, role, department, checked_in in (
+        ("ops", RoleEnum.EMPLOYEE, "Ops", True),
+        ("eng", RoleEnum.EMPLOYEE, "Eng", True),
+        ("boss", RoleEnum.ADMIN, "Ops", True),
+        ("hr", RoleEnum.HR, "Ops", False),
+        ("manager", RoleEnum.MANAGER, "Ops", False),
+        ("admin", RoleEnum.ADMIN, None, False),
+    ):
+        user = User(name=key, email=f"{key}@example.com", employee_id=key, department=department, role=role, is_active=True)
+        db.add(user)
+        db.flush()
+        if checked_in:
+            db.add(Attendance(user_id=user.user_id, check_in=today))
+        users[key] = user
+    db.commit()
+    return users
+
+
+def connect(client, who, **params):
+    query = "&".join(f"{key}={value}" for key, value in params.items())
+    token = create_access_token(f"{who}@example.com", "")  # scoped by the stored role, not the token's
+    return client.websocket_connect(f"/attendance/live?token={token}&{query}")
+
+
+def receive(websocket):
+    return json.loads(websocket.receive_bytes())
+
+
+def publish(feed, department, role=RoleEnum.EMPLOYEE.value, name="x"):
+    feed.publish("check_in", department, role, {"name": name})
+
+
+def names_until(websocket, last):
+    names = []
+    while True:
+        message = receive(websocket)
+        names.append(message["data"]["name"])
+        if names[-1] == last:
+            return names
+
+
+def test_snapshot_then_events_scoped_to_the_department(client, feed, people):
+    with connect(client, "hr") as websocket:
+        snapshot = receive(websocket)
+        assert snapshot["type"] == "snapshot" and snapshot["feed"] == feed.feed_id and snapshot["seq"] == 0
+        assert [row["department"] for row in snapshot["records"]] == ["Ops", "Ops"]
+
+        publish(feed, "Eng", name="eng")
+        publish(feed, " Ops ", name="ops")
+        publish(feed, "Ops", name="end")
+        assert names_until(websocket, "end") == ["ops", "end"]
+
+    with connect(client, "manager") as websocket:
+        assert {row["employee_id"] for row in receive(websocket)["records"]} == {"ops", "boss"}
+
+
+def test_admin_sees_every_department_but_not_other_admins(client, feed, people):
+    with connect(client, "admin") as websocket:
+        assert {row["employee_id"] for row in receive(websocket)["records"]} == {"ops", "eng"}
+        publish(feed, "Ops", name="ops")
+        publish(feed, "Ops", role=RoleEnum.ADMIN.value, name="boss")
+        publish(feed, "Eng", name="end")
+        assert names_until(websocket, "end") == ["ops", "end"]
+
+
+def test_reconnect_resumes_after_the_last_sequence(client, feed, people):
+    with connect(client, "hr") as websocket:
+        feed_id = receive(websocket)["feed"]
+    publish(feed, "Ops", name="a")
+    publish(feed, "Eng", name="b")
+    publish(feed, "Ops", name="c")
+
+    with connect(client, "hr", since=1, feed=feed_id) as websocket:
+        assert receive(websocket) == {"type": "resume", "feed": feed_id, "seq": 1}
+        message = receive(websocket)
+        assert (message["seq"], message["data"]["name"]) == (3, "c")
+
+    # Another feed, or a sequence no longer buffered: a fresh snapshot
+    for _ in range(5):
+        publish(feed, "Ops")
+    for params in ({"since": 1, "feed": "other"}, {"since": 1, "feed": feed_id}):
+        with connect(client, "hr", **params) as websocket:
+            snapshot = receive(websocket)
+            assert snapshot["type"] == "snapshot" and snapshot["seq"] == 8
+
+
+@pytest.mark.parametrize("token, code", [("not-a-token", CLOSE_UNAUTHORIZED), (None, CLOSE_FORBIDDEN)])
+def test_bad_token_or_role_is_refused(client, people, token, code):
+    token = token or create_access_token("ops@example.com", RoleEnum.EMPLOYEE.value)  # employees get no feed
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect(f"/attendance/live?token={token}") as websocket:
+            websocket.receive_bytes()
+    assert closed.value.code == code
+
+
+def test_unknown_or_inactive_user_is_refused(client, db, people):
+    people["hr"].is_active = False
+    db.commit()
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with connect(client, "hr") as websocket:
+            websocket.receive_bytes()
+    assert closed.value.code == CLOSE_UNAUTHORIZED
+
+
+def test_slow_consumer_is_closed_when_its_queue_overflows(client, feed, people, monkeypatch):
+    monkeypatch.setattr(settings, "LIVE_FEED_MAX_QUEUE", 1)  # no room for a single pending event
+    with connect(client, "hr") as websocket:
+        receive(websocket)
+        publish(feed, "Ops")
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_bytes()
+    assert closed.value.code == CLOSE_LAGGING
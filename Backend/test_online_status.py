@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Online status running totals (toggle, presence switch, check-out) against the logs.
+
+    python -m pytest -q test_online_status.py
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.crud.online_status_crud import status_time_summary
+from app.db.models import Attendance, OnlineStatus, OnlineStatusLog, User
+from app.enums import RoleEnum
+from app.routes.attendance_routes import _finalize_online_status_on_checkout
+from app.routes import online_status_routes
+from app.routes.online_status_routes import _apply_toggle, _current_status, _get_or_create_online_status
+from app.schemas.online_status_schema import ToggleStatusRequest
+from app.services.presence import switch_presence
+
+
+def check_in(db, email="user@example.com", hours_ago=3):
+    user = User(name="User", email=email, employee_id=email, department="Ops", role=RoleEnum.EMPLOYEE, is_active=True)
+    db.add(user)
+    db.flush()
+    attendance = Attendance(user_id=user.user_id, check_in=datetime.utcnow() - timedelta(hours=hours_ago))
+    db.add(attendance)
+    db.commit()
+    return user.user_id, attendance.attendance_id
+
+
+def age_open_log(db, status_id, minutes):
+    """Pretend the open period started `minutes` earlier."""
+    log = db.query(OnlineStatusLog).filter(OnlineStatusLog.online_status_id == status_id, OnlineStatusLog.ended_at.is_(None)).one()
+    log.started_at -= timedelta(minutes=minutes)
+    db.commit()
+
+
+def resummed(db, status_id):
+    """The summary as it was computed before the running totals: re-summing every log."""
+    now = datetime.utcnow()
+    totals = {"online": 0.0, "offline": 0.0}
+    logs = db.query(OnlineStatusLog).filter(OnlineStatusLog.online_status_id == status_id).all()
+    for log in logs:
+        minutes = log.duration_minutes if log.ended_at else (now - log.started_at).total_seconds() / 60
+        totals["online" if log.status == "online" else "offline"] += minutes or 0.0
+    return totals["online"], totals["offline"], sum(1 for log in logs if log.status == "offline")
+
+
+def test_running_totals_match_the_resummed_logs(db):
+    user_id, attendance_id = check_in(db)
+    status_id = _get_or_create_online_status(db, user_id, attendance_id).id
+
+    steps = [("Lunch", 50), (None, 30), ("Meeting", 20), (None, 45), ("Break", 15)]
+    for reason, minutes in steps:
+        age_open_log(db, status_id, minutes)
+        _apply_toggle(db, user_id, ToggleStatusRequest(offline_reason=reason))
+    # Back online through a presence flush, then an automatic offline
+    age_open_log(db, status_id, 10)
+    switch_presence(db, [(status_id, True, datetime.utcnow())])
+    db.commit()
+    age_open_log(db, status_id, 25)
+    switch_presence(db, [(status_id, False, datetime.utcnow())])
+    db.commit()
+    age_open_log(db, status_id, 5)
+
+    db.expire_all()
+    online_status = db.get(OnlineStatus, status_id)
+    online, offline, offline_count = resummed(db, status_id)
+    summary = status_time_summary(db, online_status)
+    assert summary["total_online_minutes"] == pytest.approx(online, abs=0.05)
+    assert summary["total_offline_minutes"] == pytest.approx(offline, abs=0.05)
+    assert summary["offline_count"] == offline_count == 4
+    assert online == pytest.approx(50 + 20 + 15 + 25, abs=0.05)
+
+    final = _finalize_online_status_on_checkout(db, user_id, attendance_id)
+    db.commit()
+    online, offline, _ = resummed(db, status_id)
+    assert final["total_online_minutes"] == pytest.approx(online, abs=0.05)
+    assert final["total_offline_minutes"] == pytest.approx(offline, abs=0.05)
+    assert db.query(OnlineStatusLog).filter(OnlineStatusLog.ended_at.is_(None)).count() == 0
+
+
+def test_current_status_reads_without_locking(db, monkeypatch):
+    user_id, attendance_id = check_in(db, hours_ago=0)
+    status_id = _get_or_create_online_status(db, user_id, attendance_id).id
+
+    def no_lock(*args):
+        raise AssertionError("GET /online-status/current must not lock the row")
+
+    monkeypatch.setattr(online_status_routes, "lock_online_status", no_lock)
+    current = _current_status(db, user_id)
+    assert (current.id, current.is_online) == (status_id, True)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Write-behind presence: heartbeats, timeouts and the flush's batched statements.
+
+Drives PresenceRegistry.heartbeat / flush with explicit times against the SQLite
+fixture (the registry's SessionLocal is pointed at it).
+
+    python -m pytest -q test_presence.py
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import Attendance, OnlineStatus, OnlineStatusLog, User
+from app.enums import RoleEnum
+from app.routes.online_status_routes import _apply_toggle, _get_or_create_online_status
+from app.schemas.online_status_schema import ToggleStatusRequest
+from app.services import presence
+from app.services.presence import PRESENCE_OFFLINE_REASON, PresenceRegistry
+
+TIMEOUT = 120
+
+
+@pytest.fixture
+def registry(engine, monkeypatch):
+    monkeypatch.setattr(presence, "SessionLocal", sessionmaker(bind=engine))
+    return PresenceRegistry(flush_seconds=0, timeout_seconds=TIMEOUT)
+
+
+def checked_in(db, count, prefix="user"):
+    """`count` checked-in users with an online status; returns (user_id, status_id) pairs."""
+    users = []
+    for i in range(count):
+        user = User(name=f"{prefix} {i}", email=f"{prefix}{i}@example.com", employee_id=f"{prefix}{i}", department="Ops",
+                    role=RoleEnum.EMPLOYEE, is_active=True)
+        db.add(user)
+        db.flush()
+        attendance = Attendance(user_id=user.user_id, check_in=datetime.utcnow() - timedelta(hours=1))
+        db.add(attendance)
+        db.commit()
+        users.append((user.user_id, _get_or_create_online_status(db, user.user_id, attendance.attendance_id).id))
+    return users
+
+
+def state(db, status_id):
+    db.expire_all()
+    online_status = db.get(OnlineStatus, status_id)
+    open_log = (
+        db.query(OnlineStatusLog)
+        .filter(OnlineStatusLog.online_status_id == status_id, OnlineStatusLog.ended_at.is_(None))
+        .one()
+    )
+    return online_status.is_online, open_log.offline_reason, online_status.last_seen_at
+
+
+def test_timeout_takes_users_offline_and_heartbeats_bring_them_back(db, registry):
+    (user_id, status_id), = checked_in(db, 1)
+    start = datetime.utcnow() + timedelta(seconds=1)
+
+    registry.heartbeat(user_id, start)
+    assert registry.flush(start)["seen"] == 1
+    assert state(db, status_id) == (True, None, start)
+
+    # Silent for longer than the timeout: offline from the last heartbeat
+    stats = registry.flush(start + timedelta(seconds=TIMEOUT + 1))
+    assert stats["offline"] == 1
+    assert state(db, status_id)[:2] == (False, PRESENCE_OFFLINE_REASON)
+    offline_log = db.query(OnlineStatusLog).filter(OnlineStatusLog.offline_reason == PRESENCE_OFFLINE_REASON).one()
+    assert offline_log.started_at == start
+
+    # Heard from again: back online from that heartbeat
+    back = start + timedelta(seconds=600)
+    registry.heartbeat(user_id, back)
+    assert registry.flush(back + timedelta(seconds=5))["online"] == 1
+    assert state(db, status_id) == (True, None, back)
+    db.expire_all()
+    assert db.get(OnlineStatus, status_id).total_offline_minutes == pytest.approx(10.0)
+
+
+def test_heartbeats_do_not_override_a_manual_offline(db, registry):
+    (user_id, status_id), = checked_in(db, 1)
+    _apply_toggle(db, user_id, ToggleStatusRequest(offline_reason="Lunch"))
+    now = datetime.utcnow() + timedelta(seconds=1)
+
+    registry.heartbeat(user_id, now)
+    assert registry.flush(now + timedelta(seconds=5)) == {"seen": 1, "online": 0, "offline": 0}
+    assert state(db, status_id)[:2] == (False, "Lunch")
+
+
+def test_last_seen_never_moves_backwards(db, registry):
+    (user_id, status_id), = checked_in(db, 1)
+    now = datetime.utcnow() + timedelta(seconds=1)
+    registry.heartbeat(user_id, now)
+    registry.flush(now)
+
+    # Another worker's registry flushing an older heartbeat
+    other = PresenceRegistry(flush_seconds=0, timeout_seconds=TIMEOUT)
+    other.heartbeat(user_id, now - timedelta(seconds=30))
+    other.flush(now)
+    assert state(db, status_id)[2] == now
+
+
+def run_flushes(db, registry, count_queries, users):
+    """Statements of a heartbeat flush, a timeout flush and a back-online flush."""
+    start = datetime.utcnow() + timedelta(seconds=1)
+    for user_id, _ in users:
+        registry.heartbeat(user_id, start)
+    counts = []
+    for now, heartbeat in [
+        (start, False),
+        (start + timedelta(seconds=TIMEOUT + 1), False),
+        (start + timedelta(seconds=600), True),
+    ]:
+        if heartbeat:
+            for user_id, _ in users:
+                registry.heartbeat(user_id, now)
+        with count_queries() as statements:
+            stats = registry.flush(now)
+        counts.append(len(statements))
+    assert stats["online"] == len(users)
+    return counts
+
+
+def test_flush_statement_count_is_independent_of_users(db, registry, count_queries):
+    few = run_flushes(db, registry, count_queries, checked_in(db, 3, "few"))
+    fresh = PresenceRegistry(flush_seconds=0, timeout_seconds=TIMEOUT)
+    many = run_flushes(db, fresh, count_queries, checked_in(db, 40, "many"))
+    assert few == many
+    assert max(many) <= 10
@@ -0,0 +1,29 @@
+"""
+Client keys for the rate limiter: X-Forwarded-For only counts behind a trusted proxy.
+
+Run: pytest test_rate_limit.py
+"""
+import ipaddress
+
+from app.core import rate_limit
+from app.core.rate_limit import _client_ip
+
+
+def scope(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return {"client": (peer, 50000), "headers": headers}
+
+
+def test_forwarded_for_is_ignored_from_untrusted_peers(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_TRUSTED_PROXIES", [])
+    assert _client_ip(scope("203.0.113.7", "1.2.3.4")) == "203.0.113.7"
+    assert _client_ip(scope("127.0.0.1", "1.2.3.4")) == "127.0.0.1"
+
+
+def test_right_most_untrusted_hop_behind_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_TRUSTED_PROXIES", [ipaddress.ip_network("127.0.0.1/32"), ipaddress.ip_network("10.0.0.0/8")])
+    # A spoofed left-most value does not change the key
+    assert _client_ip(scope("127.0.0.1", "6.6.6.6, 198.51.100.9, 10.0.0.5")) == "198.51.100.9"
+    assert _client_ip(scope("127.0.0.1", "7.7.7.7, 198.51.100.9, 10.0.0.5")) == "198.51.100.9"
+    assert _client_ip(scope("127.0.0.1")) == "127.0.0.1"
+    assert _client_ip(scope("203.0.113.7", "198.51.100.9")) == "203.0.113.7"
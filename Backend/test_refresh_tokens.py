@@ -0,0 +1,115 @@
+"""
+Refresh token rotation, reuse detection, expiry and session revocation.
+
+Run: pytest test_refresh_tokens.py
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app.crud.refresh_token_crud import (
+    create_refresh_token,
+    find_active_token,
+    revoke_all_sessions,
+    revoke_session,
+    rotate_refresh_token,
+)
+from app.core.security import generate_refresh_token, hash_refresh_token
+from app.db.models import RefreshToken, User
+from app.enums import RoleEnum
+
+
+def make_user(db, email="user@example.com"):
+    user = User(name="User", email=email, employee_id=email, role=RoleEnum.EMPLOYEE, is_active=True)
+    db.add(user)
+    db.commit()
+    return user.user_id
+
+
+def live_tokens(db, session_id):
+    db.expire_all()
+    return db.query(RefreshToken).filter(RefreshToken.session_id == session_id, RefreshToken.revoked_at.is_(None)).count()
+
+
+def test_rotation_replaces_the_token_within_the_session(db):
+    raw, record = create_refresh_token(db, make_user(db), device_name="Phone")
+    new_raw, replacement, user = rotate_refresh_token(db, raw)
+
+    old = db.query(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(raw)).one()
+    assert old.revoked_at is not None and old.replaced_by_id == replacement.id
+    assert replacement.session_id == record.session_id and replacement.device_name == "Phone"
+    assert find_active_token(db, raw) is None and find_active_token(db, new_raw).id == replacement.id
+    assert rotate_refresh_token(db, new_raw) is not None
+
+
+def test_reusing_a_rotated_token_revokes_the_session(db):
+    raw, record = create_refresh_token(db, make_user(db))
+    new_raw, _, _ = rotate_refresh_token(db, raw)
+
+    assert rotate_refresh_token(db, raw) is None
+    assert live_tokens(db, record.session_id) == 0
+    assert rotate_refresh_token(db, new_raw) is None
+
+
+def test_losing_a_concurrent_rotation_counts_as_reuse(db, engine):
+    user_id = make_user(db)
+    raw, record = create_refresh_token(db, user_id)
+    # The winning request's replacement, already committed
+    winner = RefreshToken(
+        user_id=user_id, session_id=record.session_id, token_hash=hash_refresh_token(generate_refresh_token()),
+        session_started_at=record.session_started_at, expires_at=record.expires_at,
+    )
+    db.add(winner)
+    db.commit()
+    winner_id, record_id = winner.id, record.id
+    db.expire_all()
+
+    raced = []
+
+    def claim_first(conn, cursor, statement, parameters, context, executemany):
+        # The winner claims the token between our read and our UPDATE
+        if statement.startswith("UPDATE refresh_tokens") and not raced:
+            raced.append(True)
+            conn.exec_driver_sql(
+                "UPDATE refresh_tokens SET revoked_at = ?, replaced_by_id = ? WHERE id = ?",
+                (datetime.utcnow(), winner_id, record_id),
+            )
+
+    event.listen(engine, "before_cursor_execute", claim_first)
+    try:
+        assert rotate_refresh_token(db, raw) is None
+    finally:
+        event.remove(engine, "before_cursor_execute", claim_first)
+    assert raced
+    assert live_tokens(db, record.session_id) == 0
+    assert db.query(RefreshToken).count() == 2  # the loser's replacement was rolled back
+
+
+def test_expired_token_and_inactive_user_are_refused(db):
+    user_id = make_user(db)
+    raw, record = create_refresh_token(db, user_id)
+    record.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert rotate_refresh_token(db, raw) is None
+
+    raw, _ = create_refresh_token(db, user_id)
+    db.get(User, user_id).is_active = False
+    db.commit()
+    assert rotate_refresh_token(db, raw) is None
+
+
+def test_logout_and_session_revocation(db):
+    user_id = make_user(db)
+    raw_phone, phone = create_refresh_token(db, user_id, device_name="Phone")
+    raw_laptop, laptop = create_refresh_token(db, user_id, device_name="Laptop")
+    raw_tablet, tablet = create_refresh_token(db, user_id, device_name="Tablet")
+
+    # Logout revokes the session owning the token
+    assert revoke_session(db, user_id, find_active_token(db, raw_phone).session_id) == 1
+    assert rotate_refresh_token(db, raw_phone) is None
+    assert revoke_session(db, user_id, phone.session_id) == 0
+
+    # "Sign out other devices" keeps the current one
+    assert revoke_all_sessions(db, user_id, except_session_id=laptop.session_id) == 1
+    assert rotate_refresh_token(db, raw_tablet) is None
+    assert rotate_refresh_token(db, raw_laptop) is not None
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Stale-session sweeper: shift ends and the batched sweep.
+
+    python -m pytest -q test_session_sweeper.py
+"""
+from datetime import datetime, time, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.core.live_feed import LiveFeed, MemoryFeedBackend
+from app.crud.online_status_crud import close_status_log, open_status_log
+from app.db.models import ActivityEvent, Attendance, OfficeTiming, OnlineStatus, OnlineStatusLog, User
+from app.enums import RoleEnum
+from app.services import session_sweeper
+from app.services.session_sweeper import SessionSweeper, shift_end
+
+DAY_SHIFT = OfficeTiming(department="Ops", start_time=time(9, 30), end_time=time(18, 0))
+NIGHT_SHIFT = OfficeTiming(department="Night", start_time=time(22, 0), end_time=time(6, 0))
+# 15:30 IST on 19 Oct; yesterday's sessions are due, today's day shift is not
+NOW = datetime(2026, 10, 19, 10, 0)
+
+
+def test_shift_end_without_timing_is_the_default_shift_length():
+    # 09:30 IST + 9h -> 18:30 IST
+    assert shift_end(datetime(2026, 10, 18, 4, 0), None, 9) == datetime(2026, 10, 18, 13, 0)
+
+
+def test_shift_end_without_timing_stops_at_office_midnight():
+    # 20:30 IST + 9h is past midnight -> 00:00 IST next day; 0 hours -> always midnight
+    assert shift_end(datetime(2026, 10, 18, 15, 0), None, 9) == datetime(2026, 10, 18, 18, 30)
+    assert shift_end(datetime(2026, 10, 18, 4, 0), None, 0) == datetime(2026, 10, 18, 18, 30)
+
+
+def test_shift_end_of_a_day_shift():
+    # 09:30 IST -> 18:00 IST
+    assert shift_end(datetime(2026, 10, 18, 4, 0), DAY_SHIFT) == datetime(2026, 10, 18, 12, 30)
+
+
+def test_shift_end_of_an_overnight_shift():
+    # 22:00 IST -> 06:00 IST next day; a 01:00 IST check-in ends the same morning
+    assert shift_end(datetime(2026, 10, 18, 16, 30), NIGHT_SHIFT) == datetime(2026, 10, 19, 0, 30)
+    assert shift_end(datetime(2026, 10, 18, 19, 30), NIGHT_SHIFT) == datetime(2026, 10, 19, 0, 30)
+
+
+def test_shift_end_for_a_check_in_after_the_shift_ended():
+    # 19:00 IST, after 18:00 -> 9h later but at most midnight IST
+    assert shift_end(datetime(2026, 10, 18, 13, 30), DAY_SHIFT, 9) == datetime(2026, 10, 18, 18, 30)
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    feed = LiveFeed(MemoryFeedBackend(buffer_size=100))
+    monkeypatch.setattr(session_sweeper, "live_feed", feed)
+    return feed
+
+
+@pytest.fixture
+def sweeper_db(db, engine, feed, monkeypatch):
+    monkeypatch.setattr(session_sweeper, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(session_sweeper, "invalidate_rollups", lambda days: list(days))
+    monkeypatch.setattr(session_sweeper, "invalidate_dashboards", lambda department=None: None)
+    db.add(OfficeTiming(department="Ops", start_time=time(9, 30), end_time=time(18, 0), is_active=True))
+    db.add(OfficeTiming(department="Night", start_time=time(22, 0), end_time=time(6, 0), is_active=True))
+    db.commit()
+    return db
+
+
+def open_session(db, name, department, check_in, check_out=None, lunch=False):
+    """A session with an open log; `lunch`: online for 2h, then offline ("Lunch")."""
+    user = User(name=name, email=f"{name}@example.com", employee_id=name, department=department,
+                role=RoleEnum.EMPLOYEE, is_active=True)
+    db.add(user)
+    db.flush()
+    attendance = Attendance(user_id=user.user_id, check_in=check_in, check_out=check_out)
+    db.add(attendance)
+    db.flush()
+    online_status = OnlineStatus(user_id=user.user_id, attendance_id=attendance.attendance_id, is_online=True)
+    db.add(online_status)
+    db.flush()
+    log = open_status_log(db, online_status, "online", started_at=check_in)
+    if lunch:
+        db.flush()
+        close_status_log(online_status, log, check_in + timedelta(hours=2))
+        open_status_log(db, online_status, "offline", offline_reason="Lunch", started_at=check_in + timedelta(hours=2))
+        online_status.is_online = False
+    db.commit()
+    return attendance.attendance_id, online_status.id
+
+
+def session_state(db, attendance_id, status_id):
+    db.expire_all()
+    attendance = db.get(Attendance, attendance_id)
+    online_status = db.get(OnlineStatus, status_id)
+    open_logs = db.query(OnlineStatusLog).filter(OnlineStatusLog.online_status_id == status_id, OnlineStatusLog.ended_at.is_(None)).count()
+    return {
+        "check_out": attendance.check_out,
+        "total_hours": attendance.total_hours,
+        "auto_closed": attendance.auto_closed_at is not None,
+        "is_online": online_status.is_online,
+        "online": online_status.total_online_minutes,
+        "offline": online_status.total_offline_minutes,
+        "open_logs": open_logs,
+    }
+
+
+def sweeper(batch_size):
+    return SessionSweeper(interval_seconds=0, batch_size=batch_size, grace_minutes=120, default_shift_hours=9)
+
+
+def test_sweep_checks_out_stale_sessions_and_closes_their_logs(sweeper_db):
+    db = sweeper_db
+    ops = open_session(db, "ops", "Ops", datetime(2026, 10, 18, 4, 0), lunch=True)
+    eng = open_session(db, "eng", "Eng", datetime(2026, 10, 18, 4, 0))
+    night = open_session(db, "night", "Night", datetime(2026, 10, 18, 16, 30))
+    today = open_session(db, "today", "Ops", datetime(2026, 10, 19, 4, 0))
+    orphan = open_session(db, "orphan", "Ops", datetime(2026, 10, 17, 4, 0), check_out=datetime(2026, 10, 17, 12, 0))
+
+    stats = sweeper(2).sweep(NOW)
+    assert stats == {"checked_out": 3, "logs_closed": 4}
+
+    assert session_state(db, *ops) == {
+        "check_out": datetime(2026, 10, 18, 12, 30), "total_hours": 8.5, "auto_closed": True,
+        "is_online": False, "online": 120.0, "offline": 390.0, "open_logs": 0,
+    }
+    # No timing for Eng: credited the default 9h shift
+    assert session_state(db, *eng)["check_out"] == datetime(2026, 10, 18, 13, 0)
+    assert session_state(db, *eng)["total_hours"] == 9.0 and session_state(db, *eng)["online"] == 540.0
+    assert session_state(db, *night)["check_out"] == datetime(2026, 10, 19, 0, 30)
+    assert session_state(db, *night)["total_hours"] == 8.0
+    assert session_state(db, *today) == {
+        "check_out": None, "total_hours": 0.0, "auto_closed": False,
+        "is_online": True, "online": 0.0, "offline": 0.0, "open_logs": 1,
+    }
+    # Orphan log closed at the (manual) check-out
+    orphan_state = session_state(db, *orphan)
+    assert orphan_state["online"] == 480.0 and orphan_state["open_logs"] == 0 and not orphan_state["auto_closed"]
+    auto_closed = db.query(OnlineStatusLog).filter(OnlineStatusLog.auto_closed_at.isnot(None)).count()
+    assert auto_closed == 4
+
+    assert sweeper(2).sweep(NOW) == {"checked_out": 0, "logs_closed": 0}
+
+
+def test_sweep_publishes_and_records_its_check_outs(sweeper_db, feed):
+    db = sweeper_db
+    ops_id, _ = open_session(db, "ops", "Ops", datetime(2026, 10, 18, 4, 0))
+    open_session(db, "today", "Ops", datetime(2026, 10, 19, 4, 0))
+
+    assert sweeper(10).sweep(NOW)["checked_out"] == 1
+
+    [event] = feed.events_since(0)
+    assert (event["type"], event["department"], event["role"]) == ("check_out", "Ops", RoleEnum.EMPLOYEE.value)
+    assert event["data"]["attendance_id"] == ops_id
+    assert event["data"]["check_out"] == datetime(2026, 10, 18, 12, 30).isoformat()
+    assert event["data"]["is_online"] is False
+
+    activity = db.query(ActivityEvent).one()
+    assert (activity.event_type, activity.action, activity.status) == ("attendance", "check_out", "auto")
+    assert (activity.subject_id, activity.user_name) == (ops_id, "ops")
+    assert activity.occurred_at == datetime(2026, 10, 18, 12, 30)
+
+
+def test_sweep_statement_count_is_independent_of_stale_sessions(sweeper_db, count_queries):
+    db = sweeper_db
+    sweep = sweeper(100).sweep
+    counts = []
+    for size in (3, 30):
+        for i in range(size):
+            open_session(db, f"s{size}-{i}", ("Ops", "Eng", "Night")[i % 3], datetime(2026, 10, 18, 4, 0), lunch=i % 2 == 0)
+        with count_queries() as statements:
+            assert sweep(NOW)["checked_out"] == size
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
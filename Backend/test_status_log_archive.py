@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Online status log archival: day summaries and the logs / summary endpoints afterwards.
+
+    python -m pytest -q test_status_log_archive.py
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.crud.online_status_crud import close_status_log, open_status_log
+from app.db.models import Attendance, OnlineStatus, OnlineStatusLog, User
+from app.db.models.online_status import OnlineStatusDaySummary, OnlineStatusLogArchive
+from app.enums import RoleEnum
+from app.routes.online_status_routes import get_status_logs, get_status_summary
+from app.services import status_log_archive
+from app.services.status_log_archive import archive_logs
+
+NOW = datetime(2026, 10, 19, 10, 0)
+CHECK_IN = datetime(2026, 8, 3, 4, 0)
+# (status, offline reason, minutes)
+DAY = [("online", None, 120), ("offline", "Lunch", 45), ("online", None, 90), ("offline", "Meeting", 30),
+       ("online", None, 60), ("offline", "Lunch", 15), ("online", None, 120)]
+
+
+@pytest.fixture
+def archive_db(db, engine, monkeypatch):
+    monkeypatch.setattr(status_log_archive, "SessionLocal", sessionmaker(bind=engine))
+    return db
+
+
+def add_logs(db, online_status, start, periods):
+    """Closed logs back to back from `start`; returns where the last one ended."""
+    for status, reason, minutes in periods:
+        log = open_status_log(db, online_status, status, offline_reason=reason, started_at=start)
+        db.flush()
+        start += timedelta(minutes=minutes)
+        close_status_log(online_status, log, start)
+    db.commit()
+    return start
+
+
+def worked_day(db, email="user@example.com"):
+    user = User(name="User", email=email, employee_id=email, department="Ops", role=RoleEnum.EMPLOYEE, is_active=True)
+    db.add(user)
+    db.flush()
+    attendance = Attendance(user_id=user.user_id, check_in=CHECK_IN)
+    db.add(attendance)
+    db.flush()
+    online_status = OnlineStatus(user_id=user.user_id, attendance_id=attendance.attendance_id, is_online=True)
+    db.add(online_status)
+    db.flush()
+    attendance.check_out = add_logs(db, online_status, CHECK_IN, DAY)
+    online_status.is_online = False
+    db.commit()
+    return user.user_id, attendance.attendance_id, online_status
+
+
+def payloads(db, user_id, attendance_id):
+    db.expire_all()
+    return (
+        get_status_logs(user_id, attendance_id, db),
+        get_status_summary(user_id, attendance_id, db).model_dump(),
+    )
+
+
+def test_endpoints_return_the_same_payloads_after_archiving(archive_db):
+    db = archive_db
+    user_id, attendance_id, _ = worked_day(db)
+    before = payloads(db, user_id, attendance_id)
+
+    assert archive_logs(days=30, now=NOW) == {"attendances": 1, "logs": len(DAY)}
+    assert db.query(OnlineStatusLog).count() == 0
+    assert db.query(OnlineStatusLogArchive).count() == len(DAY)
+    assert payloads(db, user_id, attendance_id) == before
+    assert len(before[0]) == len(before[1]["logs"]) == len(DAY)
+
+
+def test_recent_and_open_days_are_not_archived(archive_db):
+    db = archive_db
+    worked_day(db)
+    assert archive_logs(days=90, now=NOW) == {"attendances": 0, "logs": 0}
+    db.query(Attendance).update({Attendance.check_out: None})
+    db.commit()
+    assert archive_logs(days=30, now=NOW) == {"attendances": 0, "logs": 0}
+
+
+def test_day_summary_keeps_totals_and_reasons(archive_db):
+    db = archive_db
+    _, attendance_id, _ = worked_day(db)
+    archive_logs(days=30, now=NOW)
+
+    summary = db.query(OnlineStatusDaySummary).filter(OnlineStatusDaySummary.attendance_id == attendance_id).one()
+    assert (summary.day, summary.online_minutes, summary.offline_minutes) == (CHECK_IN.date(), 390.0, 90.0)
+    assert (summary.offline_count, summary.log_count) == (3, len(DAY))
+    assert (summary.first_started_at, summary.last_ended_at) == (CHECK_IN, CHECK_IN + timedelta(minutes=480))
+    assert json.loads(summary.offline_reasons) == [
+        {"reason": "Lunch", "count": 2, "minutes": 60.0},
+        {"reason": "Meeting", "count": 1, "minutes": 30.0},
+    ]
+
+
+def test_logs_added_after_archiving_fold_into_the_summary(archive_db):
+    db = archive_db
+    user_id, attendance_id, online_status = worked_day(db)
+    archive_logs(days=30, now=NOW)
+
+    # A late correction to the archived day, archived by the next run
+    add_logs(db, online_status, CHECK_IN + timedelta(minutes=480), [("offline", "Meeting", 40), ("offline", None, 5)])
+    assert archive_logs(days=30, now=NOW + timedelta(days=1)) == {"attendances": 1, "logs": 2}
+
+    summary = db.query(OnlineStatusDaySummary).filter(OnlineStatusDaySummary.attendance_id == attendance_id).one()
+    assert (summary.online_minutes, summary.offline_minutes) == (390.0, 135.0)
+    assert (summary.offline_count, summary.log_count) == (5, len(DAY) + 2)
+    assert summary.last_ended_at == CHECK_IN + timedelta(minutes=525)
+    assert summary.archived_at == NOW + timedelta(days=1)
+    assert json.loads(summary.offline_reasons) == [
+        {"reason": "Meeting", "count": 2, "minutes": 70.0},
+        {"reason": "Lunch", "count": 2, "minutes": 60.0},
+        {"reason": None, "count": 1, "minutes": 5.0},
+    ]
+    logs, detail = payloads(db, user_id, attendance_id)
+    assert len(logs) == len(DAY) + 2
+    assert detail["total_offline_minutes"] == 135.0
+
+
+def test_logs_written_after_archiving_are_listed_with_the_archived_ones(archive_db):
+    db = archive_db
+    user_id, attendance_id, online_status = worked_day(db)
+    archive_logs(days=30, now=NOW)
+    add_logs(db, online_status, CHECK_IN + timedelta(minutes=480), [("offline", "Meeting", 40)])
+
+    logs, detail = payloads(db, user_id, attendance_id)
+    assert [log["status"] for log in logs] == ["offline"] + [status for status, _, _ in reversed(DAY)]
+    assert [log["offline_reason"] for log in logs[:2]] == ["Meeting", None]
+    assert [log["status"] for log in detail["logs"]] == [status for status, _, _ in DAY] + ["offline"]
+    assert detail["total_offline_minutes"] == 130.0
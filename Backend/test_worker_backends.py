@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Several workers refuse to start on per-process rate limits, live feed and read-your-writes.
+
+    python -m pytest -q test_worker_backends.py
+"""
+import pytest
+
+from app import main
+from app.core.config import settings
+
+
+def test_single_worker_runs_on_memory_backends(monkeypatch):
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 1)
+    assert "LIVE_FEED_BACKEND" in main.per_process_backends()
+    main.check_worker_backends()
+
+
+def test_several_workers_need_shared_backends(monkeypatch):
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 4)
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    with pytest.raises(RuntimeError, match="RATE_LIMIT_BACKEND, LIVE_FEED_BACKEND"):
+        main.check_worker_backends()
+
+    # Shared (redis) backends, or the per-process one turned off
+    monkeypatch.setattr(main.live_feed, "backend", object())
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", False)
+    main.check_worker_backends()